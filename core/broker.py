@@ -0,0 +1,797 @@
+#!/usr/bin/env python3
+
+"""Minimal MQTT 3.1.1 message broker for the exchange of messages between the
+modules of a node."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import asyncio
+import logging
+import os
+import struct
+import threading
+import uuid
+
+from collections import OrderedDict, deque
+from typing import List, Optional, Tuple
+
+# MQTT control packet types.
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+PUBREC = 5
+PUBREL = 6
+PUBCOMP = 7
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def encode_packet(header: int, body: bytes) -> bytes:
+    """Returns an MQTT control packet.
+
+    Args:
+        header: The first byte of the fixed header (type and flags).
+        body: The variable header and the payload.
+
+    Returns:
+        The encoded packet.
+    """
+    length = len(body)
+    data = bytearray([header])
+
+    while True:
+        byte = length % 128
+        length //= 128
+        data.append(byte | 0x80 if length else byte)
+
+        if not length:
+            break
+
+    return bytes(data + body)
+
+
+def encode_string(value: bytes) -> bytes:
+    """Returns a length-prefixed string.
+
+    Args:
+        value: The UTF-8 encoded string.
+
+    Returns:
+        The string with length prefix.
+    """
+    return struct.pack('!H', len(value)) + value
+
+
+def is_valid_filter(topic_filter: str) -> bool:
+    """Returns whether a topic filter is valid. Wildcards have to occupy an
+    entire level, and `#` has to be the last level.
+
+    Args:
+        topic_filter: The topic filter.
+
+    Returns:
+        True if the topic filter is valid, else False.
+    """
+    if not topic_filter:
+        return False
+
+    levels = topic_filter.split('/')
+
+    for i, level in enumerate(levels):
+        if '#' in level and (level != '#' or i != len(levels) - 1):
+            return False
+
+        if '+' in level and level != '+':
+            return False
+
+    return True
+
+
+def match_topic(topic_filter: str, topic: str) -> bool:
+    """Returns whether a topic matches a topic filter with wildcards. Topics
+    starting with `$` are not matched by wildcards in the first level.
+
+    Args:
+        topic_filter: The topic filter.
+        topic: The topic name.
+
+    Returns:
+        True if the topic matches the filter, else False.
+    """
+    if topic.startswith('$') and topic_filter[0] in '#+':
+        return False
+
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+
+        if i >= len(topic_levels):
+            return False
+
+        if level != '+' and level != topic_levels[i]:
+            return False
+
+    return len(filter_levels) == len(topic_levels)
+
+
+async def read_packet(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    """Reads an MQTT control packet from a stream.
+
+    Args:
+        reader: The stream reader.
+
+    Returns:
+        The first byte of the fixed header and the remaining data.
+
+    Raises:
+        asyncio.IncompleteReadError: If the stream has been closed.
+        ValueError: If the remaining length is malformed.
+    """
+    header, byte = await reader.readexactly(2)
+    length = byte & 0x7f
+    multiplier = 128
+
+    while byte & 0x80:
+        if multiplier > 128 ** 3:
+            raise ValueError('Malformed remaining length')
+
+        byte = (await reader.readexactly(1))[0]
+        length += (byte & 0x7f) * multiplier
+        multiplier *= 128
+
+    return header, await reader.readexactly(length)
+
+
+class Message:
+    """
+    Message stores an application message that is routed by the broker.
+    """
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain')
+
+    def __init__(self, topic: str, payload: bytes, qos: int, retain: bool):
+        """
+        Args:
+            topic: The topic name.
+            payload: The payload.
+            qos: Quality of Service (0 or 1).
+            retain: Retained message or not.
+        """
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+    def encode(self, packet_id: int = 0, dup: bool = False) -> bytes:
+        """Returns the message as PUBLISH packet.
+
+        Args:
+            packet_id: The packet identifier (QoS 1 only).
+            dup: Whether the message is sent again.
+
+        Returns:
+            The encoded packet.
+        """
+        header = (PUBLISH << 4) | (dup << 3) | (self.qos << 1) | self.retain
+        body = encode_string(self.topic.encode('utf-8'))
+
+        if self.qos:
+            body += struct.pack('!H', packet_id)
+
+        return encode_packet(header, body + self.payload)
+
+
+class Session:
+    """
+    Session stores the state of a client: the subscriptions, the QoS 1
+    messages that have not been acknowledged yet, and the messages that are
+    queued while a client with persistent session is offline.
+    """
+
+    # Maximum number of unacknowledged QoS 1 messages.
+    MAX_INFLIGHT = 100
+
+    # Maximum number of queued messages.
+    MAX_QUEUED = 10000
+
+    # Maximum size of the write buffer in bytes, before QoS 0 messages are
+    # dropped.
+    MAX_BUFFER_SIZE = 8388608
+
+    def __init__(self, client_id: str, is_clean: bool):
+        """
+        Args:
+            client_id: The client id.
+            is_clean: Whether the session is discarded on disconnect.
+        """
+        self.client_id = client_id
+        self.is_clean = is_clean
+        self.subscriptions = {}         # Topic filter -> QoS.
+        self.inflight = OrderedDict()   # Packet id -> message.
+        self.queue = deque(maxlen=self.MAX_QUEUED)
+        self.received = set()           # Packet ids of QoS 2 messages.
+        self.will = None
+        self.writer = None
+
+        self._packet_id = 0
+
+    def _next_packet_id(self) -> int:
+        """Returns the next free packet identifier."""
+        while True:
+            self._packet_id = self._packet_id % 65535 + 1
+
+            if self._packet_id not in self.inflight:
+                return self._packet_id
+
+    def acknowledge(self, packet_id: int) -> None:
+        """Removes an acknowledged message, and sends queued messages.
+
+        Args:
+            packet_id: The packet identifier.
+        """
+        self.inflight.pop(packet_id, None)
+        self.flush()
+
+    def flush(self) -> None:
+        """Sends queued messages, as long as the number of unacknowledged
+        messages is below the limit."""
+        while (self.writer and self.queue and
+               len(self.inflight) < self.MAX_INFLIGHT):
+            self.send(self.queue.popleft())
+
+    def resume(self) -> None:
+        """Sends all unacknowledged messages again, and then the queued
+        messages. Called after a client has reconnected to its session."""
+        for packet_id, message in self.inflight.items():
+            self.writer.write(message.encode(packet_id, dup=True))
+
+        self.flush()
+
+    def send(self, message: Message) -> None:
+        """Sends a message to the client, or queues it, if the client is offline
+        or too many messages are unacknowledged. QoS 0 messages are dropped
+        instead.
+
+        Args:
+            message: The message.
+        """
+        if message.qos == 0:
+            if (self.writer and self.writer.transport.get_write_buffer_size() <
+                    self.MAX_BUFFER_SIZE):
+                self.writer.write(message.encode())
+            return
+
+        if not self.writer or len(self.inflight) >= self.MAX_INFLIGHT:
+            self.queue.append(message)
+            return
+
+        packet_id = self._next_packet_id()
+        self.inflight[packet_id] = message
+        self.writer.write(message.encode(packet_id))
+
+
+class MessageBroker:
+    """
+    MessageBroker is a minimal MQTT 3.1.1 message broker for the loopback
+    exchange of messages between modules, as a lightweight alternative to
+    HBMQTT. It runs on an asyncio event loop in a thread of its own and
+    listens on a TCP port, a Unix domain socket, or both.
+
+    Supported are publish and subscribe with wildcards, retained messages,
+    last will messages, persistent sessions, and QoS 0 and 1. Subscriptions
+    with QoS 2 are granted QoS 1. Authentication is not supported, so the
+    broker should listen on the loopback interface only.
+    """
+
+    # Time in seconds to wait for the CONNECT packet of a new client.
+    CONNECT_TIMEOUT = 10.0
+
+    def __init__(self,
+                 host: Optional[str] = '127.0.0.1',
+                 port: int = 1883,
+                 path: str = None):
+        """
+        Args:
+            host: The host name (IP or FQDN) to listen on, or None.
+            port: The port number.
+            path: Optional path of a Unix domain socket to listen on.
+        """
+        self.logger = logging.getLogger('broker')
+
+        self._host = host
+        self._port = port
+        self._path = path
+
+        self._sessions = {}     # Client id -> session.
+        self._subscribers = {}  # Topic filter -> {session: QoS}.
+        self._wildcards = set()  # Topic filters with wildcards.
+        self._retained = {}     # Topic -> message.
+        self._connections = {}  # Stream writer -> [timeout, last activity].
+        self._clients = {}      # Stream writer -> task of the client.
+
+        self._loop = None
+        self._task = None
+        self._thread = None
+        self._servers = []
+        self._is_ready = threading.Event()
+
+    def _add_subscription(self,
+                          session: Session,
+                          topic_filter: str,
+                          qos: int) -> None:
+        """Adds a subscription of a session.
+
+        Args:
+            session: The session.
+            topic_filter: The topic filter.
+            qos: The granted QoS.
+        """
+        session.subscriptions[topic_filter] = qos
+        self._subscribers.setdefault(topic_filter, {})[session] = qos
+
+        if '+' in topic_filter or '#' in topic_filter:
+            self._wildcards.add(topic_filter)
+
+    def _remove_subscription(self,
+                             session: Session,
+                             topic_filter: str) -> None:
+        """Removes a subscription of a session.
+
+        Args:
+            session: The session.
+            topic_filter: The topic filter.
+        """
+        session.subscriptions.pop(topic_filter, None)
+        subscribers = self._subscribers.get(topic_filter)
+
+        if subscribers is None:
+            return
+
+        subscribers.pop(session, None)
+
+        if not subscribers:
+            del self._subscribers[topic_filter]
+            self._wildcards.discard(topic_filter)
+
+    def _remove_session(self, session: Session) -> None:
+        """Removes a session and all its subscriptions.
+
+        Args:
+            session: The session.
+        """
+        for topic_filter in list(session.subscriptions):
+            self._remove_subscription(session, topic_filter)
+
+        if self._sessions.get(session.client_id) is session:
+            del self._sessions[session.client_id]
+
+    def _connect(self,
+                 body: bytes,
+                 writer: asyncio.StreamWriter) -> Tuple[Optional[Session], int]:
+        """Handles a CONNECT packet. Returns the session of the client, or
+        None if the connection has been refused.
+
+        Args:
+            body: The packet data.
+            writer: The stream writer of the client.
+
+        Returns:
+            The session and the keep alive interval in seconds.
+        """
+        fields = self._read_strings(body, 1)
+        offset = 2 + len(fields[0])
+        level, flags, keep_alive = struct.unpack_from('!BBH', body, offset)
+
+        if level not in (3, 4):
+            writer.write(bytes([CONNACK << 4, 2, 0, 1]))
+            return None, 0
+
+        # Client id, will topic and message, user name, password.
+        count = 1 + (2 if flags & 0x04 else 0)
+        client_id, *will = self._read_strings(body[offset + 4:], count)
+        client_id = client_id.decode('utf-8')
+        is_clean = bool(flags & 0x02)
+
+        if not client_id:
+            if not is_clean:
+                writer.write(bytes([CONNACK << 4, 2, 0, 2]))
+                return None, 0
+
+            client_id = f'auto-{uuid.uuid4().hex}'
+
+        session = self._sessions.get(client_id)
+
+        if session and session.writer:
+            # Take over the session of a connected client.
+            self.logger.debug(f'Disconnecting client "{client_id}" (taken '
+                              f'over)')
+            session.writer.close()
+            session.writer = None
+
+        if session and (is_clean or session.is_clean):
+            self._remove_session(session)
+            session = None
+
+        is_present = session is not None
+
+        if not session:
+            session = Session(client_id, is_clean)
+            self._sessions[client_id] = session
+
+        session.will = None
+
+        if will:
+            session.will = Message(will[0].decode('utf-8'),
+                                   will[1],
+                                   min((flags >> 3) & 0x03, 1),
+                                   bool(flags & 0x20))
+
+        session.writer = writer
+        writer.write(bytes([CONNACK << 4, 2, int(is_present), 0]))
+
+        if is_present:
+            session.resume()
+
+        self.logger.debug(f'Connected client "{client_id}"')
+        return session, keep_alive
+
+    def _disconnect(self,
+                    session: Session,
+                    writer: asyncio.StreamWriter,
+                    is_graceful: bool) -> None:
+        """Handles the disconnection of a client. Publishes the last will
+        message, unless the client has sent a DISCONNECT packet.
+
+        Args:
+            session: The session.
+            writer: The stream writer of the connection.
+            is_graceful: Whether the client has disconnected properly.
+        """
+        if session.writer is not writer:
+            # The session has been taken over by another connection.
+            return
+
+        session.writer = None
+
+        if not is_graceful and session.will:
+            self._publish(session.will)
+
+        session.will = None
+
+        if session.is_clean:
+            self._remove_session(session)
+
+        self.logger.debug(f'Disconnected client "{session.client_id}"')
+
+    def _publish(self, message: Message) -> None:
+        """Stores a retained message and forwards a message to all matching
+        subscribers, with the lower QoS of message and subscription.
+
+        Args:
+            message: The message.
+        """
+        if message.retain:
+            if message.payload:
+                self._retained[message.topic] = message
+            else:
+                self._retained.pop(message.topic, None)
+
+        targets = dict(self._subscribers.get(message.topic, {}))
+
+        for topic_filter in self._wildcards:
+            if match_topic(topic_filter, message.topic):
+                for session, qos in self._subscribers[topic_filter].items():
+                    targets[session] = max(qos, targets.get(session, 0))
+
+        for session, qos in targets.items():
+            qos = min(qos, message.qos)
+
+            if qos == message.qos and not message.retain:
+                session.send(message)
+            else:
+                session.send(Message(message.topic, message.payload, qos,
+                                     False))
+
+    def _on_publish(self,
+                    session: Session,
+                    header: int,
+                    body: bytes) -> None:
+        """Handles a PUBLISH packet.
+
+        Args:
+            session: The session of the sender.
+            header: The first byte of the fixed header.
+            body: The packet data.
+
+        Raises:
+            ValueError: If the packet is malformed.
+        """
+        qos = (header >> 1) & 0x03
+        length = struct.unpack_from('!H', body)[0]
+        topic = body[2:2 + length].decode('utf-8')
+        offset = 2 + length
+
+        if not topic or '+' in topic or '#' in topic or qos > 2:
+            raise ValueError('Invalid PUBLISH packet')
+
+        if qos == 0:
+            self._publish(Message(topic, body[offset:], 0, bool(header & 1)))
+            return
+
+        packet_id = body[offset:offset + 2]
+        message = Message(topic, body[offset + 2:], 1, bool(header & 1))
+
+        if qos == 1:
+            self._publish(message)
+            session.writer.write(bytes([PUBACK << 4, 2]) + packet_id)
+            return
+
+        # QoS 2 messages are forwarded once, with QoS 1 at most.
+        if packet_id not in session.received:
+            session.received.add(packet_id)
+            self._publish(message)
+
+        session.writer.write(bytes([PUBREC << 4, 2]) + packet_id)
+
+    def _on_subscribe(self, session: Session, body: bytes) -> None:
+        """Handles a SUBSCRIBE packet. Sends the retained messages that match
+        the topic filters.
+
+        Args:
+            session: The session.
+            body: The packet data.
+        """
+        packet_id = body[:2]
+        offset = 2
+        codes = bytearray()
+        retained = []
+
+        while offset < len(body):
+            length = struct.unpack_from('!H', body, offset)[0]
+            topic_filter = body[offset + 2:offset + 2 + length].decode('utf-8')
+            qos = min(body[offset + 2 + length], 1)
+            offset += 3 + length
+
+            if not is_valid_filter(topic_filter):
+                codes.append(0x80)
+                continue
+
+            self._add_subscription(session, topic_filter, qos)
+            codes.append(qos)
+            retained += [(message, qos) for topic, message
+                         in self._retained.items()
+                         if match_topic(topic_filter, topic)]
+
+        session.writer.write(encode_packet(SUBACK << 4, packet_id + codes))
+
+        for message, qos in retained:
+            session.send(Message(message.topic, message.payload,
+                                 min(qos, message.qos), True))
+
+    def _on_unsubscribe(self, session: Session, body: bytes) -> None:
+        """Handles an UNSUBSCRIBE packet.
+
+        Args:
+            session: The session.
+            body: The packet data.
+        """
+        for topic_filter in self._read_strings(body[2:]):
+            self._remove_subscription(session, topic_filter.decode('utf-8'))
+
+        session.writer.write(bytes([UNSUBACK << 4, 2]) + body[:2])
+
+    @staticmethod
+    def _read_strings(data: bytes, count: int = None) -> List[bytes]:
+        """Reads consecutive length-prefixed strings.
+
+        Args:
+            data: The data.
+            count: Number of strings to read, or None to read all.
+
+        Returns:
+            The strings.
+        """
+        strings = []
+        offset = 0
+
+        while offset < len(data) and (count is None or len(strings) < count):
+            length = struct.unpack_from('!H', data, offset)[0]
+            strings.append(data[offset + 2:offset + 2 + length])
+            offset += 2 + length
+
+        return strings
+
+    async def _handle_client(self,
+                             reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter) -> None:
+        """Handles the connection of a client until it is closed.
+
+        Args:
+            reader: The stream reader.
+            writer: The stream writer.
+        """
+        session = None
+        is_graceful = False
+        self._clients[writer] = asyncio.current_task()
+
+        try:
+            header, body = await asyncio.wait_for(read_packet(reader),
+                                                  self.CONNECT_TIMEOUT)
+
+            if header >> 4 != CONNECT:
+                return
+
+            session, keep_alive = self._connect(body, writer)
+
+            if not session:
+                return
+
+            # The connection is closed if no packet arrives within one and a
+            # half times the keep alive interval.
+            connection = [keep_alive * 1.5, self._loop.time()]
+
+            if keep_alive:
+                self._connections[writer] = connection
+
+            while True:
+                header, body = await read_packet(reader)
+                connection[1] = self._loop.time()
+                kind = header >> 4
+
+                if kind == PUBLISH:
+                    self._on_publish(session, header, body)
+                elif kind == PUBACK:
+                    session.acknowledge(struct.unpack('!H', body[:2])[0])
+                elif kind == PUBREL:
+                    session.received.discard(body[:2])
+                    writer.write(bytes([PUBCOMP << 4, 2]) + body[:2])
+                elif kind == SUBSCRIBE:
+                    self._on_subscribe(session, body)
+                elif kind == UNSUBSCRIBE:
+                    self._on_unsubscribe(session, body)
+                elif kind == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif kind == DISCONNECT:
+                    is_graceful = True
+                    break
+                else:
+                    raise ValueError(f'Unexpected packet type {kind}')
+
+                # Apply backpressure to clients that publish faster than the
+                # messages can be sent.
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError,
+                ConnectionError):
+            pass
+        except (IndexError, struct.error, UnicodeDecodeError, ValueError) as e:
+            self.logger.warning(f'Closing connection of client: {e}')
+        finally:
+            self._connections.pop(writer, None)
+
+            if session:
+                self._disconnect(session, writer, is_graceful)
+
+            writer.close()
+            self._clients.pop(writer, None)
+
+    async def _check_keep_alive(self) -> None:
+        """Closes the connections of clients that have exceeded their keep
+        alive interval. Runs until cancelled."""
+        while True:
+            await asyncio.sleep(1.0)
+            now = self._loop.time()
+
+            for writer, (timeout, last) in list(self._connections.items()):
+                if now - last > timeout:
+                    self.logger.debug('Closing connection of client (keep '
+                                      'alive timeout)')
+                    writer.close()
+
+    async def run_async(self) -> None:
+        """Listens for clients until cancelled."""
+        self._loop = asyncio.get_running_loop()
+
+        if self._host:
+            server = await asyncio.start_server(self._handle_client,
+                                                self._host,
+                                                self._port)
+            self._port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            self.logger.info(f'Listening on {self._host}:{self._port}')
+
+        if self._path:
+            if os.path.exists(self._path):
+                # Remove the socket file of a previous run.
+                os.remove(self._path)
+
+            server = await asyncio.start_unix_server(self._handle_client,
+                                                     self._path)
+            self._servers.append(server)
+            self.logger.info(f'Listening on {self._path}')
+
+        self._is_ready.set()
+
+        try:
+            await asyncio.gather(self._check_keep_alive(),
+                                 *[server.serve_forever()
+                                   for server in self._servers])
+        finally:
+            for server in self._servers:
+                server.close()
+
+            # Close the connections of all clients and wait for their
+            # handlers to finish, before the event loop is closed.
+            tasks = list(self._clients.values())
+
+            for writer in list(self._clients):
+                writer.close()
+
+            if tasks:
+                await asyncio.wait(tasks, timeout=self.CONNECT_TIMEOUT)
+
+            # Cancel the handlers that have not finished in time.
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            if self._path and os.path.exists(self._path):
+                os.remove(self._path)
+
+    def _run(self) -> None:
+        """Runs the event loop of the broker. Runs within a thread."""
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._loop.run_until_complete(self._task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.logger.critical(f'MQTT message broker failed: {e}')
+        finally:
+            self._is_ready.set()
+            self._loop.close()
+
+    def start(self, timeout: float = 5.0) -> None:
+        """Starts the broker in a new thread. Blocks until the broker is
+        listening.
+
+        Args:
+            timeout: Time in seconds to wait for the broker.
+        """
+        self.logger.info('Starting MQTT message broker ...')
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self.run_async())
+        self._thread = threading.Thread(target=self._run,
+                                        name='broker',
+                                        daemon=True)
+        self._thread.start()
+        self._is_ready.wait(timeout)
+
+    def stop(self) -> None:
+        """Stops the broker."""
+        if not self._loop or self._loop.is_closed():
+            return
+
+        self.logger.info('Stopping MQTT message broker ...')
+        self._loop.call_soon_threadsafe(self._task.cancel)
+        self._thread.join()
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def port(self) -> int:
+        return self._port
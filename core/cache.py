@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+
+"""Append-only cache for the store-and-forward of observations."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import json
+import logging
+import os
+import threading
+import time
+
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+
+class CacheRecord(dict):
+    """
+    CacheRecord is a dictionary with the document id of a cached data set.
+    """
+
+    def __init__(self, data: Dict[str, Any], doc_id: int):
+        """
+        Args:
+            data: The cached data set.
+            doc_id: The document id.
+        """
+        super().__init__(data)
+        self.doc_id = doc_id
+
+
+class CacheSegment:
+    """
+    CacheSegment stores the number of all and of the pending records in a
+    single segment file of the cache.
+    """
+
+    def __init__(self, number: int, path: Path):
+        """
+        Args:
+            number: The number of the segment.
+            path: The path to the segment file.
+        """
+        self.number = number
+        self.path = path
+        self.total = 0      # Number of records written to the segment.
+        self.live = 0       # Number of pending records in the segment.
+        self.size = 0       # Size of the segment file in bytes.
+
+
+class AppendOnlyCache:
+    """
+    AppendOnlyCache stores data sets (like observations) until they have been
+    forwarded and removed. Instead of rewriting a whole file on every change,
+    new data sets and acknowledgements of removed ones are appended to segment
+    files, one JSON object per line::
+
+        {"op": "put", "id": 1, "data": {...}}
+        {"op": "ack", "ids": [1]}
+
+    An in-memory index keeps the position of all pending records. A new
+    segment is started once the current one has reached the maximum size.
+    The oldest segments are deleted as soon as all their records are removed.
+    If only a small share of records is left in the oldest segment, the
+    records are copied to the current segment first (compaction). On start,
+    the index is restored from the segment files, and a new segment is
+    opened, so that a line truncated by a crash is never appended to.
+
+    The fsync policy determines when data is forced onto the storage device:
+
+    * `always`: after every write,
+    * `interval`: at most once per interval (default); writes that have not
+      been synced yet are synced by a timer once the interval has passed,
+    * `never`: left to the operating system.
+
+    Records copied by a compaction are always synced before the old segment
+    is deleted.
+
+    Without a path, all data is kept in memory only.
+    """
+
+    def __init__(self,
+                 path: str = None,
+                 segment_size: int = 1048576,
+                 fsync: str = 'interval',
+                 fsync_interval: float = 1.0,
+                 compact_ratio: float = 0.1):
+        """
+        Args:
+            path: Base path of the segment files, or None for in-memory cache.
+            segment_size: Maximum size of a segment file in bytes.
+            fsync: The fsync policy (`always`, `interval`, or `never`).
+            fsync_interval: Time between two fsync calls in seconds.
+            compact_ratio: Share of pending records in the oldest segment at
+                which they are copied to the current segment.
+
+        Raises:
+            ValueError: If fsync policy is invalid.
+        """
+        if fsync not in ['always', 'interval', 'never']:
+            raise ValueError(f'Invalid fsync policy "{fsync}"')
+
+        self.logger = logging.getLogger('cache')
+
+        self._path = Path(path) if path else None
+        self._segment_size = segment_size
+        self._fsync = fsync
+        self._fsync_interval = fsync_interval
+        self._compact_ratio = compact_ratio
+
+        self._lock = threading.RLock()
+        self._index = {}            # Document id -> location (or data).
+        self._segments = {}         # Segment number -> segment.
+        self._readers = {}          # Segment number -> file handle.
+        self._writer = None         # File handle of the current segment.
+        self._active = None         # The current segment.
+        self._next_id = 1
+        self._last_fsync = time.monotonic()
+        self._is_dirty = False      # Data written since the last fsync.
+        self._sync_timer = None     # Timer of an overdue fsync.
+
+        if self._path:
+            self._load()
+            self._open_segment(max(self._segments, default=0) + 1)
+
+            if self._path.is_file():
+                self._import_tinydb()
+
+            self._compact()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _append(self, record: Dict[str, Any]) -> Tuple[int, int]:
+        """Appends a record to the current segment file.
+
+        Args:
+            record: The record to append.
+
+        Returns:
+            Offset and length of the written line.
+        """
+        if self._active.size >= self._segment_size:
+            self._open_segment(self._active.number + 1)
+
+        line = (json.dumps(record) + '\n').encode('utf-8')
+        offset = self._active.size
+
+        self._writer.write(line)
+        self._writer.flush()
+        self._active.size += len(line)
+        self._is_dirty = True
+
+        now = time.monotonic()
+
+        if (self._fsync == 'always' or (self._fsync == 'interval' and
+                now - self._last_fsync >= self._fsync_interval)):
+            self._sync()
+        elif self._fsync == 'interval':
+            self._schedule_sync()
+
+        return offset, len(line)
+
+    def _compact(self) -> None:
+        """Deletes the oldest segments without pending records. Pending
+        records of the oldest segment are copied to the current segment, if
+        their share is below the compaction ratio."""
+        while len(self._segments) > 1:
+            oldest = self._segments[min(self._segments)]
+
+            if oldest is self._active:
+                break
+
+            if oldest.live > oldest.total * self._compact_ratio:
+                break
+
+            if oldest.live > 0:
+                self._move_records(oldest)
+
+                # The copies have to be on the storage device before the
+                # originals are deleted.
+                self._sync()
+
+            self._delete_segment(oldest)
+
+    def _delete_segment(self, segment: CacheSegment) -> None:
+        """Closes and deletes a segment file.
+
+        Args:
+            segment: The segment to delete.
+        """
+        reader = self._readers.pop(segment.number, None)
+
+        if reader:
+            reader.close()
+
+        del self._segments[segment.number]
+
+        try:
+            segment.path.unlink()
+            self.logger.debug(f'Deleted cache segment "{segment.path}"')
+        except OSError as e:
+            self.logger.error(f'Deleting cache segment "{segment.path}" '
+                              f'failed: {e}')
+
+    def _get_segment_path(self, number: int) -> Path:
+        """Returns the path of the segment file with the given number.
+
+        Args:
+            number: The number of the segment.
+
+        Returns:
+            Path of the segment file.
+        """
+        return self._path.with_name(f'{self._path.name}.{number:08d}')
+
+    def _load(self) -> None:
+        """Restores the index from the segment files."""
+        prefix = f'{self._path.name}.'
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+
+        for file_path in self._path.parent.glob(f'{prefix}*'):
+            suffix = file_path.name[len(prefix):]
+
+            if suffix.isdigit():
+                number = int(suffix)
+                self._segments[number] = CacheSegment(number, file_path)
+
+        for number in sorted(self._segments):
+            self._load_segment(self._segments[number])
+
+        # Restore the insertion order.
+        self._index = dict(sorted(self._index.items()))
+
+        if len(self._index) > 0:
+            self.logger.info(f'Restored {len(self._index)} record(s) from '
+                             f'cache "{self._path}"')
+
+    def _load_segment(self, segment: CacheSegment) -> None:
+        """Reads all records of a segment file into the index. Document ids
+        found in acknowledgements are never handed out again.
+
+        Args:
+            segment: The segment to read.
+        """
+        with open(str(segment.path), 'rb') as fh:
+            offset = 0
+
+            for line in fh:
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                    op = record['op']
+                except (KeyError, TypeError, ValueError):
+                    # Line has probably been truncated by a crash.
+                    self.logger.warning(f'Ignoring corrupted record in cache '
+                                        f'segment "{segment.path}"')
+                    break
+
+                if op == 'put':
+                    doc_id = record['id']
+                    self._remove_from_index(doc_id)
+                    self._index[doc_id] = (segment.number, offset, len(line))
+                    self._next_id = max(self._next_id, doc_id + 1)
+                    segment.total += 1
+                    segment.live += 1
+                elif op == 'ack':
+                    for doc_id in record['ids']:
+                        self._remove_from_index(doc_id)
+                        self._next_id = max(self._next_id, doc_id + 1)
+
+                offset += len(line)
+
+            segment.size = offset
+
+    def _import_tinydb(self) -> None:
+        """Imports the documents of a TinyDB cache file at the base path and
+        renames the file afterwards."""
+        try:
+            with open(str(self._path), encoding='utf-8') as fh:
+                tables = json.loads(fh.read() or '{}')
+
+            count = 0
+
+            for table in tables.values():
+                for key in sorted(table, key=int):
+                    self.insert(table[key])
+                    count += 1
+
+            self._path.rename(self._path.with_name(f'{self._path.name}.old'))
+            self.logger.info(f'Imported {count} record(s) from TinyDB cache '
+                             f'"{self._path}"')
+        except (AttributeError, OSError, ValueError) as e:
+            self.logger.error(f'Importing TinyDB cache "{self._path}" failed: '
+                              f'{e}')
+
+    def _move_records(self, segment: CacheSegment) -> None:
+        """Copies the pending records of a segment to the current segment.
+
+        Args:
+            segment: The segment to copy the records from.
+        """
+        doc_ids = [doc_id for doc_id, location in self._index.items()
+                   if location[0] == segment.number]
+
+        for doc_id in doc_ids:
+            data = self._read(doc_id)
+            self._put(doc_id, data)
+            segment.live -= 1
+
+        self.logger.debug(f'Moved {len(doc_ids)} record(s) from cache '
+                          f'segment "{segment.path}"')
+
+    def _open_segment(self, number: int) -> None:
+        """Opens a new segment file for writing.
+
+        Args:
+            number: The number of the segment.
+        """
+        if self._writer:
+            self._sync()
+            self._writer.close()
+
+        segment = CacheSegment(number, self._get_segment_path(number))
+        self._segments[number] = segment
+        self._writer = open(str(segment.path), 'ab')
+        self._active = segment
+
+    def _put(self, doc_id: int, data: Dict[str, Any]) -> None:
+        """Writes a data set to the current segment and adds it to the index.
+
+        Args:
+            doc_id: The document id.
+            data: The data set.
+        """
+        offset, length = self._append({'op': 'put', 'id': doc_id, 'data': data})
+        self._index[doc_id] = (self._active.number, offset, length)
+        self._active.total += 1
+        self._active.live += 1
+
+    def _read(self, doc_id: int) -> Dict[str, Any]:
+        """Reads a pending data set from its segment file.
+
+        Args:
+            doc_id: The document id.
+
+        Returns:
+            The data set.
+        """
+        number, offset, length = self._index[doc_id]
+        reader = self._readers.get(number)
+
+        if not reader:
+            reader = open(str(self._segments[number].path), 'rb')
+            self._readers[number] = reader
+
+        reader.seek(offset)
+        return json.loads(reader.read(length).decode('utf-8'))['data']
+
+    def _schedule_sync(self) -> None:
+        """Starts a timer that syncs the current segment once the fsync
+        interval has passed, unless a timer is already running."""
+        if self._sync_timer:
+            return
+
+        delay = self._fsync_interval - (time.monotonic() - self._last_fsync)
+        self._sync_timer = threading.Timer(max(delay, 0.0), self._sync_overdue)
+        self._sync_timer.daemon = True
+        self._sync_timer.start()
+
+    def _sync(self) -> None:
+        """Forces the data of the current segment onto the storage."""
+        os.fsync(self._writer.fileno())
+        self._last_fsync = time.monotonic()
+        self._is_dirty = False
+
+    def _sync_overdue(self) -> None:
+        """Syncs the current segment if data has been written since the last
+        fsync. Called by the timer."""
+        with self._lock:
+            self._sync_timer = None
+
+            if self._writer and self._is_dirty:
+                self._sync()
+
+    def _remove_from_index(self, doc_id: int) -> None:
+        """Removes a document id from the index and updates the number of
+        pending records of its segment.
+
+        Args:
+            doc_id: The document id.
+        """
+        location = self._index.pop(doc_id, None)
+
+        if location and location[0] in self._segments:
+            self._segments[location[0]].live -= 1
+
+    def close(self) -> None:
+        """Forces all data onto the storage device and closes the files."""
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+
+            self._readers = {}
+
+            if self._sync_timer:
+                self._sync_timer.cancel()
+                self._sync_timer = None
+
+            if self._writer:
+                self._sync()
+                self._writer.close()
+                self._writer = None
+
+    def first(self, count: int = 1) -> List[CacheRecord]:
+        """Returns the oldest pending data sets.
+
+        Args:
+            count: The maximum number of data sets to return.
+
+        Returns:
+            List of data sets with document id.
+        """
+        with self._lock:
+            doc_ids = list(islice(self._index, count))
+
+            if not self._path:
+                return [CacheRecord(self._index[i], i) for i in doc_ids]
+
+            return [CacheRecord(self._read(i), i) for i in doc_ids]
+
+    def insert(self, data: Dict[str, Any]) -> int:
+        """Appends a data set to the cache.
+
+        Args:
+            data: The data set.
+
+        Returns:
+            Document id of the cached data set.
+        """
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+
+            if not self._path:
+                self._index[doc_id] = data
+            else:
+                self._put(doc_id, data)
+
+            return doc_id
+
+    def remove(self, doc_ids: List[int]) -> None:
+        """Removes data sets from the cache by writing an acknowledgement.
+
+        Args:
+            doc_ids: The document ids of the data sets.
+        """
+        with self._lock:
+            doc_ids = [i for i in doc_ids if i in self._index]
+
+            if not doc_ids:
+                return
+
+            if not self._path:
+                for doc_id in doc_ids:
+                    del self._index[doc_id]
+
+                return
+
+            self._append({'op': 'ack', 'ids': doc_ids})
+
+            for doc_id in doc_ids:
+                self._remove_from_index(doc_id)
+
+            self._compact()
+
+    @property
+    def path(self) -> Path:
+        return self._path
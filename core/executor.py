@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Executors to run the message handling of modules concurrently."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import logging
+import pickle
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable
+
+from core.observation import Observation
+
+try:
+    import verboselogs
+except ImportError:
+    verboselogs = None
+
+
+class OrderedExecutor:
+    """
+    OrderedExecutor runs tasks on a pool of threads. Tasks with the same key
+    are run one after another, in the order of submission. Tasks without a
+    key (None) are run in parallel to all other tasks.
+
+    The number of submitted but unfinished tasks is limited to twice the
+    number of threads. If the limit is reached, `submit()` blocks, so that the
+    backpressure is passed on to the inbox of the module.
+    """
+
+    def __init__(self, max_workers: int, name: str = 'executor'):
+        """
+        Args:
+            max_workers: Number of threads.
+            name: Name of the logger and prefix of the thread names.
+        """
+        self.logger = logging.getLogger(name)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = {}      # Waiting tasks by key.
+        self._is_shutdown = False
+        self._slots = threading.Semaphore(max_workers * 2)
+
+    def _run(self,
+             key: Hashable,
+             func: Callable[..., Any],
+             args: tuple) -> None:
+        """Runs a task and all tasks with the same key submitted meanwhile.
+
+        Args:
+            key: The key of the task.
+            func: The function to call.
+            args: The arguments of the function.
+        """
+        while True:
+            try:
+                func(*args)
+            except Exception as e:
+                self.logger.error(f'Task failed: {e}')
+            finally:
+                self._slots.release()
+
+            if key is None:
+                return
+
+            with self._lock:
+                tasks = self._pending[key]
+
+                if not tasks:
+                    del self._pending[key]
+                    return
+
+                func, args = tasks.popleft()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Shuts the thread pool down.
+
+        Args:
+            wait: If True, wait until all running tasks are finished.
+        """
+        with self._lock:
+            self._is_shutdown = True
+
+        self._executor.shutdown(wait=wait)
+
+    def submit(self,
+               key: Hashable,
+               func: Callable[..., Any],
+               *args: Any) -> None:
+        """Submits a task. Blocks if too many tasks are unfinished.
+
+        Args:
+            key: The key of the task (or None).
+            func: The function to call.
+            *args: The arguments of the function.
+
+        Raises:
+            RuntimeError: If the executor has been shut down.
+        """
+        self._slots.acquire()
+
+        with self._lock:
+            if self._is_shutdown:
+                self._slots.release()
+                raise RuntimeError('Cannot submit task after shutdown')
+
+            if key is not None:
+                if key in self._pending:
+                    # Another task with the same key is still running.
+                    self._pending[key].append((func, args))
+                    return
+
+                self._pending[key] = deque()
+
+            # Submitted under the lock, so that the thread pool cannot be shut
+            # down in between.
+            self._executor.submit(self._run, key, func, args)
+
+
+# Worker of the current child process of a process pool.
+_worker = None
+
+
+def init_process_worker(data: bytes) -> None:
+    """Initialises a child process of a process pool with a copy of the
+    worker. The worker is unpickled only after the verbose log levels have been
+    installed.
+
+    Args:
+        data: The pickled worker.
+    """
+    global _worker
+
+    if verboselogs:
+        verboselogs.install()
+
+    _worker = pickle.loads(data)
+
+
+def process_in_worker(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Processes an observation with the worker of the current child process.
+
+    Args:
+        payload: The observation data.
+
+    Returns:
+        The data of the processed observation, or None.
+    """
+    obs = _worker.process_observation(Observation(payload))
+    return obs.data if obs else None
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+"""Bounded message inbox of a module."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import logging
+import queue
+import threading
+
+from collections import deque
+from typing import Any, Dict
+
+from core.cache import AppendOnlyCache
+
+
+class Inbox:
+    """
+    Inbox is a thread-safe FIFO queue for the messages of a module, with an
+    optional capacity. If the capacity is reached, the overflow policy
+    determines what happens to new messages:
+
+    * `block`: the sender waits until space is available (default), but not
+      longer than the block timeout. Messages put without blocking, like
+      those received by the MQTT messenger, are discarded,
+    * `dropNewest`: the new message is discarded,
+    * `dropOldest`: the oldest message is discarded,
+    * `spill`: the new message is written to an append-only cache on disk,
+      and read back as soon as space is available.
+
+    Spilled messages are kept across restarts. The number of waiting, dropped,
+    and spilled messages can be read from the statistics of the inbox.
+
+    The methods `get()`, `get_nowait()`, and `put()` are compatible to class
+    `queue.Queue`.
+    """
+
+    POLICIES = ['block', 'dropNewest', 'dropOldest', 'spill']
+
+    def __init__(self,
+                 capacity: int = 0,
+                 overflow: str = 'block',
+                 spill_path: str = None,
+                 name: str = 'inbox',
+                 block_timeout: float = 5.0):
+        """
+        Args:
+            capacity: Maximum number of messages in memory (0 for unbounded).
+            overflow: The overflow policy.
+            spill_path: Base path of the spill files (policy `spill` only).
+            name: Name of the logger.
+            block_timeout: Maximum time in seconds senders wait for space
+                (policy `block` only).
+
+        Raises:
+            ValueError: If overflow policy is invalid or spill path is
+                missing.
+        """
+        if overflow not in self.POLICIES:
+            raise ValueError(f'Invalid overflow policy "{overflow}"')
+
+        if overflow == 'spill' and not spill_path:
+            raise ValueError('No spill path set')
+
+        self.logger = logging.getLogger(name)
+
+        self._capacity = max(capacity, 0)
+        self._overflow = overflow
+        self._block_timeout = block_timeout
+        self._queue = deque()
+        self._lock = threading.Condition()
+        self._is_closed = False
+
+        self._dropped = 0       # Number of discarded messages.
+        self._spilled = 0       # Number of messages written to disk.
+        self._spill = None
+
+        if self._overflow == 'spill':
+            self._spill = AppendOnlyCache(spill_path, fsync='never')
+
+    def __len__(self) -> int:
+        return len(self._queue) + (len(self._spill) if self._spill else 0)
+
+    def _drop(self) -> None:
+        """Counts a discarded message and logs a warning on the first one and
+        on every thousandth afterwards."""
+        self._dropped += 1
+
+        if self._dropped % 1000 == 1:
+            self.logger.warning(f'Inbox is full, dropped {self._dropped} '
+                                f'message(s) so far (policy '
+                                f'"{self._overflow}")')
+
+    def _has_messages(self) -> bool:
+        return len(self._queue) > 0 or bool(self._spill and len(self._spill))
+
+    def _is_full(self) -> bool:
+        return 0 < self._capacity <= len(self._queue)
+
+    def _refill(self) -> None:
+        """Moves spilled messages back into memory, once half of the capacity
+        is available."""
+        if not self._spill or len(self._queue) > self._capacity // 2:
+            return
+
+        records = self._spill.first(self._capacity - len(self._queue))
+
+        if not records:
+            return
+
+        self._queue.extend(dict(record) for record in records)
+        self._spill.remove(doc_ids=[record.doc_id for record in records])
+
+    def close(self) -> None:
+        """Closes the spill files and wakes up all blocked senders, whose
+        messages are discarded."""
+        with self._lock:
+            self._is_closed = True
+            self._lock.notify_all()
+
+        if self._spill:
+            self._spill.close()
+
+    def get(self, block: bool = True, timeout: float = None) -> Any:
+        """Removes and returns the oldest message.
+
+        Args:
+            block: If True, wait until a message is available.
+            timeout: Maximum time to wait in seconds (None for no limit).
+
+        Returns:
+            The message.
+
+        Raises:
+            queue.Empty: If no message is available.
+        """
+        with self._lock:
+            if not self._lock.wait_for(self._has_messages,
+                                       timeout if block else 0):
+                raise queue.Empty
+
+            if not self._queue:
+                self._refill()
+
+            message = self._queue.popleft()
+            self._refill()
+            self._lock.notify_all()
+
+            return message
+
+    def get_nowait(self) -> Any:
+        """Removes and returns the oldest message without waiting.
+
+        Returns:
+            The message.
+
+        Raises:
+            queue.Empty: If no message is available.
+        """
+        return self.get(block=False)
+
+    def put(self,
+            message: Any,
+            block: bool = True,
+            timeout: float = None) -> bool:
+        """Appends a message. Depending on the overflow policy, the method
+        blocks or discards a message if the inbox is full. Never call it with
+        `block=True` from a messenger callback, as all other deliveries would
+        wait as well.
+
+        Args:
+            message: The message.
+            block: If False, the message is discarded instead of waiting, if
+                the inbox is full and the overflow policy is `block`.
+            timeout: Maximum time to wait in seconds (None for no limit). The
+                message is discarded if the inbox is still full afterwards, or
+                if the inbox has been closed meanwhile.
+
+        Returns:
+            True if message has been stored, False if it has been dropped.
+        """
+        with self._lock:
+            # Once messages have been spilled, new messages have to be
+            # spilled as well, in order to keep their order.
+            if self._is_full() or (self._spill and len(self._spill)):
+                if self._overflow == 'block' and block:
+                    self._lock.wait_for(lambda: (self._is_closed or
+                                                 not self._is_full()),
+                                        timeout)
+
+                    if self._is_closed or self._is_full():
+                        self._drop()
+                        return False
+                elif self._overflow in ['block', 'dropNewest']:
+                    self._drop()
+                    return False
+                elif self._overflow == 'dropOldest':
+                    self._queue.popleft()
+                    self._drop()
+                elif self._overflow == 'spill':
+                    try:
+                        self._spill.insert(message)
+                        self._spilled += 1
+                    except (OSError, TypeError, ValueError) as e:
+                        self.logger.error(f'Spilling message failed: {e}')
+                        self._drop()
+                        return False
+
+                    self._lock.notify_all()
+                    return True
+
+            self._queue.append(message)
+            self._lock.notify_all()
+
+            return True
+
+    @property
+    def block_timeout(self) -> float:
+        return self._block_timeout
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def overflow(self) -> str:
+        return self._overflow
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        """Returns the statistics of the inbox.
+
+        Returns:
+            Capacity, overflow policy, current depth, and number of dropped
+            and spilled messages.
+        """
+        return {
+            'capacity': self._capacity,
+            'depth': len(self),
+            'dropped': self._dropped,
+            'overflow': self._overflow,
+            'spilled': self._spilled
+        }
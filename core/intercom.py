@@ -5,20 +5,173 @@ __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 import asyncio
+import base64
 import json
 import logging
 import ssl
+import threading
+import time
 
+from pathlib import Path
 from threading import Thread
-from typing import Any, Callable, Dict, List, Type
+from typing import Any, Callable, Dict, List, Type, Union
 
 import paho.mqtt.client as paho
 
+from core.cache import AppendOnlyCache
+
 try:
     from hbmqtt.broker import Broker
 except ImportError:
     logging.getLogger().warning('Importing Python module "HBMQTT" failed')
 
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Codec:
+    """
+    Codec is the base class of the wire formats of MQTT messages. Binary
+    formats prepend a marker byte to the encoded message, so that the
+    receiver detects the format automatically. JSON messages have no marker,
+    as they never start with a control character.
+    """
+
+    marker = b''
+    name = None
+
+    def decode(self, data: bytes) -> Any:
+        """Decodes a message, including the marker.
+
+        Args:
+            data: The encoded message.
+
+        Returns:
+            The message.
+
+        Raises:
+            ValueError: If data is invalid.
+        """
+        raise NotImplementedError
+
+    def encode(self, message: Any) -> bytes:
+        """Encodes a message and prepends the marker.
+
+        Args:
+            message: The message.
+
+        Returns:
+            The encoded message.
+
+        Raises:
+            TypeError: If message is not serialisable.
+        """
+        raise NotImplementedError
+
+    @property
+    def is_available(self) -> bool:
+        return True
+
+
+class CborCodec(Codec):
+    """
+    CborCodec encodes messages in CBOR (RFC 7049). Requires the Python module
+    `cbor2`.
+    """
+
+    marker = b'\x02'
+    name = 'cbor'
+
+    def decode(self, data: bytes) -> Any:
+        try:
+            return cbor2.loads(data[1:])
+        except cbor2.CBORDecodeError as e:
+            raise ValueError(str(e))
+
+    def encode(self, message: Any) -> bytes:
+        try:
+            return self.marker + cbor2.dumps(message)
+        except cbor2.CBOREncodeError as e:
+            raise TypeError(str(e))
+
+    @property
+    def is_available(self) -> bool:
+        return cbor2 is not None
+
+
+class JsonCodec(Codec):
+    """
+    JsonCodec encodes messages in JSON. This is the default format, and the
+    only one understood by consumers outside of OpenADMS Node.
+    """
+
+    name = 'json'
+
+    def decode(self, data: bytes) -> Any:
+        return json.loads(str(data, encoding='UTF-8'))
+
+    def encode(self, message: Any) -> bytes:
+        return json.dumps(message).encode('UTF-8')
+
+
+class MessagePackCodec(Codec):
+    """
+    MessagePackCodec encodes messages in MessagePack. Requires the Python
+    module `msgpack`.
+    """
+
+    marker = b'\x01'
+    name = 'msgpack'
+
+    def decode(self, data: bytes) -> Any:
+        try:
+            return msgpack.unpackb(data[1:], raw=False)
+        except (msgpack.UnpackException, ValueError) as e:
+            raise ValueError(str(e))
+
+    def encode(self, message: Any) -> bytes:
+        return self.marker + msgpack.packb(message, use_bin_type=True)
+
+    @property
+    def is_available(self) -> bool:
+        return msgpack is not None
+
+
+# Available codecs by name and by marker.
+CODECS = {codec.name: codec for codec in [CborCodec(),
+                                          JsonCodec(),
+                                          MessagePackCodec()]}
+MARKERS = {codec.marker: codec for codec in CODECS.values() if codec.marker}
+
+
+def decode_message(data: bytes) -> Any:
+    """Decodes a message in any of the supported formats. The format is
+    detected by the leading marker byte.
+
+    Args:
+        data: The encoded message.
+
+    Returns:
+        The message.
+
+    Raises:
+        ValueError: If format is not supported or data is invalid.
+    """
+    codec = MARKERS.get(data[:1], CODECS['json'])
+
+    if not codec.is_available:
+        raise ValueError(f'Python module for format "{codec.name}" is '
+                         f'missing')
+
+    return codec.decode(data)
+
 
 class MQTTMessageBroker:
     """
@@ -37,7 +190,7 @@ class MQTTMessageBroker:
             'listeners': {
                 'default': {
                     'max-connections': 50000,
-                    'bind': '127.0.0.1:1883',
+                    'bind': f'{host}:{port}',
                     'type': 'tcp',
                 },
             },
@@ -82,11 +235,122 @@ class MQTTMessageBroker:
             loop.stop()
 
 
+class LocalMessage(dict):
+    """
+    LocalMessage marks a message that has been delivered in-process by the
+    `LocalMessenger`. Messages received from the message broker are plain
+    dictionaries, so that the mark cannot be forged by MQTT clients.
+    """
+
+
+class LocalMessenger:
+    """
+    LocalMessenger delivers messages between modules of the same node without
+    a round trip through the MQTT message broker. Header and payload are put as
+    dictionaries directly into the inbox of the receiving module, which is
+    looked up by name in the module manager. Messages to any other topic are
+    left to the MQTT messenger.
+    """
+
+    def __init__(self, manager: Any):
+        """
+        Args:
+            manager: The manager object.
+        """
+        self.logger = logging.getLogger('local')
+
+        self._type = 'core.intercom.LocalMessenger'
+
+        self._config_manager = manager.config
+        self._module_manager = manager.module
+        self._schema_manager = manager.schema
+
+        config = self._get_config('intercom', 'local')
+        self._is_enabled = config.get('enabled', True)
+
+    def _get_config(self, *args):
+        """Returns the validated configuration of the messenger.
+
+        Args:
+            *args: Key names to the configuration in the dictionary.
+
+        Returns:
+            A dictionary with the messenger's configuration.
+        """
+        schema_path = self._schema_manager.get_schema_path(self._type)
+        self._schema_manager.add_schema(self._type, schema_path)
+
+        return self._config_manager.get_valid_config(self._type, 'core', *args)
+
+    def publish(self, target: str, message: Dict[str, Dict]) -> bool:
+        """Puts the message into the inbox of the local module with the given
+        name. The message is passed by reference, the sender must not alter
+        it afterwards.
+
+        Args:
+            target: Name of the receiving module.
+            message: Header and payload of the message, both Dict.
+
+        Returns:
+            True if message has been delivered, False if no local module of
+            the given name exists.
+        """
+        if not self._is_enabled:
+            return False
+
+        module = self._module_manager.get(target)
+
+        if not module:
+            return False
+
+        module.retrieve(message, is_local=True)
+        return True
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._is_enabled
+
+
 class MQTTMessenger:
     """
     MQTTMessenger connects to an MQTT message broker and exchanges messages.
+
+    Each subscribed topic has its own downlink function, so that a single
+    client is able to serve several modules. Messages are forwarded to the
+    downlink function of their topic. If `shared` is enabled in the
+    configuration, all modules of the node use the same messenger. A shared
+    messenger is connected only once, and is not disconnected by single
+    modules.
+
+    Messages between modules are encoded in the format set by `codec`
+    (`json`, `msgpack`, or `cbor`). Received messages are decoded in any
+    supported format.
+
+    By default, the network traffic of the client is handled by a thread of
+    its own. Alternatively, the coroutine `run_async()` handles the traffic on
+    an asyncio event loop. After connection loss, the client reconnects with
+    an exponential backoff between `minReconnectDelay` and
+    `maxReconnectDelay`.
+
+    For reliable delivery, the messenger may use a persistent session
+    (`persistentSession`) and a minimum Quality of Service (`qos`) for all
+    messages and subscriptions. If `spoolPath` is set, messages published
+    while the connection is lost are stored in an on-disk spool of at most
+    `spoolSize` messages. Once reconnected, the spooled messages are sent in
+    their original order and removed only after the message broker has
+    acknowledged them (at-least-once delivery).
     """
 
+    # Number of spooled messages to send at once.
+    REPLAY_BATCH_SIZE = 100
+
+    # Time in seconds to wait for the acknowledgement of spooled messages.
+    REPLAY_TIMEOUT = 30.0
+
+    # Time in seconds to wait before spooled messages the client has not
+    # accepted are sent again.
+    REPLAY_RETRY_DELAY = 1.0
+
     def __init__(self, manager: Any, client_id: str):
         """
         Args:
@@ -107,21 +371,81 @@ class MQTTMessenger:
         self._client_id = client_id
         self._host = config.get('host')
         self._port = config.get('port')
+        self._socket_path = config.get('socketPath')
         self._keep_alive = config.get('keepAlive')
         self._topic = config.get('topic')
         self._user = config.get('user') or ''
         self._password = config.get('password') or ''
         self._tls = config.get('tls') or False
         self._ca_certs = config.get('caCerts')
+        self._is_shared = config.get('shared', False)
+        self._codec = CODECS.get(config.get('codec', 'json'))
+        self._is_persistent = config.get('persistentSession', False)
+        self._qos = config.get('qos', 0)
+        self._spool_path = config.get('spoolPath')
+        self._spool_size = config.get('spoolSize', 10000)
+        self._min_reconnect_delay = config.get('minReconnectDelay', 1)
+        self._max_reconnect_delay = config.get('maxReconnectDelay', 120)
+
+        if not self._codec.is_available:
+            self.logger.warning(f'Python module for format '
+                                f'"{self._codec.name}" is missing, using '
+                                f'JSON instead')
+            self._codec = CODECS['json']
 
         # Function to send received messages to.
         self._downlink = None
 
-        # MQTT client configuration.
-        self._client = paho.Client(client_id=self._client_id,
-                                   clean_session=True,
-                                   userdata=None,
-                                   protocol=paho.MQTTv311)
+        # Downlink functions by subscribed topic.
+        self._downlinks = {}
+
+        # Optional asyncio event loop that handles the network traffic.
+        self._loop = None
+        self._loop_thread = None
+        self._is_running = False
+
+        # Modules of a shared messenger may call `connect()` concurrently.
+        self._connect_lock = threading.Lock()
+        self._is_started = False
+
+        # Current reconnect delay in seconds (asyncio only).
+        self._reconnect_delay = self._min_reconnect_delay
+
+        # Optional on-disk spool of messages that could not be sent.
+        self._spool = None
+        self._spool_lock = threading.Lock()
+        self._is_replaying = False
+        self._dropped = 0
+
+        if self._spool_path:
+            self._spool = AppendOnlyCache(Path(self._spool_path) /
+                                          self._client_id)
+
+            if len(self._spool) > 0:
+                self.logger.info(f'Found {len(self._spool)} spooled '
+                                 f'message(s) of client "{self._client_id}"')
+
+        # MQTT client configuration. The session of a persistent client is
+        # kept by the message broker, so that the client id has to be unique.
+        # A Unix domain socket requires paho-mqtt 2.0 or later.
+        try:
+            self._client = paho.Client(client_id=self._client_id,
+                                       clean_session=not self._is_persistent,
+                                       userdata=None,
+                                       protocol=paho.MQTTv311,
+                                       transport='unix' if self._socket_path
+                                       else 'tcp')
+        except ValueError:
+            self.logger.warning('Unix domain sockets are not supported by '
+                                'paho-mqtt, using TCP instead')
+            self._socket_path = None
+            self._client = paho.Client(client_id=self._client_id,
+                                       clean_session=not self._is_persistent,
+                                       userdata=None,
+                                       protocol=paho.MQTTv311)
+
+        # Address of the message broker, for connecting and logging.
+        self._address = self._socket_path or f'{self._host}:{self._port}'
 
         if self._user:
             self._client.username_pw_set(self._user, self._password)
@@ -132,6 +456,9 @@ class MQTTMessenger:
                                  tls_version=ssl.PROTOCOL_TLS, ciphers=None)
             self._client.tls_insecure_set(False)
 
+        self._client.reconnect_delay_set(min_delay=self._min_reconnect_delay,
+                                         max_delay=self._max_reconnect_delay)
+
         self._client.on_connect = self._on_connect
         self._client.on_disconnect = self._on_disconnect
         self._client.on_message = self._on_message
@@ -160,76 +487,376 @@ class MQTTMessenger:
     def _on_connect(self, client: Type[paho.Client], userdata: Any,
                     flags: Dict[str, int], rc: int) -> None:
         """Callback method is called after a connection has been established."""
-        self.logger.debug(f'Connected "{self._client_id}" to '
-                          f'{self._host}:{self._port}')
+        self.logger.debug(f'Connected "{self._client_id}" to {self._address}')
         self._is_connected = True
-        self._client.subscribe(self._topic)
+        self._reconnect_delay = self._min_reconnect_delay
+
+        # Subscribe to the topics of all modules in a single request.
+        topics = [(topic, self._qos) for topic in list(self._downlinks)]
+
+        if topics:
+            self._client.subscribe(topics)
+
+        self._start_replay()
 
     def _on_disconnect(self, client: Type[paho.Client], userdata: Any,
                        rc: int) -> None:
         """Callback method is called after disconnection."""
+        self._is_connected = False
+
         if rc != 0:
-            self.logger.error(f'Unexpected disconnection from '
-                              f'{self._host}:{self._port}')
-            self.logger.info(f'Reconnecting to {self._host}:{self._port} ...')
-            self.connect()
+            self.logger.error(f'Unexpected disconnection from {self._address}')
+
+            # Reconnection is done by the network thread of the client or
+            # by `run_async()`.
 
     def _on_message(self, client: Type[paho.Client], userdata: Any,
                     msg: Type[paho.MQTTMessage]) -> None:
-        """Callback method for incoming messages. Converts the JSON-based
-        message to its real data type and then forwards it to the downlink
-        function."""
+        """Callback method for incoming messages. Decodes the message and then
+        forwards it to the downlink function of the topic."""
+        downlink = self._downlinks.get(msg.topic) or self._downlink
+
+        if not downlink:
+            self.logger.warning(f'No receiver for topic "{msg.topic}"')
+            return
+
         try:
-            data = json.loads(str(msg.payload, encoding='UTF-8'))
-            self._downlink(data)
-        except json.JSONDecodeError:
+            data = decode_message(msg.payload)
+        except ValueError as e:
             self.logger.error(f'Message from client "{client}" is corrupted '
-                              f'(invalid JSON)')
+                              f'({e})')
+            return
+
+        downlink(data)
+
+    def _replay(self) -> None:
+        """Sends the spooled messages in their original order and removes
+        them from the spool once the message broker has acknowledged them.
+        Runs within a thread, until the spool is empty or the connection is
+        lost. The thread only ends while holding the spool lock, so that
+        `publish()` never spools a message without a running replay."""
+        count = 0
+
+        while True:
+            with self._spool_lock:
+                records = []
+
+                if self._is_connected:
+                    records = self._spool.first(self.REPLAY_BATCH_SIZE)
+
+                if not records:
+                    self._is_replaying = False
+                    break
+
+            results = [self._client.publish(record['topic'],
+                                            base64.b64decode(record['payload']),
+                                            record['qos'],
+                                            record['retain'])
+                       for record in records]
+
+            # Keep waiting for the acknowledgements as long as the client is
+            # connected. The spooled messages are sent again after a
+            # reconnect.
+            while not self._wait_for_publish(results):
+                if not self._is_connected:
+                    self.logger.warning(f'Sending spooled messages of client '
+                                        f'"{self._client_id}" interrupted')
+                    break
+
+                # Messages not accepted by the client are never acknowledged.
+                # Read them from the spool again, instead of waiting on the
+                # same results.
+                if any(result.rc != paho.MQTT_ERR_SUCCESS
+                       for result in results):
+                    self.logger.warning(f'Sending spooled messages of client '
+                                        f'"{self._client_id}" failed, '
+                                        f'retrying in '
+                                        f'{self.REPLAY_RETRY_DELAY} s ...')
+                    time.sleep(self.REPLAY_RETRY_DELAY)
+                    break
+
+                self.logger.warning(f'Spooled messages of client '
+                                    f'"{self._client_id}" have not been '
+                                    f'acknowledged yet')
+            else:
+                with self._spool_lock:
+                    self._spool.remove([record.doc_id for record in records])
+
+                count += len(records)
+
+        if count > 0:
+            self.logger.info(f'Sent {count} spooled message(s) of client '
+                             f'"{self._client_id}"')
+
+    def _spool_message(self, topic: str, message: Union[bytes, str],
+                       qos: int, retain: bool) -> None:
+        """Appends a message to the spool. If the spool is full, the oldest
+        message is dropped. The caller must hold the spool lock.
+
+        Args:
+            topic: Topic to publish to.
+            message: Encoded message to publish.
+            qos: Quality of Service (0, 1, or 2).
+            retain: Retained message or not.
+        """
+        if self._spool_size and len(self._spool) >= self._spool_size:
+            oldest = self._spool.first(1)
+            self._spool.remove([record.doc_id for record in oldest])
+            self._dropped += 1
+
+            if self._dropped % 1000 == 1:
+                self.logger.warning(f'Spool of client "{self._client_id}" is '
+                                    f'full, dropped {self._dropped} '
+                                    f'message(s) so far')
+
+        if isinstance(message, str):
+            message = message.encode('utf-8')
+
+        self._spool.insert({
+            'topic': topic,
+            'payload': base64.b64encode(message).decode('ascii'),
+            'qos': qos,
+            'retain': retain
+        })
+
+    def _start_replay(self) -> None:
+        """Starts a thread that sends the spooled messages, unless the client
+        is disconnected, the spool is empty, or the thread is still
+        running."""
+        if not self._spool:
+            return
+
+        with self._spool_lock:
+            if (not self._is_connected or self._is_replaying or
+                    len(self._spool) == 0):
+                return
+
+            self._is_replaying = True
+
+        Thread(target=self._replay,
+               name=f'{self._client_id}-replay',
+               daemon=True).start()
+
+    def _wait_for_publish(self, results: List[paho.MQTTMessageInfo]) -> bool:
+        """Waits until all given messages have been sent (QoS 0) or
+        acknowledged by the message broker (QoS 1 and 2).
+
+        Args:
+            results: The message information returned by the client.
+
+        Returns:
+            True if all messages have been sent, False on timeout, connection
+            loss, or if the client has not accepted a message.
+        """
+        deadline = time.monotonic() + self.REPLAY_TIMEOUT
+
+        while time.monotonic() < deadline:
+            if any(result.rc != paho.MQTT_ERR_SUCCESS for result in results):
+                return False
+
+            if all(result.is_published() for result in results):
+                return True
+
+            if not self._is_connected:
+                return False
+
+            time.sleep(0.05)
+
+        return False
+
+    async def _wait_for_reconnect(self) -> None:
+        """Waits for the current reconnect delay, and doubles the delay for the
+        next attempt, up to the maximum delay (asyncio only)."""
+        self.logger.info(f'Reconnecting to {self._address} in '
+                         f'{self._reconnect_delay} s ...')
+        await asyncio.sleep(self._reconnect_delay)
+        self._reconnect_delay = min(self._reconnect_delay * 2,
+                                    self._max_reconnect_delay)
+
+    def _call_in_loop(self, func: Callable[..., Any], *args: Any) -> None:
+        """Calls a function in the thread of the event loop (asyncio only).
+
+        Args:
+            func: The function.
+            *args: The arguments of the function.
+        """
+        if threading.get_ident() == self._loop_thread:
+            func(*args)
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _on_socket_close(self, client: Type[paho.Client], userdata: Any,
+                         sock: Any) -> None:
+        """Callback method is called before the socket is closed (asyncio
+        only)."""
+        self._call_in_loop(self._loop.remove_reader, sock.fileno())
+
+    def _on_socket_open(self, client: Type[paho.Client], userdata: Any,
+                        sock: Any) -> None:
+        """Callback method is called after the socket has been opened (asyncio
+        only). Incoming data is read by the event loop."""
+        self._call_in_loop(self._loop.add_reader, sock.fileno(),
+                           self._client.loop_read)
+
+    def _on_socket_register_write(self, client: Type[paho.Client],
+                                  userdata: Any, sock: Any) -> None:
+        """Callback method is called if outgoing data is waiting (asyncio
+        only). May be called from any thread."""
+        self._call_in_loop(self._loop.add_writer, sock.fileno(),
+                           self._client.loop_write)
+
+    def _on_socket_unregister_write(self, client: Type[paho.Client],
+                                    userdata: Any, sock: Any) -> None:
+        """Callback method is called if all outgoing data has been sent
+        (asyncio only)."""
+        self._call_in_loop(self._loop.remove_writer, sock.fileno())
 
     def connect(self) -> None:
-        """Connect to the message broker."""
-        if self._client:
-            self._client.connect_async(host=self._host,
+        """Connect to the message broker. A shared messenger is connected by
+        the first call only."""
+        if not self._client:
+            self.logger.error('Can\'t connect to MQTT message broker')
+            return
+
+        with self._connect_lock:
+            if self._is_shared and self._is_started:
+                return
+
+            self._is_started = True
+            self._client.connect_async(host=self._socket_path or self._host,
                                        port=self._port,
                                        keepalive=self._keep_alive,
                                        bind_address='')
             self._client.loop_start()
-        else:
-            self.logger.error('Can\'t connect to MQTT message broker')
 
     def disconnect(self) -> None:
         """Disconnect from the message broker."""
         if self._client:
             self._is_connected = False
-            self._client.loop_stop()
+            self._is_running = False
+            self._is_started = False
+
+            if not self._loop:
+                self._client.loop_stop()
+
             self._client.disconnect()
 
-    def publish(self, topic: str, message: str, qos: int = 0,
+    def publish(self, topic: str, message: Union[bytes, str], qos: int = 0,
                 retain: bool = False) -> None:
         """Send message to the message broker.
 
         Args:
             topic: Topic to publish to.
-            message: Message to publish.
+            message: Encoded message to publish.
             qos: Quality of Service (0, 1, or 2).
             retain: Retained message or not.
         """
+        qos = max(qos, self._qos)
+
+        if self._spool is not None:
+            with self._spool_lock:
+                # Messages are spooled as long as older ones are waiting, to
+                # keep the order of delivery.
+                is_spooled = not self._is_connected or len(self._spool) > 0
+
+                if is_spooled:
+                    self._spool_message(topic, message, qos, retain)
+
+            if is_spooled:
+                # Restart the replay, in case it has ended while connected.
+                self._start_replay()
+                return
+
         result = self._client.publish(topic, message, qos, retain)
 
-        if result.rc == paho.MQTT_ERR_NO_CONN:
+        if result.rc == paho.MQTT_ERR_NO_CONN and qos > 0:
+            # The client has queued the message and sends it after
+            # reconnecting.
+            self.logger.debug(f'Queued message to "{topic}" until reconnect')
+        elif result.rc == paho.MQTT_ERR_NO_CONN and self._spool is not None:
+            with self._spool_lock:
+                self._spool_message(topic, message, qos, retain)
+        elif result.rc == paho.MQTT_ERR_NO_CONN:
             self.logger.error('Publishing message failed: no connection')
         elif result.rc != paho.MQTT_ERR_SUCCESS:
             self.logger.error(f'Publishing message failed: {paho.error_string(result.rc)}')
 
-    def subscribe(self, topic) -> None:
-        """Set the topic the client should subscribe from the message
-        broker."""
-        self._topic = topic
+    async def run_async(self) -> None:
+        """Connects to the message broker and handles the network traffic of
+        the client on the running asyncio event loop, instead of a network
+        thread. Reconnects after connection loss, with a delay that is doubled
+        after each failed attempt. Runs until `disconnect()` is called."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._is_running = True
+
+        self._client.on_socket_open = self._on_socket_open
+        self._client.on_socket_close = self._on_socket_close
+        self._client.on_socket_register_write = self._on_socket_register_write
+        self._client.on_socket_unregister_write = \
+            self._on_socket_unregister_write
+
+        while self._is_running:
+            try:
+                # Blocks until the connection has been established.
+                await self._loop.run_in_executor(None,
+                                                 self._client.connect,
+                                                 self._socket_path or
+                                                 self._host,
+                                                 self._port,
+                                                 self._keep_alive)
+            except (OSError, ValueError) as e:
+                self.logger.error(f'Connecting to {self._address} failed: {e}')
+                await self._wait_for_reconnect()
+                continue
+
+            # Send pings and check timeouts, as long as the client is
+            # connected.
+            while (self._is_running and
+                   self._client.loop_misc() == paho.MQTT_ERR_SUCCESS):
+                await asyncio.sleep(1.0)
+
+            if self._is_running:
+                await self._wait_for_reconnect()
+
+    def subscribe(self,
+                  topic: str,
+                  downlink: Callable[[List[Dict]], None] = None) -> None:
+        """Subscribes to a topic of the message broker. Messages of the topic
+        are forwarded to the given downlink function, or to the default
+        downlink function.
+
+        Args:
+            topic: The topic.
+            downlink: Optional downlink function of the topic.
+        """
+        self._downlinks[topic] = downlink
+
+        if self._is_connected:
+            self._client.subscribe(topic, self._qos)
+
+    def unsubscribe(self, topic: str) -> None:
+        """Unsubscribes from a topic of the message broker.
+
+        Args:
+            topic: The topic.
+        """
+        if topic not in self._downlinks:
+            return
+
+        del self._downlinks[topic]
+
+        if self._is_connected:
+            self._client.unsubscribe(topic)
 
     @property
     def client(self) -> paho.Client:
         return self._client
 
+    @property
+    def codec(self) -> Codec:
+        return self._codec
+
     @property
     def downlink(self) -> Callable[[List[Dict]], None]:
         return self._downlink
@@ -242,10 +869,22 @@ class MQTTMessenger:
     def is_connected(self) -> bool:
         return self._is_connected
 
+    @property
+    def is_persistent(self) -> bool:
+        return self._is_persistent
+
+    @property
+    def is_shared(self) -> bool:
+        return self._is_shared
+
     @property
     def port(self) -> int:
         return self._port
 
+    @property
+    def spool(self) -> AppendOnlyCache:
+        return self._spool
+
     @property
     def topic(self) -> str:
         return self._topic
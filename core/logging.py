@@ -7,9 +7,195 @@ __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
 
-from collections import deque
-from typing import Any
+from array import array
+from collections import ChainMap, deque, namedtuple
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+# Additional log levels of the Python module `verboselogs`.
+SPAM = 5
+VERBOSE = 15
+NOTICE = 25
+SUCCESS = 35
+
+
+class LogContext(Mapping):
+    """
+    LogContext is a read-only view of selected values of an object with a
+    `get()` method, like an observation, to be used as fields of log
+    messages. The values are looked up on access only, so that the context is
+    never out of date.
+    """
+
+    __slots__ = ('_source', '_keys')
+
+    def __init__(self, source: Any, keys: Dict[str, str]):
+        """
+        Args:
+            source: The object that provides the values.
+            keys: The keys of the values in the source by field name.
+        """
+        self._source = source
+        self._keys = keys
+
+    def __getitem__(self, field: str) -> Any:
+        return self._source.get(self._keys[field])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class LazyValue:
+    """
+    LazyValue defers the computation of a field value in a log message of
+    `LazyLogger` until the message is formatted.
+
+    Example:
+        self.logger.verbose('Received "{response}"',
+                            response=LazyValue(self.sanitize, response))
+    """
+
+    __slots__ = ('_func', '_args')
+
+    def __init__(self, func: Callable[..., Any], *args: Any):
+        """
+        Args:
+            func: The function that returns the value.
+            *args: The arguments of the function.
+        """
+        self._func = func
+        self._args = args
+
+    def __format__(self, format_spec: str) -> str:
+        return format(self._func(*self._args), format_spec)
+
+    def __str__(self) -> str:
+        return str(self._func(*self._args))
+
+
+class LazyLogger:
+    """
+    LazyLogger is a facade of `logging.Logger` that formats log messages only
+    if their level is enabled. The messages are templates in the syntax of
+    `str.format()`. Their fields are replaced by the keyword arguments and, if
+    an observation is given, by its log context (`name`, `target`, `sensor`,
+    and `port`). Messages without fields are logged unchanged.
+
+    Example:
+        self.logger.debug('Response "{response}" of observation "{name}" of '
+                          'target "{target}" is within limits', obs,
+                          response=response_name)
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: The name of the logger.
+        """
+        self._logger = logging.getLogger(name)
+
+    def __reduce__(self):
+        return LazyLogger, (self._logger.name,)
+
+    def isEnabledFor(self, level: int) -> bool:
+        """Returns whether messages of the given level are logged.
+
+        Args:
+            level: The log level.
+
+        Returns:
+            True if the level is enabled.
+        """
+        return self._logger.isEnabledFor(level)
+
+    def _log(self,
+             level: int,
+             msg: str,
+             obs: Any,
+             fields: Dict[str, Any]) -> None:
+        """Formats and logs a message. The caller has to check the level.
+
+        Args:
+            level: The log level.
+            msg: The message template.
+            obs: Optional observation that provides the log context.
+            fields: Values of the fields in the template.
+        """
+        if obs is not None:
+            msg = msg.format_map(ChainMap(fields, obs.log_context))
+        elif fields:
+            msg = msg.format(**fields)
+
+        self._logger.log(level, msg)
+
+    # The level is checked in each method, as most messages of lower levels
+    # are discarded, and an additional function call would cost more than
+    # the formatting saves.
+
+    def log(self, level: int, msg: str, obs: Any = None, **fields: Any) -> None:
+        """Formats and logs a message, if the level is enabled.
+
+        Args:
+            level: The log level.
+            msg: The message template.
+            obs: Optional observation that provides the log context.
+            **fields: Values of the fields in the template.
+        """
+        if self._logger.isEnabledFor(level):
+            self._log(level, msg, obs, fields)
+
+    def spam(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(SPAM):
+            self._log(SPAM, msg, obs, fields)
+
+    def debug(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._log(logging.DEBUG, msg, obs, fields)
+
+    def verbose(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(VERBOSE):
+            self._log(VERBOSE, msg, obs, fields)
+
+    def info(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.INFO):
+            self._log(logging.INFO, msg, obs, fields)
+
+    def notice(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(NOTICE):
+            self._log(NOTICE, msg, obs, fields)
+
+    def warning(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._log(logging.WARNING, msg, obs, fields)
+
+    def success(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(SUCCESS):
+            self._log(SUCCESS, msg, obs, fields)
+
+    def error(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.ERROR):
+            self._log(logging.ERROR, msg, obs, fields)
+
+    def critical(self, msg: str, obs: Any = None, **fields: Any) -> None:
+        if self._logger.isEnabledFor(logging.CRITICAL):
+            self._log(logging.CRITICAL, msg, obs, fields)
+
+    @property
+    def logger(self) -> logging.Logger:
+        return self._logger
+
+    @property
+    def name(self) -> str:
+        return self._logger.name
 
 
 class RootFilter(logging.Filter):
@@ -77,6 +263,156 @@ class RingBuffer:
         return '\n'.join(list(self._deque))
 
 
+# Entry of a `LogRecordBuffer`.
+LogEntry = namedtuple('LogEntry', ['seq', 'timestamp', 'level', 'module',
+                                   'message'])
+
+
+class LogRecordBuffer:
+    """
+    LogRecordBuffer is a ring buffer of structured log records. Timestamps,
+    log levels, and module ids are stored in preallocated arrays, messages in
+    a list of the same size. Module names are interned, so that each record
+    stores only a small integer id. Every record gets a sequence number that
+    is incremented monotonically. Clients can read the records that have
+    been added since a given sequence number, filtered by log level and
+    module name.
+    """
+
+    def __init__(self, size: int):
+        """
+        Args:
+            size: The maximum number of records.
+        """
+        self._size = size
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+        self._timestamps = array('d', [0.0]) * size
+        self._levels = array('B', [0]) * size
+        self._module_ids = array('H', [0]) * size
+        self._messages = [None] * size
+
+        self._module_names = []
+        self._modules = {}
+
+    def __len__(self) -> int:
+        return min(self._next_seq, self._size)
+
+    def _intern(self, module: str) -> int:
+        """Returns the id of a module name. Unknown names are added to the
+        table of module names. Must be called with the lock held.
+
+        Args:
+            module: Name of the module.
+
+        Returns:
+            Id of the module name.
+        """
+        module_id = self._modules.get(module)
+
+        if module_id is None:
+            module_id = len(self._module_names)
+            self._module_names.append(module)
+            self._modules[module] = module_id
+
+        return module_id
+
+    def append(self,
+               timestamp: float,
+               level: int,
+               module: str,
+               message: str) -> int:
+        """Appends a record. The oldest record is overwritten if the buffer is
+        full.
+
+        Args:
+            timestamp: Time of the record in seconds since the epoch.
+            level: The log level (0 to 255).
+            module: Name of the module that has created the record.
+            message: The log message.
+
+        Returns:
+            Sequence number of the record.
+        """
+        with self._lock:
+            seq = self._next_seq
+            i = seq % self._size
+
+            self._timestamps[i] = timestamp
+            self._levels[i] = min(max(level, 0), 255)
+            self._module_ids[i] = self._intern(module)
+            self._messages[i] = message
+            self._next_seq = seq + 1
+
+        return seq
+
+    def read(self,
+             since: int = 0,
+             level: int = logging.NOTSET,
+             module: str = None,
+             limit: int = None) -> Tuple[List[LogEntry], int]:
+        """Returns the records with a sequence number greater than or equal to
+        `since`, oldest first. Records that have already been overwritten are
+        skipped.
+
+        Args:
+            since: First sequence number to return.
+            level: Minimum log level of the records.
+            module: Name of the module to return records of (optional).
+            limit: Maximum number of records to return (optional).
+
+        Returns:
+            List of records and the sequence number to continue reading from.
+        """
+        entries = []
+
+        with self._lock:
+            cursor = self._next_seq
+            module_id = None
+
+            if module is not None:
+                module_id = self._modules.get(module)
+
+                if module_id is None:
+                    return entries, cursor
+
+            for seq in range(max(since, cursor - self._size, 0), cursor):
+                i = seq % self._size
+
+                if self._levels[i] < level:
+                    continue
+
+                if module_id is not None and self._module_ids[i] != module_id:
+                    continue
+
+                module_name = self._module_names[self._module_ids[i]]
+                entries.append(LogEntry(seq,
+                                        self._timestamps[i],
+                                        self._levels[i],
+                                        module_name,
+                                        self._messages[i]))
+
+                if limit and len(entries) >= limit:
+                    cursor = seq + 1
+                    break
+
+        return entries, cursor
+
+    @property
+    def modules(self) -> List[str]:
+        with self._lock:
+            return list(self._module_names)
+
+    @property
+    def seq(self) -> int:
+        return self._next_seq
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
 class StringFormatter(logging.Formatter):
     """
     StringFormatter simply returns a formatted string of a log record.
@@ -115,19 +451,23 @@ class StringFormatter(logging.Formatter):
 
 class RingBufferLogHandler(logging.Handler):
     """
-    RingBufferLogHandler stores a number of log messages in a `RingBuffer`.
+    RingBufferLogHandler stores a number of log records in a `LogRecordBuffer`.
+    Records are stored unformatted and only formatted when read.
     """
 
+    # Format of the timestamps returned by `format_entry()`.
+    DATE_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
     def __init__(self, level: int, size: int):
         """
         Args:
             level: The log level.
-            size: The size of the `RingBuffer`.
+            size: The size of the `LogRecordBuffer`.
         """
         super().__init__(level)
 
         self._size = size
-        self._buffer = RingBuffer(self._size)
+        self._buffer = LogRecordBuffer(self._size)
 
     def emit(self, record: logging.LogRecord) -> None:
         """Adds a log record to the internal ring buffer.
@@ -135,9 +475,32 @@ class RingBufferLogHandler(logging.Handler):
         Args:
             record: The log record.
         """
-        if record:
-            log_entry = self.format(record)
-            self._buffer.append(log_entry)
+        try:
+            self._buffer.append(record.created,
+                                record.levelno,
+                                record.name,
+                                record.getMessage())
+        except Exception:
+            self.handleError(record)
+
+    def format_entry(self, entry: LogEntry) -> str:
+        """Returns a log entry as string, in the layout of `StringFormatter`.
+
+        Args:
+            entry: The log entry.
+
+        Returns:
+            Formatted log entry.
+        """
+        asctime = time.strftime(self.DATE_FORMAT,
+                                time.localtime(entry.timestamp))
+
+        level_name = logging.getLevelName(entry.level)
+
+        return '{} - {:>8} - {:>26} - {}'.format(asctime,
+                                                 level_name,
+                                                 entry.module,
+                                                 entry.message)
 
     def get_logs(self) -> str:
         """Returns all log messages as a concatenated string.
@@ -145,12 +508,221 @@ class RingBufferLogHandler(logging.Handler):
         Returns:
             All log messages.
         """
-        return self._buffer.to_string()
+        entries, _ = self._buffer.read()
+        return '\n'.join([self.format_entry(entry) for entry in entries])
+
+    def read(self,
+             since: int = 0,
+             level: int = logging.NOTSET,
+             module: str = None,
+             limit: int = None) -> Tuple[List[LogEntry], int]:
+        """Returns the log entries since a given sequence number. See
+        `LogRecordBuffer.read()`."""
+        return self._buffer.read(since, level, module, limit)
 
     @property
-    def buffer(self) -> RingBuffer:
+    def buffer(self) -> LogRecordBuffer:
         return self._buffer
 
     @property
     def size(self) -> int:
         return self._size
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    BufferedRotatingFileHandler writes log records to a rotating file through
+    a large write buffer. Unlike `logging.handlers.RotatingFileHandler`, the
+    file is not flushed after each record, and the file size is tracked
+    instead of queried before each write. The buffer is written to the file
+    by `flush()`, which is called periodically by the `LogQueueListener`, and
+    for records of level ERROR and higher.
+    """
+
+    def __init__(self,
+                 filename: str,
+                 max_bytes: int = 0,
+                 backup_count: int = 0,
+                 encoding: str = None,
+                 buffer_size: int = 65536):
+        """
+        Args:
+            filename: Path of the log file.
+            max_bytes: Maximum size of the file before rotation (0 to disable
+                rotation).
+            backup_count: Number of backup files to keep.
+            encoding: Encoding of the file.
+            buffer_size: Size of the write buffer in bytes.
+        """
+        self._buffer_size = buffer_size
+        self._file_size = 0
+
+        super().__init__(filename,
+                         maxBytes=max_bytes,
+                         backupCount=backup_count,
+                         encoding=encoding)
+
+    def _open(self) -> Any:
+        """Opens the log file with write buffer and determines its size."""
+        stream = open(self.baseFilename, self.mode, buffering=self._buffer_size,
+                      encoding=self.encoding)
+        self._file_size = os.path.getsize(self.baseFilename)
+        return stream
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Writes a log record to the buffer. Rotates the log file first, if
+        the maximum size would be exceeded.
+
+        Args:
+            record: The log record.
+        """
+        try:
+            msg = self.format(record) + self.terminator
+
+            if self.stream is None:
+                self.stream = self._open()
+
+            # The size is counted in characters, which is close enough for
+            # rotation.
+            if 0 < self.maxBytes <= self._file_size + len(msg):
+                self.doRollover()
+
+            self.stream.write(msg)
+            self._file_size += len(msg)
+
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class LogQueueListener:
+    """
+    LogQueueListener passes the log records of a queue to a number of handlers
+    in a single thread, so that threads that log are never blocked by slow
+    handlers, like writes to an SD card. All records waiting in the queue are
+    handled at once. The handlers are flushed after each batch, at most once
+    per flush interval, and whenever the queue has been idle for the flush
+    interval.
+    """
+
+    # Maximum number of records handled at once.
+    MAX_BATCH_SIZE = 1000
+
+    def __init__(self,
+                 log_queue: queue.Queue,
+                 handlers: List[logging.Handler],
+                 flush_interval: float = 1.0):
+        """
+        Args:
+            log_queue: The queue of log records.
+            handlers: The handlers of the log records.
+            flush_interval: Time between two flushes in seconds.
+        """
+        self._queue = log_queue
+        self._handlers = handlers
+        self._flush_interval = flush_interval
+        self._thread = None
+        self._stop = object()
+
+    def _flush(self) -> None:
+        """Flushes all handlers."""
+        for handler in self._handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+
+    def _handle(self, record: logging.LogRecord) -> None:
+        """Passes a log record to all handlers whose level is enabled.
+
+        Args:
+            record: The log record.
+        """
+        for handler in self._handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self) -> None:
+        """Handles the log records in the queue until the listener is stopped.
+        Runs within a thread."""
+        last_flush = time.monotonic()
+        is_running = True
+
+        while is_running:
+            try:
+                batch = [self._queue.get(timeout=self._flush_interval)]
+            except queue.Empty:
+                self._flush()
+                last_flush = time.monotonic()
+                continue
+
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for record in batch:
+                if record is self._stop:
+                    is_running = False
+                    break
+
+                self._handle(record)
+
+            if time.monotonic() - last_flush >= self._flush_interval:
+                self._flush()
+                last_flush = time.monotonic()
+
+        self._flush()
+
+    def start(self) -> None:
+        """Starts the listener thread."""
+        self._thread = threading.Thread(target=self._run,
+                                        name='logging',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Handles all remaining log records, flushes the handlers, and stops
+        the listener thread."""
+        if not self._thread:
+            return
+
+        self._queue.put(self._stop)
+        self._thread.join()
+        self._thread = None
+
+    @property
+    def handlers(self) -> List[logging.Handler]:
+        return self._handlers
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    NonBlockingQueueHandler puts log records into a queue without blocking. If
+    the queue is full, the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        """
+        Args:
+            log_queue: The queue of log records.
+        """
+        super().__init__(log_queue)
+        self._dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Puts a log record into the queue, or drops it if the queue is full.
+
+        Args:
+            record: The log record.
+        """
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
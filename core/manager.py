@@ -12,15 +12,23 @@ import re
 
 from importlib import import_module
 from pathlib import Path
-from typing import Any, Dict, KeysView
+from typing import Any, Callable, Dict, KeysView
 
 import arrow
 import jsonschema
 
-from core.intercom import MQTTMessenger
+try:
+    import fastjsonschema
+except ImportError:
+    fastjsonschema = None
+
+from core.inbox import Inbox
+from core.intercom import LocalMessenger, MQTTMessenger
 from core.module import Module
+from core.observation import Observation
 from core.sensor import Sensor
 from core.prototype import Prototype
+from core.runtime import AsyncRuntime
 
 
 class Manager:
@@ -211,6 +219,14 @@ class ModuleManager:
 
         self._start_time = None
         self._modules = {}
+        self._local_messenger = None
+        self._batch_size = 1
+        self._batch_time = 0.0
+        self._inbox_config = {}
+        self._concurrency_config = {}
+        self._is_slimming = False
+        self._messenger = None
+        self._runtime = None
 
         self.load_all()
 
@@ -231,12 +247,58 @@ class ModuleManager:
         if not self.module_exists(class_path):
             raise ValueError(f'Module "{class_path}" not found')
 
-        messenger = MQTTMessenger(self._manager, name)
+        # Either all modules share a single messenger, or each module gets a
+        # messenger of its own.
+        messenger = self._messenger or MQTTMessenger(self._manager, name)
+
         worker = self.get_worker_instance(name, class_path)
 
-        self._modules[name] = Module(messenger, worker)
+        # Optional concurrent handling of messages.
+        concurrency = self._concurrency_config.get(name, {})
+        workers = concurrency.get('workers', 1)
+
+        if workers > 1 and concurrency.get('pool') == 'process':
+            if worker.create_process_pool(workers):
+                self.logger.verbose(f'Processing observations of module '
+                                    f'"{name}" in {workers} child processes')
+            else:
+                self.logger.warning(f'Module "{name}" does not support '
+                                    f'process pools, using threads instead')
+
+        worker.concurrency = workers
+        worker.is_slimming = self._is_slimming
+
+        self._modules[name] = Module(messenger,
+                                     worker,
+                                     self._local_messenger,
+                                     self._batch_size,
+                                     self._batch_time,
+                                     self.create_inbox(name),
+                                     workers,
+                                     concurrency.get('orderBy', 'target'))
         self.logger.debug(f'Loaded module "{name}"')
 
+    def create_inbox(self, name: str) -> Inbox:
+        """Creates the inbox of a module, using the default settings in the
+        inbox configuration, and the settings of the module, if any.
+
+        Args:
+            name: The name of the module.
+
+        Returns:
+            The inbox.
+        """
+        config = dict(self._inbox_config)
+        config.update(self._inbox_config.get('modules', {}).get(name, {}))
+
+        spill_path = Path(config.get('spillPath', 'cache/inbox')) / name
+
+        return Inbox(capacity=config.get('capacity', 0),
+                     overflow=config.get('overflow', 'block'),
+                     spill_path=str(spill_path),
+                     name=name,
+                     block_timeout=config.get('blockTimeout', 5.0))
+
     def get(self, name: str) -> Module:
         """Returns a specific module.
 
@@ -298,6 +360,11 @@ class ModuleManager:
         for module_name in self._modules:
             self.kill(module_name)
 
+        if self._runtime:
+            self._runtime.stop()
+        elif self._messenger:
+            self._messenger.disconnect()
+
     def load_all(self) -> None:
         """Loads all modules."""
         self._modules = {}
@@ -309,6 +376,102 @@ class ModuleManager:
         if not config:
             self.logger.warning('No modules defined')
 
+        # Optional list of modules that do not validate payloads sent by
+        # other local modules.
+        core = self._manager.config.get('core')
+
+        if core.get('validation'):
+            self._manager.schema.add_schema('validation',
+                                            'core/validation.json')
+            validation = self._manager.config.get_valid_config('validation',
+                                                               'core',
+                                                               'validation')
+
+            for module_name in validation.get('trustedModules', []):
+                self._manager.schema.set_trusted(module_name)
+                self.logger.verbose(f'Skipping validation of local payloads '
+                                    f'sent to module "{module_name}"')
+
+        # Optional micro-batching of the messages in the inboxes of the
+        # modules.
+        self._batch_size = 1
+        self._batch_time = 0.0
+
+        if core.get('batching'):
+            self._manager.schema.add_schema('batching', 'core/batching.json')
+            batching = self._manager.config.get_valid_config('batching',
+                                                             'core',
+                                                             'batching')
+            self._batch_size = batching.get('maxSize', 1)
+            self._batch_time = batching.get('maxTime', 0.0)
+            self.logger.verbose(f'Handling up to {self._batch_size} '
+                                f'message(s) at once')
+
+        # Optional capacity and overflow policy of the module inboxes.
+        self._inbox_config = {}
+
+        if core.get('inbox'):
+            self._manager.schema.add_schema('inbox', 'core/inbox.json')
+            self._inbox_config = self._manager.config.get_valid_config(
+                'inbox', 'core', 'inbox')
+
+        # Optional number of concurrent message handlers per module.
+        self._concurrency_config = {}
+
+        if core.get('concurrency'):
+            self._manager.schema.add_schema('concurrency',
+                                            'core/concurrency.json')
+            self._concurrency_config = self._manager.config.get_valid_config(
+                'concurrency', 'core', 'concurrency')
+
+        # Optional slimming of observations after the port stage.
+        self._is_slimming = False
+
+        if core.get('slimming'):
+            self._manager.schema.add_schema('slimming', 'core/slimming.json')
+            slimming = self._manager.config.get_valid_config('slimming',
+                                                             'core',
+                                                             'slimming')
+            self._is_slimming = slimming.get('enabled', False)
+
+        # Optional asyncio runtime, instead of a thread per module.
+        self._runtime = None
+        runtime = {}
+
+        if core.get('runtime'):
+            self._manager.schema.add_schema('runtime', 'core/runtime.json')
+            runtime = self._manager.config.get_valid_config('runtime',
+                                                            'core',
+                                                            'runtime')
+
+        # Optional single MQTT connection for all modules. The asyncio
+        # runtime always uses a single connection.
+        self._messenger = None
+        intercom = core.get('intercom', {})
+
+        if (intercom.get('mqtt', {}).get('shared') or
+                runtime.get('type') == 'asyncio'):
+            node_id = self._manager.node.node.id
+            self._messenger = MQTTMessenger(self._manager,
+                                            f'openadms-{node_id}')
+            self.logger.verbose('All modules share a single connection to '
+                                'the MQTT message broker')
+
+        if runtime.get('type') == 'asyncio':
+            self._runtime = AsyncRuntime(self._messenger,
+                                         runtime.get('workers', 4))
+            self.logger.verbose('Running all modules on a single event loop')
+
+        # Optional in-process delivery of messages between local modules.
+        self._local_messenger = None
+
+        if intercom.get('local'):
+            self._local_messenger = LocalMessenger(self._manager)
+
+            if self._local_messenger.is_enabled:
+                self.logger.verbose('In-process delivery of messages between '
+                                    'local modules is enabled')
+
         for module_name, class_path in config.items():
             try:
                 self.add(module_name, class_path)
@@ -346,8 +509,11 @@ class ModuleManager:
         """
         if self.has_module(name):
             self.logger.info(f'Removing module "{name}" ...')
-            self._modules[name].stop_worker()
-            self._modules[name].stop()
+            module = self._modules[name]
+            module.stop_worker()
+            module.stop()
+            module.messenger.unsubscribe(f'{module.topic}/{name}')
+            module.inbox.close()
             self._modules[name] = None
 
     def remove_all(self) -> None:
@@ -364,11 +530,20 @@ class ModuleManager:
             name: The name of the module.
         """
         self.logger.debug(f'Starting module "{name}" ...')
+
+        if self._runtime:
+            # The module starts its worker on the event loop.
+            self._runtime.run(self._modules.get(name))
+            return
+
         self._modules.get(name).start()
         self._modules.get(name).start_worker()
 
     def start_all(self) -> None:
         """Starts all modules."""
+        if self._runtime:
+            self._runtime.start()
+
         for name in self._modules:
             self.start(name)
 
@@ -389,6 +564,10 @@ class ModuleManager:
     def modules(self) -> Dict[str, Module]:
         return self._modules
 
+    @property
+    def runtime(self) -> AsyncRuntime:
+        return self._runtime
+
 
 class Node:
     """
@@ -540,15 +719,52 @@ class ProjectManager:
 
 class SchemaManager:
     """
-    SchemaManager stores JSON schemas and validates given data with them.
+    SchemaManager stores JSON schemas and validates given data with them. Each
+    schema is compiled once into a validator when it is added. If the Python
+    module `fastjsonschema` is installed, it is used as the validator backend.
+    Otherwise, the validator of `jsonschema` is re-used.
+
+    Modules can be marked as trusted. Payloads sent to a trusted module by
+    other modules of the same node are not validated.
     """
 
     def __init__(self, schemas_root_path: str = 'schemas'):
         self.logger = logging.getLogger('schemaManager')
         self._schemas = {}
+        self._validators = {}
+        self._trusted_modules = set()
         self._schemas_root_path = schemas_root_path
         self.load_all()
 
+    def _compile(self, schema: Dict) -> Callable[[Any], bool]:
+        """Compiles the given JSON schema into a validator function.
+
+        Args:
+            schema: The JSON schema.
+
+        Returns:
+            Function that returns True if data is valid, False if not.
+        """
+        if fastjsonschema:
+            try:
+                validate = fastjsonschema.compile(schema)
+
+                def is_valid(data: Any) -> bool:
+                    try:
+                        validate(data)
+                    except fastjsonschema.JsonSchemaValueException:
+                        return False
+
+                    return True
+
+                return is_valid
+            except fastjsonschema.JsonSchemaDefinitionException as e:
+                self.logger.debug(f'Compiling schema with "fastjsonschema" '
+                                  f'failed, using "jsonschema" instead: {e}')
+
+        validator_class = jsonschema.validators.validator_for(schema)
+        return validator_class(schema).is_valid
+
     def add_schema(self,
                    data_type: str,
                    path: str) -> bool:
@@ -577,6 +793,7 @@ class SchemaManager:
                 jsonschema.Draft4Validator.check_schema(schema)
 
                 self._schemas[data_type] = schema
+                self._validators[data_type] = self._compile(schema)
                 self.logger.debug(f'Loaded schema "{data_type}"')
             except json.JSONDecodeError:
                 self.logger.error(f'Invalid JSON file "{schema_path}"')
@@ -626,21 +843,31 @@ class SchemaManager:
         Returns:
             True if data is valid, False if not.
         """
-        if not self.has_schema(schema_name):
+        validator = self._validators.get(schema_name)
+
+        if not validator:
             self.logger.warning(f'JSON schema "{schema_name}" not found')
             return False
 
-        try:
-            schema = self._schemas.get(schema_name)
-            jsonschema.validate(data, schema)
-        except jsonschema.ValidationError:
-            return False
+        return validator(data)
 
-        return True
+    def is_trusted(self, module_name: str) -> bool:
+        """Returns whether or not payloads sent to the given module by other
+        local modules are trusted and therefore not validated.
+
+        Args:
+            module_name: The name of the receiving module.
+
+        Returns:
+            True if module is trusted, False if not.
+        """
+        return module_name in self._trusted_modules
 
     def load_all(self) -> None:
         """Initialises the schemas dictionary."""
         self._schemas = {}
+        self._validators = {}
+        self._trusted_modules = set()
         self.add_schema('observation', 'observation.json')
 
     def remove(self, name: str) -> None:
@@ -651,6 +878,7 @@ class SchemaManager:
         """
         self.logger.info(f'Removing schema "{name}" ...')
         self._schemas[name] = None
+        self._validators[name] = None
 
     def remove_all(self) -> None:
         """Removes all schemas."""
@@ -658,6 +886,21 @@ class SchemaManager:
             self.remove(schema_name)
 
         self._schemas = {}
+        self._validators = {}
+        self._trusted_modules = set()
+
+    def set_trusted(self, module_name: str, is_trusted: bool = True) -> None:
+        """Marks a module as trusted (or not). Payloads sent to a trusted
+        module by other local modules will not be validated.
+
+        Args:
+            module_name: The name of the receiving module.
+            is_trusted: If True, the module is trusted.
+        """
+        if is_trusted:
+            self._trusted_modules.add(module_name)
+        else:
+            self._trusted_modules.discard(module_name)
 
 
 class SensorManager:
@@ -718,6 +961,62 @@ class SensorManager:
         """Returns a list with all sensor names."""
         return self._sensors.keys()
 
+    def rehydrate(self, obs: Observation) -> bool:
+        """Restores the static data of a slim observation from its template in
+        the sensor configuration.
+
+        Args:
+            obs: The slim observation.
+
+        Returns:
+            True if observation is complete, False if template is not found or
+            has been changed.
+        """
+        if not obs.is_slim:
+            return True
+
+        template = obs.get('template')
+        sensor = self.get(template.get('sensor'))
+        name = template.get('observation')
+
+        if not sensor or not sensor.get_observation(name):
+            self.logger.error(f'Template of observation "{name}" of sensor '
+                              f'"{template.get("sensor")}" not found')
+            return False
+
+        if sensor.get_template_version(name) != template.get('version'):
+            self.logger.error(f'Template of observation "{name}" of sensor '
+                              f'"{sensor.name}" has been changed')
+            return False
+
+        obs.rehydrate(sensor.get_observation(name))
+        return True
+
+    def slim(self, obs: Observation) -> bool:
+        """Replaces the static data of an observation with a reference to its
+        template in the sensor configuration. See method
+        `Observation.slim()`.
+
+        Args:
+            obs: The observation.
+
+        Returns:
+            True if observation has been slimmed, False if template is not
+            found.
+        """
+        sensor = self.get(obs.get('sensorName'))
+
+        if not sensor:
+            return False
+
+        version = sensor.get_template_version(obs.get('name'))
+
+        if not version:
+            return False
+
+        obs.slim(version)
+        return True
+
     @property
     def sensors(self) -> Dict[str, Sensor]:
         return self._sensors
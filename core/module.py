@@ -6,14 +6,17 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
+import asyncio
 import logging
 import queue
 import threading
 import time
 
-from typing import Dict, List
+from typing import Dict, Hashable, List
 
-from core.intercom import MQTTMessenger
+from core.executor import OrderedExecutor
+from core.inbox import Inbox
+from core.intercom import CODECS, LocalMessage, LocalMessenger, MQTTMessenger
 from core.prototype import Prototype
 
 
@@ -25,11 +28,25 @@ class Module(threading.Thread):
 
     def __init__(self,
                  messenger: MQTTMessenger,
-                 worker: Prototype):
+                 worker: Prototype,
+                 local_messenger: LocalMessenger = None,
+                 batch_size: int = 1,
+                 batch_time: float = 0.0,
+                 inbox: Inbox = None,
+                 concurrency: int = 1,
+                 order_by: str = 'target'):
         """
         Args:
             messenger: The messenger object.
             worker: The worker object.
+            local_messenger: Optional messenger for in-process delivery.
+            batch_size: Maximum number of messages handled at once.
+            batch_time: Maximum time in seconds to wait for further messages
+                of a batch.
+            inbox: Optional bounded inbox (default: unbounded).
+            concurrency: Number of messages handled in parallel.
+            order_by: Payload key of messages that have to be handled in
+                order (None to handle all messages in parallel).
         """
         super().__init__(name=worker.name)
 
@@ -38,44 +55,205 @@ class Module(threading.Thread):
         self._is_running = True
 
         self._messenger = messenger                 # MQTT messenger.
+        self._local_messenger = local_messenger     # In-process messenger.
         self._worker = worker                       # Worker instance.
 
-        self._inbox = queue.Queue()                 # Message inbox.
+        self._inbox = Inbox() if inbox is None else inbox   # Message inbox.
+        self._batch_size = max(batch_size, 1)       # Max. messages per batch.
+        self._batch_time = batch_time               # Max. time per batch.
+        self._order_by = order_by                   # Key of ordered messages.
+        self._executor = None                       # Optional thread pool.
+
+        # Message counters for statistics. They are not locked, as a missed
+        # increment of concurrent threads does not matter here.
+        self._received = 0
+        self._handled = 0
+        self._published = 0
+
+        if concurrency > 1:
+            self._executor = OrderedExecutor(concurrency, worker.name)
+
         self._topic = self._messenger.topic         # MQTT topic to listen to.
 
-        # Set the callback functions of the messenger and the worker.
-        self._messenger.downlink = self.retrieve    # Call on new messages.
+        # Event loop of the asyncio runtime and the event that signals new
+        # messages in the inbox. Set by `run_async()`.
+        self._loop = None
+        self._has_messages = None
+
+        # Set the callback function of the worker.
         self._worker.uplink = self.publish          # Call to publish message.
 
-        # Subscribe to topic of worker's name.
-        self._messenger.subscribe(f'{self._topic}/{worker.name}')
+        # Subscribe to topic of worker's name. New messages are passed to
+        # `retrieve()`.
+        self._messenger.subscribe(f'{self._topic}/{worker.name}',
+                                  self.retrieve)
+
+    def _get_batch(self, message: Dict[str, Dict]) -> List[Dict[str, Dict]]:
+        """Drains the inbox into a batch of messages, until either the maximum
+        batch size is reached, or no further message arrives within the batch
+        time.
+
+        Args:
+            message: The first message of the batch.
+
+        Returns:
+            List of messages.
+        """
+        batch = [message]
+        deadline = time.monotonic() + self._batch_time
+
+        while len(batch) < self._batch_size:
+            timeout = deadline - time.monotonic()
+
+            try:
+                if timeout > 0:
+                    batch.append(self._inbox.get(timeout=timeout))
+                else:
+                    batch.append(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _get_order_key(self, message: Dict[str, Dict]) -> Hashable:
+        """Returns the value of the order key in the payload of a message.
+
+        Args:
+            message: Header and payload of the message.
+
+        Returns:
+            Value of the order key, or None.
+        """
+        if not self._order_by or not isinstance(message, dict):
+            return None
+
+        payload = message.get('payload')
+
+        if not isinstance(payload, dict):
+            return None
+
+        key = payload.get(self._order_by)
+
+        return key if isinstance(key, Hashable) else None
+
+    def _is_event_loop_thread(self) -> bool:
+        """Returns whether the calling thread runs an asyncio event loop.
+
+        Returns:
+            True if an event loop is running in the calling thread.
+        """
+        try:
+            asyncio.get_running_loop()
+            return True
+        except RuntimeError:
+            return False
+
+    def _handle(self, message: Dict[str, Dict]) -> None:
+        """Passes a message, or a batch of messages beginning with the given
+        one, to the worker.
+
+        Args:
+            message: Header and payload of the message.
+        """
+        if self._executor:
+            self._handled += 1
+
+            # Messages with the same order key are handled one after
+            # another, all others in parallel.
+            try:
+                self._executor.submit(self._get_order_key(message),
+                                      self._worker.handle,
+                                      message)
+            except RuntimeError:
+                # The thread pool has been shut down by `stop()`.
+                self.logger.warning('Module has been stopped, dropped '
+                                    'message')
+            return
+
+        if self._batch_size == 1:
+            self._handled += 1
+            self._worker.handle(message)  # Fire and forget.
+            return
+
+        batch = self._get_batch(message)
+        self._handled += len(batch)
+        self._worker.handle_batch(batch)
 
-    def publish(self, target: str, message: str, qos: int = 0,
+    def publish(self, target: str, message: Dict[str, Dict], qos: int = 0,
                 retain: bool = False) -> None:
-        """Sends an `Observation` object to the next receiver by using the
-        messenger.
+        """Sends a message to the next receiver. If the receiver is a module
+        of this node and in-process delivery is enabled, the message is put
+        directly into the inbox of the receiver. Otherwise, the message is
+        encoded and published by using the MQTT messenger.
+
+        Messages to modules are encoded with the codec of the messenger.
+        Messages to other topics (containing a `/`) and retained messages are
+        meant for consumers outside of OpenADMS Node and are always encoded in
+        JSON.
 
         Args:
             target: Name of the topic.
-            message: Message in JSON format.
+            message: Header and payload of the message, both Dict.
             qos: Quality of Service (0, 1, or 2).
             retain: Retained message or not.
+
+        Raises:
+            TypeError: If message is not JSON serialisable.
         """
+        self._published += 1
+
+        # Retained messages are meant for subscribers outside of the node.
+        if (not retain and self._local_messenger and
+                self._local_messenger.publish(target, message)):
+            self.logger.spam(f'Delivered message to local module "{target}"')
+            return
+
+        if retain or '/' in target:
+            codec = CODECS['json']
+        else:
+            codec = self._messenger.codec
+
         target_path = f'{self._topic}/{target}'
-        self._messenger.publish(target_path, message, qos, retain)
+        self._messenger.publish(target_path, codec.encode(message), qos,
+                                retain)
         retained = 'retained ' if retain else ''
 
         self.logger.spam(f'Published {retained}message with QoS {qos} to '
                          f'"{target_path}"')
 
-    def retrieve(self, message: List[Dict]) -> None:
+    def retrieve(self, message: List[Dict], is_local: bool = False) -> None:
         """Callback function for the messenger. New data from the message broker
         lands here.
 
         Args:
             message: Header and payload of the message, both Dict.
+            is_local: Whether the message has been delivered in-process by the
+                local messenger.
         """
-        self._inbox.put(message)
+        self._received += 1
+
+        # Only messages of in-process senders may skip the validation of the
+        # payload.
+        if is_local:
+            message = LocalMessage(message)
+
+        # The callback runs in the network thread of the MQTT messenger,
+        # which serves all modules, or in the thread of the sending module.
+        # The network thread must never wait for space in the inbox, as one
+        # full inbox would stall all deliveries. In-process senders are slowed
+        # down instead (policy `block`), but only for the block timeout of the
+        # inbox, so that two full modules do not wait for each other forever.
+        # The event loop of the asyncio runtime is never blocked.
+        if is_local and not self._is_event_loop_thread():
+            self._inbox.put(message, timeout=self._inbox.block_timeout)
+        else:
+            self._inbox.put(message, block=False)
+
+        if not self._loop:
+            return
+
+        if not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._has_messages.set)
 
     def run(self) -> None:
         """Checks the inbox for new messages and calls the `handle()` method of
@@ -90,26 +268,87 @@ class Module(threading.Thread):
 
         while self._is_running:
             message = self._inbox.get()   # Blocking I/O.
-            self._worker.handle(message)  # Fire and forget.
+            self._handle(message)
+
+        # A shared messenger is disconnected by the module manager.
+        if not self._messenger.is_shared:
+            self._messenger.disconnect()
+
+    async def run_async(self) -> None:
+        """Coroutine version of `run()` for the asyncio runtime. Starts the
+        worker, checks the inbox for new messages, and passes them to the
+        worker. As the handlers of the worker may block, they are called in
+        the default executor of the event loop. The messenger is shared by
+        all modules and is connected by the runtime."""
+        self._loop = asyncio.get_running_loop()
+        self._has_messages = asyncio.Event()
 
-        self._messenger.disconnect()
+        self._worker.start_async(self._loop)
+
+        while self._is_running:
+            try:
+                message = self._inbox.get_nowait()
+            except queue.Empty:
+                self._has_messages.clear()
+                await self._has_messages.wait()
+                continue
+
+            try:
+                await self._loop.run_in_executor(None, self._handle, message)
+            except Exception as e:
+                self.logger.error(f'Handling message failed: {e}')
 
     def start_worker(self) -> None:
-        """Starts the worker."""
+        """Starts the worker. Within the asyncio runtime, the worker is started
+        on the event loop."""
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._worker.start_async,
+                                            self._loop)
+            return
+
         self._worker.start()
 
     def stop(self) -> None:
-        """Stops the thread."""
+        """Stops the thread or the coroutine. Tasks already submitted to the
+        thread pool are finished, but no new ones are accepted."""
         self._is_running = False
 
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._has_messages.set)
+
     def stop_worker(self) -> None:
         """Stops the worker."""
         self._worker.stop()
 
+    @property
+    def inbox(self) -> Inbox:
+        return self._inbox
+
+    @property
+    def local_messenger(self) -> LocalMessenger:
+        return self._local_messenger
+
     @property
     def messenger(self) -> MQTTMessenger:
         return self._messenger
 
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Returns the message counters of the module.
+
+        Returns:
+            Number of messages received from the messengers, handled by the
+            worker, and published by the worker.
+        """
+        return {
+            'handled': self._handled,
+            'published': self._published,
+            'received': self._received
+        }
+
     @property
     def topic(self) -> str:
         return self._topic
@@ -118,6 +357,10 @@ class Module(threading.Thread):
     def worker(self) -> Prototype:
         return self._worker
 
+    @local_messenger.setter
+    def local_messenger(self, local_messenger: LocalMessenger) -> None:
+        self._local_messenger = local_messenger
+
     @messenger.setter
     def messenger(self, messenger: MQTTMessenger) -> None:
         self._messenger = messenger
@@ -12,6 +12,8 @@ import logging
 from typing import Any, Dict, List, TypeVar, Union
 from uuid import uuid4
 
+from core.logging import LogContext
+
 # Type definition for the value inside a response set of an observation.
 # `ResponseType` can either be of type `float`, `int`, or `str`.
 ResponseType = TypeVar('ResponseType', float, int, str)
@@ -26,9 +28,25 @@ class Observation:
     a sensor in a dictionary. Filled with initial information from the
     configuration file and later supplemented by data of the processing modules.
     Can easily be transformed to JSON format.
+
+    Once the sensor has responded, the static data of the request sets (the
+    requests, response patterns, delimiters, and timeouts) can be removed by
+    `slim()`. The observation then holds a reference to its template in the
+    sensor configuration instead, and `rehydrate()` restores the removed data
+    from the template.
     """
 
+    # Keys of the log context and the corresponding keys of the data.
+    LOG_CONTEXT_KEYS = {'name': 'name', 'target': 'target',
+                        'sensor': 'sensorName', 'port': 'portName'}
+
+    # Keys of the request sets that are taken from the sensor configuration.
+    TEMPLATE_KEYS = ('enabled', 'request', 'responseDelimiter',
+                     'responsePattern', 'sleepTime', 'timeout')
+
     def __init__(self, data=None):
+        self._log_context = None
+
         if not data:
             self._data = {
                 'enabled': True,
@@ -50,6 +68,31 @@ class Observation:
             self._data.pop('description', None)     # Remove description text.
             self._data['type'] = 'observation'      # Set or override data type.
 
+    def clone(self) -> 'Observation':
+        """Returns a cheap copy of the observation, to be used instead of
+        `copy.deepcopy()`. Only the parts that are filled during processing
+        are copied: the dictionaries of the request sets (for the responses)
+        and of the response sets (for the values). Everything else, like the
+        receivers list, requests, and response patterns, is shared with the
+        original and has to be replaced, not modified in place.
+
+        Returns:
+            Copy of the observation.
+        """
+        data = self._data.copy()
+
+        for key in ('requestSets', 'responseSets'):
+            sets = data.get(key)
+
+            if sets:
+                data[key] = {name: dict(s) for name, s in sets.items()}
+
+        obs = Observation.__new__(Observation)
+        obs._data = data
+        obs._log_context = None
+
+        return obs
+
     @staticmethod
     def create_response_set(type: str,
                             unit: str,
@@ -238,6 +281,23 @@ class Observation:
 
         return False
 
+    def rehydrate(self, template: 'Observation') -> None:
+        """Restores the static data of the request sets removed by `slim()`
+        from the given template.
+
+        Args:
+            template: The observation from the sensor configuration.
+        """
+        request_sets = self._data.get('requestSets') or {}
+
+        for set_name, template_set in template.get('requestSets').items():
+            request_set = dict(template_set)
+            request_set.update(request_sets.get(set_name, {}))
+            request_sets[set_name] = request_set
+
+        self._data['requestSets'] = request_sets
+        self._data.pop('template', None)
+
     def set(self, key: str, value: Any) -> None:
         """Sets key and value in the data set.
 
@@ -247,6 +307,31 @@ class Observation:
         """
         self._data[key] = value
 
+    def slim(self, version: str) -> None:
+        """Removes the static data of the sensor configuration from the request
+        sets and adds a reference to the template instead. The reference
+        consists of sensor name, observation name, and template version.
+
+        Args:
+            version: The version of the template.
+        """
+        if self.is_slim:
+            return
+
+        request_sets = self._data.get('requestSets') or {}
+
+        self._data['requestSets'] = {
+            set_name: {key: value for key, value in request_set.items()
+                       if key not in self.TEMPLATE_KEYS}
+            for set_name, request_set in request_sets.items()
+        }
+
+        self._data['template'] = {
+            'sensor': self._data.get('sensorName'),
+            'observation': self._data.get('name'),
+            'version': version
+        }
+
     def to_json(self) -> str:
         """Returns a dump of the data set in JSON format.
 
@@ -259,6 +344,20 @@ class Observation:
     def data(self) -> Dict[str, Any]:
         return self._data
 
+    @property
+    def is_slim(self) -> bool:
+        return 'template' in self._data
+
+    @property
+    def log_context(self) -> LogContext:
+        """Returns a view of name, target, sensor, and port of the
+        observation, to be used in log messages. The view is created once per
+        observation."""
+        if self._log_context is None:
+            self._log_context = LogContext(self, self.LOG_CONTEXT_KEYS)
+
+        return self._log_context
+
     @data.setter
     def data(self, data: Dict[str, Any]) -> None:
         """Sets the observation data set. Kindly note that the data won't be
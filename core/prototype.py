@@ -7,18 +7,51 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
-import json
+import asyncio
 import logging
+import multiprocessing
+import pickle
+import threading
 
-from typing import Any, Callable, Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.executor import init_process_worker, process_in_worker
+from core.intercom import LocalMessage
+from core.logging import LazyLogger
 from core.observation import Observation
 
 
 class Prototype:
     """
     Prototype is used as a blueprint for OpenADMS workers.
+
+    Workers whose `process_observation()` method depends only on the
+    observation and on the configuration can set `is_process_safe` to True.
+    Observations may then be processed by copies of the worker in a pool of
+    child processes.
+
+    Workers with a coroutine `run_async()` set `is_async` to True. In the
+    asyncio runtime, the coroutine is run on the event loop instead of a
+    thread of the worker.
+
+    Workers that only read and write the responses of observations can set
+    `is_slim_safe` to True. If slimming is enabled, observations sent to them
+    are slimmed. All other workers, like exporters and database drivers,
+    receive complete observations.
     """
 
+    is_async = False
+    is_process_safe = False
+    is_slim_safe = False
+
+    # Attributes that are not copied to child processes.
+    # The sensor manager is copied to resolve templates of slim observations.
+    _unpicklable = ['_config_manager', '_module_manager', '_node_manager',
+                    '_project_manager', '_schema_manager', '_uplink',
+                    '_wakeup', '_process_pool', '_thread', '_loop',
+                    '_async_wakeup']
+
     def __init__(self, module_name: str, module_type: str, manager: Any):
         """
         Args:
@@ -26,7 +59,7 @@ class Prototype:
             module_type: The type of the module.
             manager: The manager objects.
         """
-        self.logger = logging.getLogger(module_name)
+        self.logger = LazyLogger(module_name)
 
         self._name = module_name  # Name, e.g., `com5`.
         self._type = module_type  # Type, e.g., `modules.port.SerialPort`.
@@ -41,6 +74,19 @@ class Prototype:
         self._uplink = None
         self._is_running = False
 
+        self._concurrency = 1           # Number of concurrent handlers.
+        self._is_slimming = False       # Slim observations before publishing.
+        self._process_pool = None       # Optional pool of child processes.
+
+        # Condition to wake up threads of the worker that wait for new work.
+        # See methods `wait_until()` and `wake_up()`.
+        self._wakeup = threading.Condition()
+
+        # Event loop and event of the asyncio runtime. See methods
+        # `start_async()` and `wait_until_async()`.
+        self._loop = None
+        self._async_wakeup = None
+
         # A dictionary of the various payload data types and their respective
         # callback functions. Further callback functions can be added with the
         # `add_handler()` method.
@@ -49,6 +95,19 @@ class Prototype:
             'service': self.do_handle_service
         }
 
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+
+        for name in self._unpicklable:
+            if name in state:
+                state[name] = None
+
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._wakeup = threading.Condition()
+
     def add_handler(self,
                     data_type: str,
                     func: Callable[[Dict, Dict], None]) -> None:
@@ -71,7 +130,10 @@ class Prototype:
         obs = Observation(payload)
 
         if self._is_running:
-            obs = self.process_observation(Observation(payload))
+            if self._process_pool:
+                obs = self.process_observation_in_pool(obs)
+            else:
+                obs = self.process_observation(obs)
 
         if obs:
             self.publish_observation(obs)
@@ -110,23 +172,25 @@ class Prototype:
             self.logger.debug(f'Started module "{self._name}" by call from '
                               f'"{sender}"')
 
-    def handle(self, message: List[Dict]) -> None:
-        """Processes messages by calling callback functions for data
-        handling.
+    def _parse(self, message: Dict) -> Optional[Tuple[Dict, Dict, str]]:
+        """Checks a message and validates its payload.
 
         Args:
             message: Header and payload of the message.
+
+        Returns:
+            Header, payload, and payload type, or None if message is invalid.
         """
         if not self.is_sequence(message) or len(message) < 2:
             self.logger.warning('Received message is invalid')
-            return
+            return None
 
         header = message.get('header')
         payload = message.get('payload')
 
         if not header or not payload:
             self.logger.warning('Received data is corrupted')
-            return
+            return None
 
         # Get payload type and sender.
         payload_type = header.get('type')
@@ -134,17 +198,32 @@ class Prototype:
 
         if not payload_type:
             self.logger.error('Undefined payload type')
-            return
+            return None
 
-        self.logger.spam(f'Received message of type "{payload_type}" from '
-                         f'"{sender}"')
+        self.logger.spam('Received message of type "{payload_type}" from '
+                         '"{sender}"', payload_type=payload_type,
+                         sender=sender)
 
-        # Validate payload.
-        if not self.is_valid(payload, payload_type):
+        # Validate payload, unless it has been delivered in-process by another
+        # local module and this module trusts them. The sender in the header
+        # alone can be set by any MQTT client.
+        is_trusted = (isinstance(message, LocalMessage) and
+                      self.is_trusted_sender(sender))
+
+        if not is_trusted and not self.is_valid(payload, payload_type):
             self.logger.error(f'Payload of type "{payload_type}" is invalid')
-            return
+            return None
 
-        # Send payload to specific handler.
+        return header, payload, payload_type
+
+    def _dispatch(self, header: Dict, payload: Dict, payload_type: str) -> None:
+        """Sends the payload to the handler of its type.
+
+        Args:
+            header: Message header.
+            payload: Message payload.
+            payload_type: Type of the payload.
+        """
         handler_func = self._handlers.get(payload_type)
 
         if not handler_func:
@@ -154,6 +233,89 @@ class Prototype:
 
         handler_func(header, payload)
 
+    def do_handle_observations(self, payloads: List[Dict]) -> None:
+        """Handles multiple observations at once by forwarding them to the
+        batch processing method and prepares the results for publishing.
+
+        Args:
+            payloads: Message payloads.
+        """
+        observations = [Observation(payload) for payload in payloads]
+
+        if self._is_running:
+            observations = self.process_batch(observations)
+
+        for obs in observations:
+            if obs:
+                self.publish_observation(obs)
+
+    def handle(self, message: Dict) -> None:
+        """Processes messages by calling callback functions for data
+        handling.
+
+        Args:
+            message: Header and payload of the message.
+        """
+        parsed = self._parse(message)
+
+        if parsed:
+            self._dispatch(*parsed)
+
+    def handle_batch(self, messages: List[Dict]) -> None:
+        """Processes multiple messages. Consecutive observations are passed to
+        `process_batch()` at once, all other messages are handled one by one,
+        in the order of arrival.
+
+        Args:
+            messages: Headers and payloads of the messages.
+        """
+        # Observations are only batched if the default handler is in use.
+        is_batchable = (self._handlers.get('observation') ==
+                        self.do_handle_observation)
+        payloads = []
+
+        for message in messages:
+            parsed = self._parse(message)
+
+            if not parsed:
+                continue
+
+            if is_batchable and parsed[2] == 'observation':
+                payloads.append(parsed[1])
+                continue
+
+            if payloads:
+                self.do_handle_observations(payloads)
+                payloads = []
+
+            self._dispatch(*parsed)
+
+        if payloads:
+            self.do_handle_observations(payloads)
+
+    def create_process_pool(self, max_workers: int) -> bool:
+        """Creates a pool of child processes that process the observations
+        with copies of this worker. Log messages of the copies are not
+        forwarded.
+
+        Args:
+            max_workers: Number of child processes.
+
+        Returns:
+            True if pool has been created, False if the worker is not process
+            safe.
+        """
+        if not self.is_process_safe:
+            return False
+
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_process_worker,
+            initargs=(pickle.dumps(self),))
+
+        return True
+
     def get_module_config(self, *args):
         """Returns the validated configuration of the module. If no JSON schemas
         is available, the function just returns an unchecked configuration.
@@ -184,6 +346,24 @@ class Prototype:
                 hasattr(arg, '__getitem__') or
                 hasattr(arg, '__iter__'))
 
+    def is_trusted_sender(self, sender: str) -> bool:
+        """Returns whether or not payloads of the given sender can be passed
+        without validation. This is the case if the sender is a module of this
+        node and this module has been marked as trusted. Must only be called
+        for messages that have been delivered in-process.
+
+        Args:
+            sender: Name of the sending module.
+
+        Returns:
+            True if sender is trusted, False if not.
+        """
+        if not self._schema_manager.is_trusted(self._name):
+            return False
+
+        return bool(self._module_manager and
+                    self._module_manager.has_module(sender))
+
     def is_valid(self, data: Dict, data_type: str) -> bool:
         """Returns whether or not given data is valid by checking against the
         JSON schemas.
@@ -209,17 +389,49 @@ class Prototype:
         """
         return obs
 
+    def process_observation_in_pool(self, obs: Observation) -> Observation:
+        """Processes an observation object in the process pool and waits for
+        the result.
+
+        Args:
+            obs: Observation object.
+
+        Returns:
+            The processed observation object.
+        """
+        future = self._process_pool.submit(process_in_worker, obs.data)
+        data = future.result()
+
+        return Observation(data) if data else None
+
+    def process_batch(self,
+                      observations: List[Observation]) -> List[Observation]:
+        """Processes multiple observation objects at once. Calls
+        `process_observation()` for each observation by default. Workers may
+        override this method to process the observations in a vectorised way.
+
+        Args:
+            observations: List of observation objects.
+
+        Returns:
+            The processed observation objects.
+        """
+        return [self.process_observation(obs) for obs in observations]
+
     def publish(self, target: str, header: Dict, payload: Dict, qos: int = 0,
                 retain: bool = False) -> None:
-        """Appends header and payload to a list, converts the list to a JSON
-        string and sends it to the designated target by using the callback
-        function `_uplink()`. The JSON string has the format::
+        """Puts header and payload into a dictionary and sends it to the
+        designated target by using the callback function `_uplink()`. The
+        message has the format::
 
             {
               "header": <header>,
               "payload": <payload>
             }
 
+        The message is converted to JSON by the module only if it has to be
+        sent over MQTT.
+
         Args:
             target: Name of the target.
             header: Header of the message.
@@ -232,10 +444,10 @@ class Prototype:
             return
 
         try:
-            message = json.dumps({
+            message = {
                 'header': header,
                 'payload': payload
-            })
+            }
             self._uplink(target, message, qos, retain)
             # self.logger.spam(f'Published message of type'
             #                  f'"{header.get("type")}" to "{target}"')
@@ -243,6 +455,23 @@ class Prototype:
             self.logger.error(f'Message could not be published (invalid header '
                               f'or payload): {e}')
 
+    def _is_slim_receiver(self, name: str) -> bool:
+        """Returns whether the given receiver is a local module that accepts
+        slim observations.
+
+        Args:
+            name: The name of the receiver.
+
+        Returns:
+            True if receiver accepts slim observations, False if not.
+        """
+        if not self._module_manager:
+            return False
+
+        module = self._module_manager.get(name)
+
+        return bool(module and module.worker.is_slim_safe)
+
     def publish_observation(self, obs: Observation) -> None:
         """Prepares the observation for publishing and forwards it to the
         messenger.
@@ -262,21 +491,30 @@ class Prototype:
 
         # No index defined.
         if (index is None) or (index < 0):
-            self.logger.warning(f'Undefined receiver in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Undefined receiver in observation "{name}" '
+                                'of target "{target}"', obs)
             return
 
         # Receivers list has been processed and observation is finished.
         if index >= len(receivers):
-            self.logger.info(f'Observation "{obs.get("name")}" of target '
-                             f'"{obs.get("target")}" has been finished')
+            self.logger.info('Observation "{name}" of target "{target}" has '
+                             'been finished', obs)
             return
 
         # Increase the receivers index.
         next_receiver = receivers[index]
         obs.set('nextReceiver', index + 1)
 
+        # Replace the static data of the sensor configuration with a
+        # reference, but only if the observation is sent to a local module
+        # that does not need it. Observations stored or sent to other nodes
+        # have to be complete, as the templates are not persisted.
+        if self._is_slimming and self._is_slim_receiver(next_receiver):
+            if not obs.is_slim:
+                self._sensor_manager.slim(obs)
+        elif obs.is_slim:
+            self._sensor_manager.rehydrate(obs)
+
         # Create header and payload.
         header = {
             'from': self._name,
@@ -296,6 +534,40 @@ class Prototype:
         self.logger.debug(f'Starting worker "{self._name}" ...')
         self._is_running = True
 
+    def start_async(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Starts the worker within the asyncio runtime. If `is_async` is set,
+        the coroutine `run_async()` is run as a task on the given event loop.
+        Otherwise, the worker is started by calling `start()`. Has to be
+        called from the thread of the event loop.
+
+        Args:
+            loop: The event loop.
+        """
+        if not self.is_async:
+            self.start()
+            return
+
+        if self._is_running:
+            return
+
+        Prototype.start(self)
+
+        self._loop = loop
+        self._async_wakeup = asyncio.Event()
+
+        task = loop.create_task(self.run_async())
+        task.add_done_callback(self._log_task_result)
+
+    def _log_task_result(self, task: asyncio.Task) -> None:
+        """Logs the exception of a finished task of the worker, if any.
+
+        Args:
+            task: The finished task.
+        """
+        if not task.cancelled() and task.exception():
+            self.logger.error(f'Worker "{self._name}" failed: '
+                              f'{task.exception()}')
+
     def stop(self) -> None:
         """Stops the worker."""
         if not self._is_running:
@@ -303,11 +575,84 @@ class Prototype:
 
         self.logger.debug(f'Stopping worker "{self._name}" ...')
         self._is_running = False
+        self.wake_up()
+
+        if self._process_pool:
+            self._process_pool.shutdown(wait=False)
+            self._process_pool = None
+
+    def wait_until(self,
+                   predicate: Callable[[], bool],
+                   timeout: float = None) -> bool:
+        """Blocks the calling thread until the predicate becomes true, the
+        worker is stopped, or the timeout occurs. The predicate is checked
+        again whenever `wake_up()` is called.
+
+        Args:
+            predicate: Function that returns True if there is work to do.
+            timeout: Optional timeout in seconds.
+
+        Returns:
+            Last result of the predicate.
+        """
+        with self._wakeup:
+            self._wakeup.wait_for(lambda: predicate() or not self._is_running,
+                                  timeout)
+            return predicate()
+
+    async def wait_until_async(self,
+                               predicate: Callable[[], bool],
+                               timeout: float = None) -> bool:
+        """Coroutine version of `wait_until()` for workers that are run by the
+        asyncio runtime.
+
+        Args:
+            predicate: Function that returns True if there is work to do.
+            timeout: Optional timeout in seconds.
+
+        Returns:
+            Last result of the predicate.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while not predicate() and self._is_running:
+            remaining = None if deadline is None else deadline - loop.time()
+
+            if remaining is not None and remaining <= 0:
+                break
+
+            self._async_wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._async_wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        return predicate()
+
+    def wake_up(self) -> None:
+        """Wakes up all threads and coroutines of the worker that are blocked
+        in `wait_until()` or `wait_until_async()`. Has to be called when new
+        work arrives."""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._async_wakeup.set)
+
+    @property
+    def concurrency(self) -> int:
+        return self._concurrency
 
     @property
     def is_running(self) -> bool:
         return self._is_running
 
+    @property
+    def is_slimming(self) -> bool:
+        return self._is_slimming
+
     @property
     def name(self) -> str:
         return self._name
@@ -317,13 +662,21 @@ class Prototype:
         return self._type
 
     @property
-    def uplink(self) -> Callable[[str, str], None]:
+    def uplink(self) -> Callable[[str, Dict, int, bool], None]:
         return self._uplink
 
+    @concurrency.setter
+    def concurrency(self, concurrency: int) -> None:
+        self._concurrency = concurrency
+
+    @is_slimming.setter
+    def is_slimming(self, is_slimming: bool) -> None:
+        self._is_slimming = is_slimming
+
     @type.setter
     def type(self, type: str) -> None:
         self._type = type
 
     @uplink.setter
-    def uplink(self, uplink: Callable[[str, str], None]) -> None:
+    def uplink(self, uplink: Callable[[str, Dict, int, bool], None]) -> None:
         self._uplink = uplink
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+
+"""Runtime to run all modules of a node on a single asyncio event loop."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from core.intercom import MQTTMessenger
+from core.module import Module
+
+
+class AsyncRuntime:
+    """
+    AsyncRuntime runs all modules of a node as coroutines on a single asyncio
+    event loop, as an alternative to a thread per module. The modules share a
+    single MQTT messenger, whose network traffic is handled on the event loop
+    as well.
+
+    The message handlers of the workers may block and are therefore called in
+    a common pool of threads of limited size. Workers with a coroutine
+    `run_async()` (Scheduler, CloudExporter, CloudAgent) run on the event
+    loop, all other workers start their own threads as usual.
+    """
+
+    # Time in seconds to wait for the modules to stop.
+    STOP_TIMEOUT = 5.0
+
+    def __init__(self, messenger: MQTTMessenger, workers: int = 4):
+        """
+        Args:
+            messenger: The shared MQTT messenger.
+            workers: Number of threads that call blocking handlers.
+        """
+        self.logger = logging.getLogger('runtime')
+
+        self._messenger = messenger
+        self._workers = workers
+        self._loop = None
+        self._thread = None
+
+    async def _run_module(self, module: Module) -> None:
+        """Runs a module until it is stopped.
+
+        Args:
+            module: The module.
+        """
+        try:
+            await module.run_async()
+        except Exception as e:
+            self.logger.error(f'Module "{module.worker.name}" failed: {e}')
+
+    async def _shutdown(self) -> None:
+        """Disconnects the messenger, waits for the remaining tasks, and stops
+        the event loop."""
+        self._messenger.disconnect()
+
+        tasks = [task for task in asyncio.all_tasks()
+                 if task is not asyncio.current_task()]
+
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.STOP_TIMEOUT)
+
+            for task in pending:
+                task.cancel()
+
+        asyncio.get_running_loop().stop()
+
+    def _run(self) -> None:
+        """Runs the event loop. Runs within a thread."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.create_task(self._messenger.run_async())
+
+        try:
+            self._loop.run_forever()
+        except Exception as e:
+            self.logger.critical(f'Event loop failed: {e}')
+        finally:
+            self._loop.close()
+
+    def run(self, module: Module) -> concurrent.futures.Future:
+        """Runs a module and its worker on the event loop. May be called from
+        any thread.
+
+        Args:
+            module: The module.
+
+        Returns:
+            Future that is done once the module has been stopped.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run_module(module),
+                                                self._loop)
+
+    def start(self) -> None:
+        """Starts the event loop in a new thread and connects the messenger."""
+        if self.is_running:
+            return
+
+        self.logger.verbose(f'Starting asyncio runtime with {self._workers} '
+                            f'worker thread(s) ...')
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self._workers,
+                               thread_name_prefix='runtime'))
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='runtime',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the event loop, after the modules have been stopped."""
+        if not self.is_running:
+            return
+
+        self.logger.verbose('Stopping asyncio runtime ...')
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._loop and not self._loop.is_closed() and
+                    self._thread.is_alive())
+
+    @property
+    def messenger(self) -> MQTTMessenger:
+        return self._messenger
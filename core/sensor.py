@@ -7,6 +7,8 @@ __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 import codecs
+import hashlib
+import json
 import logging
 
 from typing import Any, Dict
@@ -34,10 +36,12 @@ class Sensor:
         self._description = self._config.get('description', '')
 
         self._observations = {}
+        self._versions = {}         # Template versions by observation name.
 
         for data in self._config.get('observations'):
             obs = self.create_observation(data)
             self._observations[obs.get("name")] = obs
+            self._versions[obs.get('name')] = self.get_version(obs)
 
             self.logger.debug(f'Loaded observation "{obs.get("name")}" of '
                               f'sensor "{self._name}"')
@@ -88,6 +92,38 @@ class Sensor:
         """
         return self._observations
 
+    def get_template_version(self, name: str) -> str:
+        """Returns the template version of an observation.
+
+        Args:
+            name: The name of the observation.
+
+        Returns:
+            The version, or None if observation does not exist.
+        """
+        return self._versions.get(name)
+
+    @staticmethod
+    def get_version(obs: Observation) -> str:
+        """Returns a hash of the static data of the request sets of an
+        observation. The hash changes whenever the sensor configuration
+        changes.
+
+        Args:
+            obs: The observation.
+
+        Returns:
+            The first eight characters of the SHA-1 hash in hex.
+        """
+        data = {
+            set_name: {key: request_set.get(key)
+                       for key in Observation.TEMPLATE_KEYS}
+            for set_name, request_set in obs.get('requestSets').items()
+        }
+        dump = json.dumps(data, sort_keys=True).encode('utf-8')
+
+        return hashlib.sha1(dump).hexdigest()[:8]
+
     @property
     def description(self) -> str:
         return self._description
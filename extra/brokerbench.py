@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+"""Benchmark of the internal MQTT message brokers. Each broker is started in a
+child process. The script measures the time until the broker accepts
+connections, the throughput of messages from a publishing to a subscribing
+client, and the CPU time consumed by the broker process.
+
+Run the benchmark from the root directory of OpenADMS Node:
+
+    $ python3 extra/brokerbench.py --count 10000 --qos 1
+    $ python3 extra/brokerbench.py --broker builtin --unix-socket /tmp/mqtt.sock
+"""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from typing import Dict, Optional
+
+import paho.mqtt.client as paho
+
+# Time in seconds to wait for a broker.
+TIMEOUT = 60.0
+
+
+def connect(port: int, path: Optional[str]) -> bool:
+    """Returns whether the broker accepts connections."""
+    if path:
+        sock = socket.socket(socket.AF_UNIX)
+        address = path
+    else:
+        sock = socket.socket()
+        address = ('127.0.0.1', port)
+
+    try:
+        sock.connect(address)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def create_client(client_id: str, port: int, path: Optional[str]) -> paho.Client:
+    """Returns a connected MQTT client with running network thread."""
+    client = paho.Client(client_id=client_id,
+                         transport='unix' if path else 'tcp')
+    client.max_inflight_messages_set(100)
+    client.max_queued_messages_set(0)
+    client.connect(path or '127.0.0.1', port)
+    client.loop_start()
+    return client
+
+
+def run(broker_type: str,
+        port: int,
+        path: Optional[str],
+        count: int,
+        size: int,
+        qos: int) -> Dict[str, float]:
+    """Starts a broker in a child process and sends messages through it.
+
+    Args:
+        broker_type: Type of the broker (`builtin` or `hbmqtt`).
+        port: The port number.
+        path: Optional path of a Unix domain socket.
+        count: Number of messages.
+        size: Size of the payload in bytes.
+        qos: Quality of Service.
+
+    Returns:
+        Start-up time, throughput, and CPU time of the broker.
+    """
+    args = [sys.executable, __file__, '--serve', broker_type,
+            '--port', str(port)]
+
+    if path:
+        args += ['--unix-socket', path]
+
+    t0 = time.monotonic()
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, text=True)
+
+    try:
+        while not connect(port, path):
+            if process.poll() is not None or time.monotonic() - t0 > TIMEOUT:
+                raise RuntimeError(f'Broker "{broker_type}" failed to start')
+
+            time.sleep(0.01)
+
+        startup_time = time.monotonic() - t0
+        received = threading.Event()
+        counter = [0]
+
+        def on_message(client, userdata, msg):
+            counter[0] += 1
+
+            if counter[0] == count:
+                received.set()
+
+        subscriber = create_client('bench-sub', port, path)
+        subscriber.on_message = on_message
+        subscriber.subscribe('bench/#', qos)
+        publisher = create_client('bench-pub', port, path)
+        time.sleep(0.5)
+
+        payload = b'x' * size
+        t1 = time.monotonic()
+
+        for i in range(count):
+            publisher.publish(f'bench/{i % 10}', payload, qos)
+
+        is_complete = received.wait(TIMEOUT)
+        duration = time.monotonic() - t1
+
+        publisher.disconnect()
+        subscriber.disconnect()
+        publisher.loop_stop()
+        subscriber.loop_stop()
+    finally:
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=TIMEOUT)
+
+    cpu_time = float(output.split()[-1]) if output.strip() else float('nan')
+
+    return {
+        'startup': startup_time,
+        'throughput': counter[0] / duration,
+        'cpu': cpu_time,
+        'lost': 0 if is_complete else count - counter[0]
+    }
+
+
+def serve(broker_type: str, port: int, path: Optional[str]) -> None:
+    """Runs a broker until SIGTERM is received, and prints the CPU time used by
+    the process."""
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    logging.disable(logging.CRITICAL)
+
+    def stop(signalnum, frame):
+        print(time.process_time(), flush=True)
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+
+    if broker_type == 'hbmqtt':
+        from core.intercom import MQTTMessageBroker
+        broker = MQTTMessageBroker('127.0.0.1', port)
+    else:
+        from core.broker import MessageBroker
+        broker = MessageBroker('127.0.0.1', port, path)
+
+    broker.start()
+
+    while True:
+        time.sleep(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark of the internal '
+                                                 'MQTT message brokers')
+    parser.add_argument('--broker', dest='brokers', action='append',
+                        choices=['builtin', 'hbmqtt'],
+                        help='broker to test (default: all)')
+    parser.add_argument('--count', type=int, default=10000,
+                        help='number of messages')
+    parser.add_argument('--size', type=int, default=256,
+                        help='payload size in bytes')
+    parser.add_argument('--qos', type=int, default=0, choices=[0, 1],
+                        help='Quality of Service')
+    parser.add_argument('--port', type=int, default=18830,
+                        help='port of the broker')
+    parser.add_argument('--unix-socket', dest='path',
+                        help='path of Unix domain socket (built-in broker '
+                             'only)')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.path)
+        return
+
+    print(f'{args.count} messages, {args.size} bytes, QoS {args.qos}\n')
+    print(f'{"Broker":<10}{"Start-up [s]":>14}{"Messages/s":>14}'
+          f'{"CPU [s]":>10}{"Lost":>8}')
+
+    for broker_type in args.brokers or ['builtin', 'hbmqtt']:
+        path = args.path if broker_type == 'builtin' else None
+
+        try:
+            r = run(broker_type, args.port, path, args.count, args.size,
+                    args.qos)
+        except Exception as e:
+            print(f'{broker_type:<10}{str(e):>14}')
+            continue
+
+        print(f'{broker_type:<10}{r["startup"]:>14.2f}{r["throughput"]:>14.0f}'
+              f'{r["cpu"]:>10.2f}{r["lost"]:>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,7 +10,7 @@ import logging
 import threading
 import time
 
-from typing import Any, Dict, Union
+from typing import Any, Dict, List, Union
 
 try:
     import couchdb
@@ -19,10 +19,10 @@ except ImportError:
 
 try:
     from tinydb import TinyDB
-    from tinydb.storages import MemoryStorage
 except ImportError:
     logging.getLogger().warning('Importing Python module "tinydb" failed')
 
+from core.cache import AppendOnlyCache, CacheRecord
 from core.manager import Manager
 from core.observation import Observation
 from core.prototype import Prototype
@@ -32,8 +32,8 @@ class CouchDriver(Prototype):
     """
     CouchDriver provides connectivity for Apache CouchDB. Observations send to
     a CouchDriver instance will be cached and then stored in the database
-    defined the configuration. TinyDB is used for caching (either file-based
-    or in-memory).
+    defined the configuration. An append-only cache is used for caching
+    (either file-based or in-memory).
 
     Parameters:
         server (str): FQDN or IP address of CouchDB server.
@@ -43,9 +43,15 @@ class CouchDriver(Prototype):
         password (str): Password.
         db (str): Database name.
         tls (bool): Use TLS encryption (default: False).
-        cacheFile (str): Optional file name of local cache database
-            (e.g., `cache.json`). If not set, an in-memory database will be
-            used instead.
+        cacheFile (str): Optional base name of the segment files of the
+            local cache (e.g., `cache/couchdb`). If not set, an in-memory
+            cache will be used instead.
+        fsync (str): Optional fsync policy of the cache (`always`,
+            `interval`, or `never`).
+        bulkSize (int): Optional maximum number of observations inserted
+            with a single request to `_bulk_docs` (default: 1, no bulk mode).
+        lingerTime (float): Optional time in seconds to wait for the cache to
+            fill up to `bulkSize` before a smaller bulk is inserted.
     """
 
     def __init__(self, module_name: str, module_type: str, manager: Manager):
@@ -57,21 +63,25 @@ class CouchDriver(Prototype):
         self._thread = None     # Thread doing the caching.
         self._timeout = 30.0    # Time to wait on connection error.
 
+        self._bulk_size = max(config.get('bulkSize', 1), 1)
+        self._linger_time = config.get('lingerTime', 0.0)
+
         cache_file = config.get('cacheFile')
+        fsync = config.get('fsync', 'interval')
 
         # Initialise local cache database.
         if not cache_file or cache_file.strip() == "":
             # Create in-memory cache database.
             self.logger.verbose('Creating in-memory cache database ...')
-            self._cache_db = TinyDB(storage=MemoryStorage)
+            self._cache_db = AppendOnlyCache()
         else:
             # Create file-based cache database.
             try:
                 self.logger.verbose(f'Opening local cache database '
                                     f'"{cache_file}" ...')
-                self._cache_db = TinyDB(cache_file)
+                self._cache_db = AppendOnlyCache(cache_file, fsync=fsync)
             except Exception:
-                raise ValueError(f'Cache database "{self._db_file}" could '
+                raise ValueError(f'Cache database "{cache_file}" could '
                                  f'not be opened')
 
         # Use either HTTPS or HTTP.
@@ -124,17 +134,62 @@ class CouchDriver(Prototype):
         self._db = self._couch[self._db_name]
 
     def _get_cached_observation_data(self) -> Union[Dict[str, Any], None]:
-        """"Returns a random JSON-serialised observation data set from the
-        local cache database.
+        """"Returns the oldest observation data set from the local cache
+        database.
 
         Returns:
             Observation data or None if cache is empty.
         """
-        if len(self._cache_db) > 0:
-            return self._cache_db.all()[0]
+        records = self._cache_db.first()
+
+        if records:
+            return records[0]
 
         return None
 
+    def _insert_bulk_observation_data(self,
+                                      bulk: List[CacheRecord]) -> List[int]:
+        """Inserts multiple observation data sets into CouchDB database by
+        using a single request to `_bulk_docs`.
+
+        Args:
+            bulk: The cached observation data sets.
+
+        Returns:
+            Cache document ids of all stored observations.
+        """
+        try:
+            if self._couch is None:
+                self._connect()
+
+            docs = [dict(obs_data, _id=obs_data.get('id'))
+                    for obs_data in bulk]
+            results = self._db.update(docs)
+        except Exception as e:
+            self.logger.error(f'Bulk of {len(bulk)} observation(s) could not '
+                              f'be saved in CouchDB database '
+                              f'"{self._db_name}": {str(e)}')
+            return []
+
+        doc_ids = []
+
+        for obs_data, (is_success, _, result) in zip(bulk, results):
+            # On conflict, the observation has already been stored.
+            if is_success or isinstance(result, couchdb.http.ResourceConflict):
+                doc_ids.append(obs_data.doc_id)
+                continue
+
+            self.logger.error(f'Observation "{obs_data.get("name")}" with '
+                              f'target "{obs_data.get("target")}" from port '
+                              f'"{obs_data.get("portName")}" could not be '
+                              f'saved in CouchDB database "{self._db_name}": '
+                              f'{str(result)}')
+
+        self.logger.info(f'Saved {len(doc_ids)} of {len(bulk)} observation(s) '
+                         f'to CouchDB database "{self._db_name}"')
+
+        return doc_ids
+
     def _insert_observation_data(self, obs_data: Dict[str, Any]) -> bool:
         """Inserts observation data into CouchDB database.
 
@@ -172,6 +227,28 @@ class CouchDriver(Prototype):
         self._cache_db.remove(doc_ids=[doc_id])
         self.logger.debug(f'Removed observation from cache (id {doc_id})')
 
+    def _run_bulk(self) -> None:
+        """Inserts the next bulk of cached observation data into CouchDB
+        database and removes the stored data sets from the local cache."""
+        if self._linger_time > 0:
+            # Give the cache some time to fill up.
+            self.wait_until(lambda: len(self._cache_db) >= self._bulk_size,
+                            self._linger_time)
+
+        bulk = self._cache_db.first(self._bulk_size)
+        self.logger.debug(f'Trying to insert {len(bulk)} observation(s) into '
+                          f'CouchDB database "{self._db_name}" ...')
+
+        doc_ids = self._insert_bulk_observation_data(bulk)
+
+        if doc_ids:
+            self._cache_db.remove(doc_ids=doc_ids)
+            self.logger.debug(f'Removed {len(doc_ids)} observation(s) from '
+                              f'cache')
+
+        if len(doc_ids) < len(bulk):
+            time.sleep(self._timeout)
+
     def has_cached_observation_data(self) -> bool:
         """Returns whether or not a cached observation exists in the local
         cache database.
@@ -187,6 +264,7 @@ class CouchDriver(Prototype):
         if doc_id:
             self.logger.debug(f'Cached observation "{obs.get("name")}" of '
                               f'target "{obs.get("target")}" (id {doc_id})')
+            self.wake_up()
         else:
             self.logger.error(f'Caching of observation "{obs.get("name")}" of '
                               f'target "{obs.get("target")}" failed')
@@ -196,9 +274,8 @@ class CouchDriver(Prototype):
     def run(self) -> None:
         """Inserts cached observation data into CouchDB database."""
         while self.is_running:
-            # Poor men's event handling ...
-            if not self.has_cached_observation_data():
-                time.sleep(1.0)
+            # Block until observations have been cached.
+            if not self.wait_until(self.has_cached_observation_data):
                 continue
 
             if len(self._cache_db) > 500:
@@ -206,6 +283,10 @@ class CouchDriver(Prototype):
                                     '({} cached observations)'
                                     .format(len(self._cache_db)))
 
+            if self._bulk_size > 1:
+                self._run_bulk()
+                continue
+
             # Insert cached observation data into CouchDB database.
             obs_data = self._get_cached_observation_data()
 
@@ -7,24 +7,23 @@ __copyright__ = 'Copyright (c) 2020, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 # Build-in modules.
-import copy
+import asyncio
+import json
 import threading
 import time
 
 from enum import Enum
 from functools import reduce
 from pathlib import Path
-from typing import Any, Dict, Union
+from typing import Any, Dict, List, Union
 from urllib.parse import urljoin
 
 # Third-party modules.
 import arrow
 import requests
 
-from tinydb import TinyDB
-from tinydb.storages import MemoryStorage
-
 # OpenADMS Node modules.
+from core.cache import AppendOnlyCache
 from core.manager import Manager
 from core.observation import Observation
 from core.prototype import Prototype
@@ -38,14 +37,25 @@ class CloudExporter(Prototype):
     file-based. In-memory is faster and requires less I/O operations, but
     cached observations do not persist over restarts (data loss may be occur).
 
+    In batch mode, up to `batchSize` cached observations (limited to
+    `batchBytes` in JSON format, if set) are sent as a JSON array in a single
+    request. The server has to accept arrays of observations.
+
+    Within the asyncio runtime, the cache is processed by a coroutine, and the
+    requests are sent from the thread pool of the event loop.
+
     The JSON-based configuration for this module:
 
     Parameters:
         server: FQDN of the OpenADMS Server instance.
         user: User name for OpenADMS Server (HTTP Basic Auth).
         password: Password for OpenADMS Server (HTTP Basic Auth).
-        db: Path to the cache database file (e.g.: `cache.json`).
+        db: Base name of the cache segment files (e.g.: `cache/cloud`).
         cache: Caching type (either `file` or `memory`).
+        fsync: Fsync policy of the file cache (`always`, `interval`, or
+            `never`).
+        batchSize: Maximum number of observations per request (optional).
+        batchBytes: Maximum size of a batch in bytes (optional).
 
     Example:
         Example configuration::
@@ -55,10 +65,14 @@ class CloudExporter(Prototype):
                 "user": "test",
                 "password": "secret",
                 "db": "cache.json",
-                "cache": "file"
+                "cache": "file",
+                "batchSize": 100,
+                "batchBytes": 65536
             }
     """
 
+    is_async = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         config = self.get_module_config(self._name)
@@ -70,16 +84,22 @@ class CloudExporter(Prototype):
         self._password = config.get('password')
         self._cache = config.get('cache') or 'memory'
         self._db_file = config.get('db')
+        self._batch_size = max(config.get('batchSize', 1), 1)
+        self._batch_bytes = config.get('batchBytes', 0)
         self._retry_delay = 10.0
         self._timeout = 10.0
         self._thread = None
 
+        # Persistent HTTP session to keep the connection alive.
+        self._session = requests.Session()
+        self._session.auth = (self._user, self._password)
+
         if self._cache not in ['file', 'memory']:
             raise ValueError('Invalid cache type')
 
         if self._cache == 'memory':
             # Create in-memory cache database.
-            self._cache_db = TinyDB(storage=MemoryStorage)
+            self._cache_db = AppendOnlyCache()
             self.logger.verbose('Created in-memory cache database')
 
         if self._cache == 'file':
@@ -87,9 +107,11 @@ class CloudExporter(Prototype):
             try:
                 self.logger.verbose(f'Opening local cache database '
                                     f'"{self._db_file}" ...')
-                self._cache_db = TinyDB(self._db_file)
+                self._cache_db = AppendOnlyCache(self._db_file,
+                                                 fsync=config.get('fsync',
+                                                                  'interval'))
             except Exception:
-                self._cache_db = TinyDB(storage=MemoryStorage)
+                self._cache_db = AppendOnlyCache()
                 raise ValueError(f'Cache database file "{self._db_file}" could not '
                                  f'be opened, using memory storage instead')
 
@@ -100,63 +122,83 @@ class CloudExporter(Prototype):
             obs: Observation object.
         """
         doc_id = self._cache_db.insert(obs.data)
-        self.logger.debug(f'Cached observation "{obs.get("name")}" of target '
-                          f'"{obs.get("target")}" (id {doc_id})')
+        self.logger.debug('Cached observation "{name}" of target "{target}" '
+                          '(id {doc_id})', obs, doc_id=doc_id)
         return doc_id
 
-    def _get_cached_observations(self) -> Union[Dict[str, Any], None]:
-        """"Returns a random observation data set from the cache database.
+    def _get_cached_observations(self) -> List[Dict[str, Any]]:
+        """"Returns the next batch of observation data sets from the cache
+        database. The batch contains at least one observation, if the cache
+        is not empty.
 
         Returns:
-            Observation data or None if cache is empty.
+            List of observation data.
         """
-        if len(self._cache_db) > 0:
-            return self._cache_db.all()[0]
+        batch = []
+        size = 0
 
-        return None
+        for obs_data in self._cache_db.first(self._batch_size):
+            if self._batch_bytes > 0:
+                size += len(json.dumps(obs_data))
 
-    def _remove_observation(self, doc_id: int) -> None:
-        """Removes a single observations from the cache database.
+                if batch and size > self._batch_bytes:
+                    break
 
-        Args:
-            doc_id: The document id.
-        """
-        self._cache_db.remove(doc_ids=[doc_id])
-        self.logger.debug('Removed observation from cache '
-                          '(id {})'.format(doc_id))
+            batch.append(obs_data)
 
-    def _transfer_observation(self, obs_data: Dict[str, Any]) -> bool:
-        """Sends an observersation to defined remote OpenADMS Server instance.
+        return batch
+
+    def _post(self, data: Any) -> Union[requests.Response, None]:
+        """Sends data in JSON format to the OpenADMS Server API.
 
         Args:
-            obs_data: The observation data dictionary.
+            data: The data to send.
 
         Returns:
-            True on successful transmission, False on error.
+            Response of the server or None on connection error.
         """
         try:
-            self.logger.info(f'Sending observation "{obs_data.get("name")}" of '
-                             f'target "{obs_data.get("target")}" from port '
-                             f'"{obs_data.get("portName")}" to API '
-                             f'"{self._url}" ...')
-            r = requests.post(self._url, auth=(self._user,
-                                               self._password),
-                                               json=obs_data,
-                                               timeout=self._timeout)
+            return self._session.post(self._url,
+                                      json=data,
+                                      timeout=self._timeout)
         except requests.exceptions.ConnectionError:
             self.logger.warning(f'Connection to API "{self._host}" failed')
-            return False
         except requests.exceptions.HTTPError:
             self.logger.warning(f'Invalid response from API "{self._host}"')
-            return False
         except requests.exceptions.Timeout:
             self.logger.warning(f'Connection to API "{self._host}" timed out')
-            return False
         except requests.exceptions.TooManyRedirects:
             self.logger.warning(f'Too many redirects by API "{self._host}"')
-            return False
         except requests.exceptions.RequestException as e:
             self.logger.warning(f'Connection to API "{self._host}" failed: {str(e)}')
+
+        return None
+
+    def _remove_observations(self, doc_ids: List[int]) -> None:
+        """Removes observations from the cache database.
+
+        Args:
+            doc_ids: The document ids.
+        """
+        self._cache_db.remove(doc_ids=doc_ids)
+        self.logger.debug(f'Removed {len(doc_ids)} observation(s) from cache')
+
+    def _transfer_observation(self, obs_data: Dict[str, Any]) -> bool:
+        """Sends an observersation to defined remote OpenADMS Server instance.
+
+        Args:
+            obs_data: The observation data dictionary.
+
+        Returns:
+            True on successful transmission, False on error.
+        """
+        self.logger.info(f'Sending observation "{obs_data.get("name")}" of '
+                         f'target "{obs_data.get("target")}" from port '
+                         f'"{obs_data.get("portName")}" to API '
+                         f'"{self._url}" ...')
+        r = self._post(obs_data)
+
+        if r is None:
             return False
 
         if (r.status_code == 200 or r.status_code == 201):
@@ -171,6 +213,34 @@ class CloudExporter(Prototype):
 
         return False
 
+    def _transfer_observations(self, batch: List[Dict[str, Any]]) -> bool:
+        """Sends a batch of observations as JSON array to the defined remote
+        OpenADMS Server instance.
+
+        Args:
+            batch: List of observation data dictionaries.
+
+        Returns:
+            True on successful transmission, False on error.
+        """
+        self.logger.info(f'Sending {len(batch)} observation(s) to API '
+                         f'"{self._url}" ...')
+        r = self._post(batch)
+
+        if r is None:
+            return False
+
+        if (r.status_code == 200 or r.status_code == 201):
+            self.logger.info(f'Successfully sent {len(batch)} observation(s) '
+                             f'to API "{self._host}" (server status '
+                             f'{r.status_code})')
+            return True
+        else:
+            self.logger.warning(f'Sending observations to API "{self._host}" '
+                                f'failed (server error {r.status_code})')
+
+        return False
+
     def has_cached_observation(self) -> bool:
         """Returns whether or not a cached observation exists in the database.
 
@@ -188,29 +258,59 @@ class CloudExporter(Prototype):
         Returns:
             The observation object.
         """
-        self._cache_observation(copy.deepcopy(obs))
+        self._cache_observation(obs.clone())
+        self.wake_up()
         return obs
 
+    def _send_cached_observations(self) -> bool:
+        """Sends the oldest cached observations to the RESTful service and
+        removes them from the cache on success.
+
+        Returns:
+            True if observations have been sent, False on error.
+        """
+        if len(self._cache_db) > 500:
+            self.logger.warning('Cache stores more than 500 observations')
+
+        # Send cached observations to OpenADMS Server.
+        batch = self._get_cached_observations()
+
+        if self._batch_size > 1:
+            is_sent = self._transfer_observations(batch)
+        else:
+            is_sent = self._transfer_observation(batch[0])
+
+        if is_sent:
+            # Remove the transferred observation data from cache.
+            self._remove_observations([d.doc_id for d in batch])
+
+        return is_sent
+
     def run(self) -> None:
-        """Sends cached observation to RESTful service."""
+        """Sends cached observations to RESTful service."""
         while self._is_running:
-            # Lazy waiting ...
-            if not self.has_cached_observation():
-                time.sleep(1.0)
+            # Block until observations have been cached.
+            if not self.wait_until(self.has_cached_observation):
                 continue
 
-            if len(self._cache_db) > 500:
-                self.logger.warning('Cache stores more than 500 observations')
+            if not self._send_cached_observations():
+                # On error, wait before retrying.
+                time.sleep(self._retry_delay)
+
+    async def run_async(self) -> None:
+        """Sends cached observations to RESTful service. Coroutine version of
+        `run()`."""
+        loop = asyncio.get_running_loop()
 
-            # Send cached observations to OpenADMS Server.
-            obs_data = self._get_cached_observations()
+        while self._is_running:
+            if not await self.wait_until_async(self.has_cached_observation):
+                continue
 
-            if self._transfer_observation(obs_data):
-                # Remove the transferred observation data from cache.
-                self._remove_observation(obs_data.doc_id)
-            else:
+            # The blocking request is sent from the thread pool.
+            if not await loop.run_in_executor(None,
+                                              self._send_cached_observations):
                 # On error, wait before retrying.
-                time.sleep(self._retry_delay)
+                await asyncio.sleep(self._retry_delay)
 
     def start(self) -> None:
         """Starts the module."""
@@ -350,10 +450,9 @@ class FileExporter(Prototype):
                 # Write line to file.
                 fh.write(line + '\n')
 
-                self.logger.info(f'Saved observation "{obs.get("name")}" of '
-                                 f'target "{obs.get("target")}" from port '
-                                 f'"{obs.get("portName")}" to file '
-                                 f'"{str(file_path)}"')
+                self.logger.info('Saved observation "{name}" of target '
+                                 '"{target}" from port "{port}" to file '
+                                 '"{file_path}"', obs, file_path=file_path)
 
         return obs
 
@@ -392,16 +491,16 @@ class RealTimePublisher(Prototype):
             return obs
 
         for topic in self._topics:
-            obs_copy = copy.deepcopy(obs)
+            obs_copy = obs.clone()
 
             target = f'{topic}/{obs_copy.get("target")}'
 
             obs_copy.set('nextReceiver', 0)
             obs_copy.set('receivers', [target])
 
-            self.logger.debug(f'Publishing observation '
-                              f'"{obs_copy.get("name")}" of target '
-                              f'"{obs_copy.get("target")}" to "{target}"')
+            self.logger.debug('Publishing observation "{name}" of target '
+                              '"{target}" to "{topic}"', obs_copy,
+                              topic=target)
 
             header = Observation.get_header()
             payload = obs_copy.data
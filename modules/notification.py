@@ -7,6 +7,7 @@ __copyright__ = 'Copyright (c) 2020, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 # Build-in modules.
+import asyncio
 import base64
 import logging
 import queue
@@ -34,7 +35,7 @@ import requests
 from mastodon import Mastodon
 
 # OpenADMS Node modules.
-from core.logging import RingBuffer, RootFilter
+from core.logging import NonBlockingQueueHandler, RingBuffer, RootFilter
 from core.manager import Manager
 from core.system import System
 from core.prototype import Prototype
@@ -59,15 +60,18 @@ class Alerter(Prototype):
         self._is_enabled = config.get('enabled', True)
         self._thread = None
         self._queue = queue.Queue(1000)
+        self._dropped = 0
 
         # Add logging handler to the root logger. Only capture the levels
-        # WARNING, ERROR, CRITICAL, and higher.
-        qh = logging.handlers.QueueHandler(self._queue)
-        qh.addFilter(RootFilter())
-        qh.setLevel(logging.WARNING)
-        qh.setFormatter(logging.Formatter('%(message)s', '%Y-%m-%dT%H:%M:%S%z'))
+        # WARNING, ERROR, CRITICAL, and higher. If the queue is full, log
+        # records are dropped instead of blocking the logging thread.
+        self._queue_handler = NonBlockingQueueHandler(self._queue)
+        self._queue_handler.addFilter(RootFilter())
+        self._queue_handler.setLevel(logging.WARNING)
+        self._queue_handler.setFormatter(
+            logging.Formatter('%(message)s', '%Y-%m-%dT%H:%M:%S%z'))
         root = logging.getLogger()
-        root.addHandler(qh)
+        root.addHandler(self._queue_handler)
 
         manager.schema.add_schema('alert', 'alert.json')
 
@@ -115,6 +119,14 @@ class Alerter(Prototype):
             self.logger.info('Processing alert message ...')
             self.fire(record)
 
+            dropped = self._queue_handler.dropped
+
+            if dropped > self._dropped:
+                self.logger.warning(f'Alert queue is full, dropped '
+                                    f'{dropped - self._dropped} alert '
+                                    f'message(s)')
+                self._dropped = dropped
+
     def start(self) -> None:
         if self._is_running:
             return
@@ -254,42 +266,50 @@ class AlertMessageFormatter(Prototype):
         self.publish(self._receiver, header, payload)
 
     def run(self) -> None:
-        """Processes the cached alert messages."""
+        """Processes the cached alert messages. Blocks until an alert message
+        arrives, then collects further messages for the collection time, and
+        finally processes all of them."""
         # Dictionary for caching alert messages. Stores a list of dictionaries:
         # '<receiver_name>': [<dict_1>, <dict_2>, ..., <dict_n>]
         cache = {}
 
         while self._is_running:
-            try:
-                # Get a message from the queue.
-                msg = self._queue.get_nowait()
+            # Blocking I/O. Interrupted by `stop()` that puts `None` into the
+            # queue.
+            msg = self._queue.get()
+
+            if msg is None:
+                continue
+
+            self.logger.debug(f'Collecting alert messages for '
+                              f'{self._msg_collection_time} s ...')
+            deadline = time.monotonic() + self._msg_collection_time
+
+            while msg:
                 # Check the receiver.
                 receiver = msg.get('receiver')
 
-                if not receiver:
-                    raise ValueError('No receiver defined in alert message')
+                if receiver:
+                    # Append the message to the list of the receiver.
+                    cache.setdefault(receiver, []).append(msg)
+                else:
+                    self.logger.error('No receiver defined in alert message')
 
-                # Create an empty list for the alert messages.
-                if not cache.get(receiver):
-                    cache[receiver] = []
+                timeout = deadline - time.monotonic()
 
-                # Append the message to the list of the receiver.
-                cache[receiver].append(msg)
-            except queue.Empty:
-                if len(cache) > 0:
-                    for receiver, messages in cache.items():
-                        if not messages or len(messages) == 0:
-                            # No messages for receiver.
-                            continue
+                if timeout <= 0:
+                    break
 
-                        self.process_alert_messages(receiver, messages)
+                try:
+                    msg = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    msg = None
 
-                # Sleep some time.
-                self.logger.debug(f'Waiting {self._msg_collection_time} s ...')
-                time.sleep(self._msg_collection_time)
+            for receiver, messages in cache.items():
+                self.process_alert_messages(receiver, messages)
 
-                # Clear the messages cache.
-                cache.clear()
+            # Clear the messages cache.
+            cache.clear()
 
     def start(self) -> None:
         if self._is_running:
@@ -297,10 +317,27 @@ class AlertMessageFormatter(Prototype):
 
         super().start()
 
+        if not self._msg_collection_enabled:
+            return
+
+        if self._thread and self._thread.is_alive():
+            # The thread of a previous run has not finished yet and keeps
+            # consuming the queue.
+            return
+
+        # Threading for alert message caching.
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._is_running:
+            return
+
+        super().stop()
+
         if self._msg_collection_enabled:
-            # Threading for alert message caching.
-            self._thread = threading.Thread(target=self.run, daemon=True)
-            self._thread.start()
+            # Wake up the blocking `run()` method.
+            self._queue.put(None)
 
 
 class Camera(Prototype):
@@ -368,6 +405,9 @@ class CloudAgent(Prototype):
     """
     Sends logs messages to OpenADMS Server instances.
 
+    Within the asyncio runtime, the log messages are sent by coroutines, and
+    the requests from the thread pool of the event loop.
+
     The JSON-based configuration for this module:
 
     Parameters:
@@ -376,6 +416,8 @@ class CloudAgent(Prototype):
         password (str): OpenADMS Server password.
     """
 
+    is_async = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         self._config = self.get_module_config(self._name)
@@ -388,7 +430,7 @@ class CloudAgent(Prototype):
         self._url = urljoin(self._host, 'api/v1/logs/')
         self._retry_delay = 10.0
         self._timeout = 10.0
-        self._thread = None
+        self._threads = []
         self._queue = queue.Queue(1000)
 
         # Message handler.
@@ -459,19 +501,73 @@ class CloudAgent(Prototype):
         """
         self.logger.debug("Appending alert message to message queue ...")
         self._queue.put(payload)
+        self.wake_up()
 
     def run(self) -> None:
-        """Processes the cached alert messages."""
+        """Processes the cached alert messages. Runs in as many threads as
+        set by the concurrency of the module."""
         while self._is_running:
-            # Get a log message from the queue (blocking).
             self.logger.spam('Waiting for log messages ...')
-            log = self._queue.get()
 
-            if (not self._transfer_log(log)):
-                self._queue.put(log)
-                self.logger.info(f'Sending log message from module "{log.get("module")} '
-                                 f'again in {self._retry_delay} seconds ...')
-                time.sleep(self._retry_delay)
+            # Block until a log message arrives or the module is stopped.
+            if not self.wait_until(lambda: not self._queue.empty()):
+                continue
+
+            try:
+                log = self._queue.get_nowait()
+            except queue.Empty:
+                # Taken by another thread.
+                continue
+
+            if not self._transfer_log(log):
+                try:
+                    self._queue.put_nowait(log)
+                except queue.Full:
+                    self.logger.warning('Message queue is full, discarding '
+                                        'log message')
+                    continue
+
+                self.logger.info(f'Sending log message from module '
+                                 f'"{log.get("module")} again in '
+                                 f'{self._retry_delay} seconds ...')
+                # Wait before retrying, unless the module is stopped.
+                self.wait_until(lambda: False, self._retry_delay)
+
+    async def run_async(self) -> None:
+        """Processes the cached alert messages. Coroutine version of `run()`,
+        runs as many senders as set by the concurrency of the module."""
+        await asyncio.gather(*[self._send_logs_async()
+                               for _ in range(self.concurrency)])
+
+    async def _send_logs_async(self) -> None:
+        """Sends the cached alert messages one by one."""
+        loop = asyncio.get_running_loop()
+
+        while self._is_running:
+            self.logger.spam('Waiting for log messages ...')
+
+            if not await self.wait_until_async(lambda: not self._queue.empty()):
+                continue
+
+            try:
+                log = self._queue.get_nowait()
+            except queue.Empty:
+                # Taken by another sender.
+                continue
+
+            # The blocking request is sent from the thread pool.
+            if not await loop.run_in_executor(None, self._transfer_log, log):
+                try:
+                    self._queue.put_nowait(log)
+                except queue.Full:
+                    self.logger.warning('Message queue is full, discarding '
+                                        'log message')
+                    continue
+
+                self.logger.info(f'Sending log message from module '
+                                 f'"{log.get("module")} again in '
+                                 f'{self._retry_delay} seconds ...')
+                await asyncio.sleep(self._retry_delay)
 
     def start(self) -> None:
         if self._is_running:
@@ -479,8 +575,15 @@ class CloudAgent(Prototype):
 
         super().start()
 
-        self._thread = threading.Thread(target=self.run, daemon=True)
-        self._thread.start()
+        # Threads of a previous run that have not finished yet keep sending
+        # log messages.
+        self._threads = [t for t in self._threads if t.is_alive()]
+
+        # Send log messages in parallel, if the module is concurrent.
+        for _ in range(self.concurrency - len(self._threads)):
+            thread = threading.Thread(target=self.run, daemon=True)
+            thread.start()
+            self._threads.append(thread)
 
 
 class Heartbeat(Prototype):
@@ -1226,7 +1329,8 @@ class StatusPublisher(Prototype):
                 'name': module_name,
                 'type': module.worker.type,
                 'status': 'running' if module.worker.is_running else
-                          'stopped'
+                          'stopped',
+                'inbox': module.inbox.stats
             })
 
         return modules
@@ -7,7 +7,6 @@ __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 # Build-in modules.
-import copy
 import errno
 import re
 import socket
@@ -21,6 +20,7 @@ import arrow
 import serial
 
 # OpenADMS Node modules.
+from core.logging import LazyValue
 from core.observation import Observation
 from core.manager import Manager
 from core.system import System
@@ -107,18 +107,17 @@ class BluetoothPort(Prototype):
         request_sets = obs.get('requestSets')
 
         if not requests_order:
-            self.logger.notice(f'No requests order defined in observation '
-                               f'"{obs.get("name")}" of target '
-                               f'"{obs.get("target")}"')
+            self.logger.notice('No requests order defined in observation '
+                               '"{name}" of target "{target}"', obs)
 
         # Send requests sequentially to the sensor.
         for request_name in requests_order:
             request_set = request_sets.get(request_name)
 
             if not request_set:
-                self.logger.error(f'Request set "{request_name}" not found in '
-                                  f'observation "{obs.get("name")}" of target '
-                                  f'"{obs.get("target")}"')
+                self.logger.error('Request set "{request_name}" not found '
+                                  'in observation "{name}" of target '
+                                  '"{target}"', obs, request_name=request_name)
                 return
 
             # The response of the sensor.
@@ -131,20 +130,20 @@ class BluetoothPort(Prototype):
             timeout = request_set.get('timeout') or 1.0
 
             # Send the request of the observation to the attached sensor.
-            self.logger.verbose(f'Sending request "{request_name}" of '
-                                f'observation "{obs.get("name")}" to sensor '
-                                f'"{obs.get("sensorName")}" ...')
+            self.logger.verbose('Sending request "{request_name}" of '
+                                'observation "{name}" to sensor "{sensor}" '
+                                '...', obs, request_name=request_name)
             # Write to Bluetooth port.
             self._send(request)
 
             # Get the response of the sensor.
             response = self._receive(response_delimiter, timeout)
 
-            self.logger.verbose(f'Received response '
-                                f'"{self.sanitize(response)}" for request '
-                                f'"{request_name}" of observation '
-                                f'"{obs.get("name")}" from sensor '
-                                f'"{obs.get("sensorName")}"')
+            self.logger.verbose('Received response "{response}" for request '
+                                '"{request_name}" of observation "{name}" '
+                                'from sensor "{sensor}"', obs,
+                                response=LazyValue(self.sanitize, response),
+                                request_name=request_name)
             # Add the raw response of the sensor to the observation set.
             request_set['response'] = response
 
@@ -248,9 +247,8 @@ class FileSystemPort(Prototype):
         #request_sets = obs.get('requestSets')
 
         if not requests_order:
-            self.logger.notice(f'No requests order defined in observation '
-                               f'"{obs.get("name")}" of target '
-                               f'"{obs.get("target")}"')
+            self.logger.notice('No requests order defined in observation '
+                               '"{name}" of target "{target}"', obs)
 
         # Read files sequentially.
         # for request_name in requests_order:
@@ -394,6 +392,10 @@ class SerialPort(Prototype):
         timeout (float): Timeout in seconds.
     """
 
+    # Maximum number of bytes kept in the receive buffer for an incomplete
+    # response.
+    MAX_BUFFER_SIZE = 65536
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         self._config = self.get_module_config('ports', 'serial', self.name)
@@ -402,6 +404,7 @@ class SerialPort(Prototype):
         # Serial port.
         self._serial = None
         self._serial_port_config = None
+        self._rx_buffer = bytearray()     # Receive buffer.
 
         # Passive mode.
         self._is_passive = False
@@ -486,6 +489,7 @@ class SerialPort(Prototype):
             self._serial.open()
             self._serial.reset_output_buffer()
             self._serial.reset_input_buffer()
+            self._rx_buffer.clear()
 
         # Add the name of this serial port module to the observation.
         obs.set('portName', self._name)
@@ -494,18 +498,17 @@ class SerialPort(Prototype):
         request_sets = obs.get('requestSets')
 
         if not requests_order:
-            self.logger.notice(f'No requests order defined in observation '
-                               f'"{obs.get("name")}" of target '
-                               f'"{obs.get("target")}"')
+            self.logger.notice('No requests order defined in observation '
+                               '"{name}" of target "{target}"', obs)
 
         # Send requests sequentially to the sensor.
         for request_name in requests_order:
             request_set = request_sets.get(request_name)
 
             if not request_set:
-                self.logger.error(f'Request set "{request_name}" not found in '
-                                  f'observation "{obs.get("name")}" of target '
-                                  f'"{obs.get("target")}"')
+                self.logger.error('Request set "{request_name}" not found '
+                                  'in observation "{name}" of target '
+                                  '"{target}"', obs, request_name=request_name)
                 return
 
             # The response of the sensor.
@@ -518,9 +521,9 @@ class SerialPort(Prototype):
             timeout = request_set.get('timeout') or 0.0
 
             # Send the request of the observation to the attached sensor.
-            self.logger.verbose(f'Sending request "{request_name}" of '
-                                f'observation "{obs.get("name")}" to sensor '
-                                f'"{obs.get("sensorName")}" ...')
+            self.logger.verbose('Sending request "{request_name}" of '
+                                'observation "{name}" to sensor "{sensor}" '
+                                '...', obs, request_name=request_name)
 
             for attempt in range(self._max_attempts):
                 if attempt > 0:
@@ -538,20 +541,22 @@ class SerialPort(Prototype):
 
                 self._serial.reset_output_buffer()
                 self._serial.reset_input_buffer()
+                self._rx_buffer.clear()
 
                 if response:
-                    self.logger.verbose(f'Received response '
-                                        f'"{self.sanitize(response)}" for '
-                                        f'request "{request_name}" of '
-                                        f'observation "{obs.get("name")}" from '
-                                        f'sensor "{obs.get("sensorName")}"')
+                    self.logger.verbose('Received response "{response}" for '
+                                        'request "{request_name}" of '
+                                        'observation "{name}" from sensor '
+                                        '"{sensor}"', obs,
+                                        response=LazyValue(self.sanitize,
+                                                           response),
+                                        request_name=request_name)
                     break
 
                 # Try next attempt if response is empty.
-                self.logger.warning(f'No response from sensor '
-                                    f'"{obs.get("sensorName")}" for '
-                                    f'observation "{obs.get("name")}" of '
-                                    f'target "{obs.get("target")}"')
+                self.logger.warning('No response from sensor "{sensor}" for '
+                                    'observation "{name}" of target '
+                                    '"{target}"', obs)
 
             # Add the raw response of the sensor to the observation set.
             request_set['response'] = response
@@ -607,8 +612,9 @@ class SerialPort(Prototype):
                                  f'passive listening ...')
                 self._serial.open()
                 self._serial.reset_input_buffer()
+                self._rx_buffer.clear()
 
-            obs = copy.deepcopy(obs_draft)
+            obs = obs_draft.clone()
             obs.set('id', Observation.get_new_id())
             obs.set('portName', self.name)
 
@@ -624,12 +630,15 @@ class SerialPort(Prototype):
 
             response = self._read(eol=response_delimiter,
                                   length=length,
-                                  timeout=timeout)
+                                  timeout=timeout,
+                                  keep_partial=True)
 
             if response:
-                self.logger.verbose(f'Received "{self.sanitize(response)}" '
-                                    f'from sensor "{obs.get("sensorName")}" on '
-                                    f'port "{self._name}"')
+                self.logger.verbose('Received "{response}" from sensor '
+                                    '"{sensor}" on port "{port}"', obs,
+                                    response=LazyValue(self.sanitize,
+                                                       response),
+                                    port=self._name)
                 draft['response'] = response
                 obs.set('timestamp', str(arrow.utcnow()))
                 self.publish_observation(obs)
@@ -637,43 +646,69 @@ class SerialPort(Prototype):
     def _read(self,
               eol: str = None,
               length: int = 0,
-              timeout: float = 10.0) -> str:
-        """Reads from serial port."""
-        response = ''
+              timeout: float = 10.0,
+              keep_partial: bool = False) -> str:
+        """Reads from serial port until the delimiter occurs, the maximum
+        length of the response is reached, or the timeout has passed. All
+        bytes waiting on the port are read at once into a receive buffer.
+        Bytes following the response are kept in the buffer for the next
+        call.
+
+        Args:
+            eol: The response delimiter.
+            length: The maximum length of the response in bytes.
+            timeout: The timeout in seconds.
+            keep_partial: If True, an incomplete response is kept in the
+                buffer on timeout instead of being returned.
+
+        Returns:
+            The decoded response.
+        """
+        buffer = self._rx_buffer
+        delimiter = eol.encode() if eol else b''
         start_time = time.time()
-        c = 0                       # Character index.
+        offset = 0                  # Offset to search the delimiter from.
+        end = 0                     # Length of the response in the buffer.
 
-        # Read from serial port until delimiter occurs or maximum length of
-        # response is reached.
         while True:
-            try:
-                rxd = self._serial.read(1).decode()
-                response += rxd
+            if delimiter:
+                i = buffer.find(delimiter, offset)
 
-                if length and length > 0:
-                    c += 1
+                if i >= 0:
+                    end = i + len(delimiter)
 
-                    if c == length:
-                        break
+                # The delimiter may be split across two reads.
+                offset = max(len(buffer) - len(delimiter) + 1, 0)
 
-                if eol:
-                    # Did we get an end of line (e.g., '\r' or '\n')?
-                    i = len(eol)
+            if length and length > 0 and len(buffer) >= length:
+                end = min(end, length) if end else length
 
-                    if len(response) >= len(eol) and response[-i:] == eol:
-                        break
-            except UnicodeDecodeError:
-                self.logger.error(f'No sensor on port '
-                                  f'"{self._serial_port_config.port}"')
+            if end:
                 break
 
             if time.time() - start_time > timeout:
                 self.logger.warning(f'Timeout on port '
                                     f'"{self._serial_port_config.port}" after '
                                     f'{timeout} s')
+
+                if keep_partial and len(buffer) < self.MAX_BUFFER_SIZE:
+                    return ''
+
+                end = len(buffer)
                 break
 
-        return response
+            # Read all waiting bytes, or block until the next one arrives.
+            buffer += self._serial.read(self._serial.in_waiting or 1)
+
+        frame = bytes(buffer[:end])
+        del buffer[:end]
+
+        try:
+            return frame.decode()
+        except UnicodeDecodeError:
+            self.logger.error(f'No sensor on port '
+                              f'"{self._serial_port_config.port}"')
+            return ''
 
     def sanitize(self, s: str) -> str:
         """Escapes some non-printable characters in a given string."""
@@ -7,10 +7,17 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
+import logging
 import re
 
-from typing import Union
+from typing import Any, Callable, Dict, List, Pattern, Tuple, Union
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from core.logging import LazyValue
 from core.observation import Observation
 from core.manager import Manager
 from core.prototype import Prototype
@@ -21,12 +28,131 @@ class PreProcessor(Prototype):
     PreProcessor extracts values from the raw responses of a given observation
     and converts them to the defined data types.
 
+    The regular expressions of the response patterns are compiled only once
+    and cached by pattern string. For each request set of an observation, the
+    converters of the named groups are stored as well. The cache is filled
+    with the observations of all sensors on start.
+
+    Slim observations are completed with the data of their templates in the
+    sensor configuration first.
+
     This module has nothing to configure.
     """
 
+    is_process_safe = True
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
 
+        # Compiled regular expressions by pattern string.
+        self._patterns = {}
+
+        # Compiled pattern and converters of the named groups, by sensor name,
+        # observation name, request set name, and pattern string.
+        self._parsers = {}
+
+        if self._sensor_manager:
+            for sensor in self._sensor_manager.sensors.values():
+                for obs in sensor.get_observations().values():
+                    self.prepare(obs)
+
+    def get_converter(self, response_type: str) -> Callable[[str], Any]:
+        """Returns the function to convert a raw value to the given response
+        type.
+
+        Args:
+            response_type: The response type (`float`, `integer`, or else).
+
+        Returns:
+            The converter function.
+        """
+        response_type = (response_type or '').lower()
+
+        if response_type == 'float':
+            # Convert raw value to float. Replace comma by dot.
+            return self.to_float
+
+        if response_type == 'integer':
+            # Convert raw value to int.
+            return self.to_int
+
+        return str
+
+    def get_parser(self,
+                   obs: Observation,
+                   set_name: str,
+                   response_pattern: str) -> Tuple[Pattern,
+                                                   Dict[str, Tuple]]:
+        """Returns the compiled response pattern and the converters of the
+        named groups of a request set. Both are cached on first use, usually
+        from the observation templates of the sensor configuration.
+
+        Args:
+            obs: The observation object.
+            set_name: The name of the request set.
+            response_pattern: The response pattern of the request set.
+
+        Returns:
+            Compiled pattern and the response type and converter by group
+            name. Type and converter are None if the response set of the
+            group is undefined.
+
+        Raises:
+            re.error: If the response pattern is invalid.
+        """
+        key = (obs.get('sensorName'), obs.get('name'), set_name,
+               response_pattern)
+        parser = self._parsers.get(key)
+
+        if parser:
+            return parser
+
+        pattern = self._patterns.get(response_pattern)
+
+        if not pattern:
+            pattern = re.compile(response_pattern)
+            self._patterns[response_pattern] = pattern
+
+        response_sets = obs.get('responseSets') or {}
+        converters = {}
+
+        for group_name in pattern.groupindex:
+            response_set = response_sets.get(group_name)
+
+            if response_set:
+                response_type = response_set.get('type')
+                converters[group_name] = (response_type,
+                                          self.get_converter(response_type))
+            else:
+                converters[group_name] = (None, None)
+
+        parser = (pattern, converters)
+        self._parsers[key] = parser
+
+        return parser
+
+    def prepare(self, obs: Observation) -> None:
+        """Compiles the response patterns of all request sets of an
+        observation in advance.
+
+        Args:
+            obs: The observation object.
+        """
+        for set_name, request_set in (obs.get('requestSets') or {}).items():
+            response_pattern = request_set.get('responsePattern')
+
+            if response_pattern is None:
+                continue
+
+            try:
+                self.get_parser(obs, set_name, response_pattern)
+            except Exception:
+                self.logger.warning('Invalid regular expression for '
+                                    'response "{set_name}" in observation '
+                                    '"{name}" of sensor "{sensor}"', obs,
+                                    set_name=set_name)
+
     def process_observation(self, obs: Observation) -> Observation:
         """Extracts the values from the raw responses of the observation
         using regular expressions.
@@ -37,12 +163,24 @@ class PreProcessor(Prototype):
         Returns:
             The observation object with extracted and converted responses.
         """
+        # Response patterns of slim observations are taken from the sensor
+        # configuration.
+        if obs.is_slim and not (self._sensor_manager and
+                                self._sensor_manager.rehydrate(obs)):
+            self.logger.error('Response patterns of observation "{name}" of '
+                              'target "{target}" are not available', obs)
+            return obs
+
+        is_debug = self.logger.isEnabledFor(logging.DEBUG)
+        requests_order = obs.get('requestsOrder')
+        response_sets = obs.get('responseSets') or {}
+
         for set_name, request_set in obs.get('requestSets').items():
             if not request_set.get('enabled'):
                 # Request is disabled.
                 continue
 
-            if set_name not in obs.get('requestsOrder'):
+            if set_name not in requests_order:
                 # Request should be ignored.
                 continue
 
@@ -50,33 +188,32 @@ class PreProcessor(Prototype):
             response_pattern = request_set.get('responsePattern')
 
             if response is None or len(response) == 0:
-                self.logger.warning(f'No response "{set_name}" in observation '
-                                    f'"{obs.get("name")}" of target '
-                                    f'"{obs.get("target")}" from sensor '
-                                    f'"{obs.get("sensorName")}" on port '
-                                    f'"{obs.get("portName")}"')
+                self.logger.warning('No response "{set_name}" in '
+                                    'observation "{name}" of target '
+                                    '"{target}" from sensor "{sensor}" on '
+                                    'port "{port}"', obs, set_name=set_name)
                 continue
 
             try:
-                pattern = re.compile(response_pattern)
+                pattern, converters = self.get_parser(obs,
+                                                      set_name,
+                                                      response_pattern)
                 match = pattern.search(response)
             except Exception:
-                self.logger.error(f'Invalid regular expression for response '
-                                  f'"{set_name}" in observation '
-                                  f'"{obs.get("name")}" of target '
-                                  f'"{obs.get("target")}" from sensor '
-                                  f'"{obs.get("sensorName")}" on port '
-                                  f'"{obs.get("portName")}"')
+                self.logger.error('Invalid regular expression for response '
+                                  '"{set_name}" in observation "{name}" of '
+                                  'target "{target}" from sensor "{sensor}" '
+                                  'on port "{port}"', obs, set_name=set_name)
                 return obs
 
             if not match:
-                self.logger.error(f'Response "{self.sanitize(response)}" of '
-                                  f'request "{set_name}" in observation '
-                                  f'"{obs.get("name")}" of target '
-                                  f'"{obs.get("target")}" from sensor '
-                                  f'"{obs.get("sensorName")}" on port '
-                                  f'"{obs.get("portName")}" does not match '
-                                  f'extraction pattern')
+                self.logger.error('Response "{response}" of request '
+                                  '"{set_name}" in observation "{name}" of '
+                                  'target "{target}" from sensor "{sensor}" '
+                                  'on port "{port}" does not match '
+                                  'extraction pattern', obs,
+                                  response=LazyValue(self.sanitize, response),
+                                  set_name=set_name)
                 return obs
 
             # The regular expression pattern needs at least one named group
@@ -85,47 +222,48 @@ class PreProcessor(Prototype):
             # Right: "(?P<id>.*)"
             # Wrong: ".*"
             if pattern.groups == 0:
-                self.logger.error(f'No group(s) defined in regular expression '
-                                  f'pattern in observation "{obs.get("name")}" '
-                                  f'of target "{obs.get("target")}"')
+                self.logger.error('No group(s) defined in regular '
+                                  'expression pattern in observation '
+                                  '"{name}" of target "{target}"', obs)
                 return obs
 
             # Convert the type of the parsed raw values from string to the
             # actual data type (float, int).
-            response_sets = obs.get('responseSets')
-
-            for group_name, raw_value in match.groupdict("").items():
-                if raw_value is None or len(raw_value) == 0:
-                    self.logger.error(f'Undefined raw value in response set '
-                                      f'"{group_name}" in observation '
-                                      f'"{obs.get("name")}" of target '
-                                      f'"{ obs.get("target")}"')
+            for group_name, (response_type, convert) in converters.items():
+                raw_value = match.group(group_name)
+
+                if not raw_value:
+                    self.logger.error('Undefined raw value in response set '
+                                      '"{group_name}" in observation '
+                                      '"{name}" of target "{target}"', obs,
+                                      group_name=group_name)
                     continue
 
                 response_set = response_sets.get(group_name)
 
                 if not response_set:
-                    self.logger.error(f'Undefined response set "{group_name}" '
-                                      f'in observation "{obs.get("name")}" '
-                                      f'of target "{obs.get("target")}"')
+                    self.logger.error('Undefined response set '
+                                      '"{group_name}" in observation '
+                                      '"{name}" of target "{target}"', obs,
+                                      group_name=group_name)
                     continue
 
-                response_type = response_set.get('type').lower()
+                # The response set of the observation may differ from the
+                # cached template.
+                if response_set.get('type') != response_type:
+                    convert = self.get_converter(response_set.get('type'))
 
-                if response_type == 'float':
-                    # Convert raw value to float. Replace comma by dot.
-                    response_value = self.to_float(raw_value)
-                elif response_type == 'integer':
-                    # Convert raw value to int.
-                    response_value = self.to_int(raw_value)
-                else:
-                    response_value = raw_value
+                response_value = convert(raw_value)
 
                 if response_value is not None:
-                    self.logger.debug(f'Extracted "{response_value}" from raw '
-                                      f'response "{group_name}" in observation '
-                                      f'"{ obs.get("name")}" of target '
-                                      f'"{obs.get("target")}"')
+                    if is_debug:
+                        self.logger.debug('Extracted "{response_value}" '
+                                          'from raw response "{group_name}" '
+                                          'in observation "{name}" of '
+                                          'target "{target}"', obs,
+                                          response_value=response_value,
+                                          group_name=group_name)
+
                     response_set['value'] = response_value
 
         return obs
@@ -182,12 +320,9 @@ class PreProcessor(Prototype):
         Returns:
             Float number if string can be converted, otherwise None.
         """
-        dot_value = raw_value.replace(',', '.')
-
-        if self.is_float(dot_value):
-            response_value = float(dot_value)
-            return response_value
-        else:
+        try:
+            return float(raw_value.replace(',', '.'))
+        except ValueError:
             self.logger.warning(f'Value "{raw_value}" could not be converted '
                                 f'(invalid float)')
             return None
@@ -201,10 +336,9 @@ class PreProcessor(Prototype):
         Returns:
             Integer number if string can be converted, otherwise None.
         """
-        if self.is_int(raw_value):
-            response_value = int(raw_value)
-            return response_value
-        else:
+        try:
+            return int(raw_value)
+        except ValueError:
             self.logger.warning(f'Value "{raw_value}" could not be converted '
                                 f'(invalid integer)')
             return None
@@ -235,6 +369,8 @@ class ResponseValueInspector(Prototype):
             }
     """
 
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         config = self.get_module_config(self._name)
@@ -250,8 +386,8 @@ class ResponseValueInspector(Prototype):
             The untouched observation object.
         """
         if not obs.get('name') in self._observations:
-            self.logger.warning(f'Undefined observation "{obs.get("name")}" '
-                                f'of target "{obs.get("target")}"')
+            self.logger.warning('Undefined observation "{name}" of target '
+                                '"{target}"', obs)
             return obs
 
         response_sets = self._observations.get(obs.get('name'))
@@ -260,34 +396,133 @@ class ResponseValueInspector(Prototype):
             response_value = obs.get_response_value(response_name)
 
             if response_value is None or not self.is_number(response_value):
-                self.logger.warning(f'Response value "{response_name}" in '
-                                    f'observation "{obs.get("name")}" of '
-                                    f'target "{obs.get("target")}" is not a '
-                                    f'number')
+                self.logger.warning('Response value "{response_name}" in '
+                                    'observation "{name}" of target '
+                                    '"{target}" is not a number', obs,
+                                    response_name=response_name)
                 continue
 
             min_value = limits.get('min')
             max_value = limits.get('max')
 
             if min_value <= response_value <= max_value:
-                self.logger.debug(f'Response value "{response_name}" in '
-                                  f'observation "{obs.get("name")}" of target '
-                                  f'"{obs.get("target")}" is within limits')
+                self.logger.debug('Response value "{response_name}" in '
+                                  'observation "{name}" of target '
+                                  '"{target}" is within limits', obs,
+                                  response_name=response_name)
             elif response_value < min_value:
-                self.logger.critical(f'Response value "{response_name}" in '
-                                     f'observation "{obs.get("name")}" of '
-                                     f'target "{obs.get("target")}" is less '
-                                     f'than minimum ({response_value} < '
-                                     f'{min_value})')
+                self.logger.critical('Response value "{response_name}" in '
+                                     'observation "{name}" of target '
+                                     '"{target}" is less than minimum '
+                                     '({response_value} < {min_value})', obs,
+                                     response_name=response_name,
+                                     response_value=response_value,
+                                     min_value=min_value)
             elif response_value > max_value:
-                self.logger.critical(f'Response value "{response_name}" in '
-                                     f'observation "{obs.get("name")}" of '
-                                     f'target "{obs.get("target")}" is greater '
-                                     f'than maximum ({response_value} > '
-                                     f'{max_value})')
+                self.logger.critical('Response value "{response_name}" in '
+                                     'observation "{name}" of target '
+                                     '"{target}" is greater than maximum '
+                                     '({response_value} > {max_value})', obs,
+                                     response_name=response_name,
+                                     response_value=response_value,
+                                     max_value=max_value)
 
         return obs
 
+    def process_batch(self,
+                      observations: List[Observation]) -> List[Observation]:
+        """Checks, if responses of multiple observations are inside defined
+        bounds. The limits are checked with NumPy, if installed.
+
+        Args:
+            observations: The observation objects.
+
+        Returns:
+            The untouched observation objects.
+        """
+        if not np:
+            return super().process_batch(observations)
+
+        # Group the observations by name.
+        groups = {}
+
+        for obs in observations:
+            if not obs.get('name') in self._observations:
+                self.logger.warning('Undefined observation "{name}" of '
+                                    'target "{target}"', obs)
+                continue
+
+            groups.setdefault(obs.get('name'), []).append(obs)
+
+        for obs_name, group in groups.items():
+            response_sets = self._observations.get(obs_name)
+
+            for response_name, limits in response_sets.items():
+                checked = []
+                values = []
+
+                for obs in group:
+                    response_value = obs.get_response_value(response_name)
+
+                    if (response_value is None or
+                            not self.is_number(response_value)):
+                        self.logger.warning('Response value '
+                                            '"{response_name}" in '
+                                            'observation "{name}" of '
+                                            'target "{target}" is not a '
+                                            'number', obs,
+                                            response_name=response_name)
+                        continue
+
+                    checked.append(obs)
+                    values.append(response_value)
+
+                if not values:
+                    continue
+
+                min_value = limits.get('min')
+                max_value = limits.get('max')
+
+                array = np.asarray(values, dtype=float)
+                is_below = array < min_value
+                is_above = array > max_value
+
+                self.logger.debug('{count} of {total} response value(s) '
+                                  '"{response_name}" in observation '
+                                  '"{obs_name}" are within limits',
+                                  count=LazyValue(lambda: np.count_nonzero(
+                                      ~(is_below | is_above))),
+                                  total=len(values),
+                                  response_name=response_name,
+                                  obs_name=obs_name)
+
+                # Log the original values, not the NumPy floats.
+                for i in np.flatnonzero(is_below | is_above).tolist():
+                    obs = checked[i]
+
+                    if is_below[i]:
+                        self.logger.critical('Response value '
+                                             '"{response_name}" in '
+                                             'observation "{name}" of '
+                                             'target "{target}" is less '
+                                             'than minimum ({value} < '
+                                             '{min_value})', obs,
+                                             response_name=response_name,
+                                             value=values[i],
+                                             min_value=min_value)
+                    else:
+                        self.logger.critical('Response value '
+                                             '"{response_name}" in '
+                                             'observation "{name}" of '
+                                             'target "{target}" is greater '
+                                             'than maximum ({value} > '
+                                             '{max_value})', obs,
+                                             response_name=response_name,
+                                             value=values[i],
+                                             max_value=max_value)
+
+        return observations
+
     def is_number(self, value: str) -> bool:
         """Returns whether a value is a number or not.
 
@@ -366,6 +601,8 @@ class ReturnCodeInspector(Prototype):
         retries (int): Number of retries in case of an error.
     """
 
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         config = self.get_module_config(self._name)
@@ -397,11 +634,14 @@ class ReturnCodeInspector(Prototype):
                 obs.set('corrupted', False)
                 obs.set('nextReceiver', 0)
 
-                self.logger.info(f'Retrying observation "{obs.get("name")}" of '
-                                 f'target "{obs.get("target")}" due to return '
-                                 f'code {return_code} of response '
-                                 f'"{response_set}" (attempt {attempts + 1} '
-                                 f'of {self._retries})')
+                self.logger.info('Retrying observation "{name}" of target '
+                                 '"{target}" due to return code '
+                                 '{return_code} of response "{response_set}" '
+                                 '(attempt {attempt} of {retries})', obs,
+                                 return_code=return_code,
+                                 response_set=response_set,
+                                 attempt=attempts + 1,
+                                 retries=self._retries)
             else:
                 obs.set('corrupted', True)
 
@@ -417,10 +657,11 @@ class ReturnCodeInspector(Prototype):
 
                 else:
                     # Generic log message.
-                    self.logger.error(f'Error occurred on observation '
-                                      f'"{obs.get("name")}" (unknown code '
-                                      f'{return_code} in response '
-                                      f'"{response_set}")')
+                    self.logger.error('Error occurred on observation '
+                                      '"{name}" (unknown code {return_code} '
+                                      'in response "{response_set}")', obs,
+                                      return_code=return_code,
+                                      response_set=response_set)
             return obs
 
         return obs
@@ -450,9 +691,12 @@ class UnitConverter(Prototype):
             }
     """
 
+    is_process_safe = True
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
-        self._config = self._config_manager.get(self._name)
+        self._config = self.get_module_config(self._name)
 
     def process_observation(self, obs: Observation) -> Observation:
         for name, properties in self._config.items():
@@ -468,11 +712,12 @@ class UnitConverter(Prototype):
                 continue
 
             if source_unit != properties.get('sourceUnit'):
-                self.logger.warning(f'Unit "{source_unit}" of response '
-                                    f'"{name}" in observation '
-                                    f'"{obs.get("name")}" of target '
-                                    f'"{obs.get("target")}" does not match '
-                                    f'"{properties.get("sourceUnit")}"')
+                self.logger.warning('Unit "{source_unit}" of response '
+                                    '"{response}" in observation "{name}" '
+                                    'of target "{target}" does not match '
+                                    '"{unit}"', obs, source_unit=source_unit,
+                                    response=name,
+                                    unit=properties.get('sourceUnit'))
                 continue
 
             if properties.get('conversionType') == 'scale':
@@ -480,15 +725,15 @@ class UnitConverter(Prototype):
                                           properties.get('scalingValue'))
                 target_unit = properties.get('targetUnit')
 
-                self.logger.info('Converted response "{}" in observation "{}" '
-                                 'of target "{}" from {:.4f} {} to {:.4f} {}'
-                                 .format(name,
-                                         obs.get("name"),
-                                         obs.get("target"),
-                                         source_value,
-                                         source_unit,
-                                         target_value,
-                                         target_unit))
+                self.logger.info('Converted response "{response}" in '
+                                 'observation "{name}" of target "{target}" '
+                                 'from {source_value:.4f} {source_unit} to '
+                                 '{target_value:.4f} {target_unit}', obs,
+                                 response=name,
+                                 source_value=source_value,
+                                 source_unit=source_unit,
+                                 target_value=target_value,
+                                 target_unit=target_unit)
 
                 response_set = Observation.create_response_set(
                     'float',
@@ -499,6 +744,71 @@ class UnitConverter(Prototype):
 
         return obs
 
+    def process_batch(self,
+                      observations: List[Observation]) -> List[Observation]:
+        """Converts the response values of multiple observations at once. The
+        values are scaled with NumPy, if installed.
+
+        Args:
+            observations: The observation objects.
+
+        Returns:
+            The observation objects with converted response values.
+        """
+        if not np:
+            return super().process_batch(observations)
+
+        for name, properties in self._config.items():
+            if properties.get('conversionType') != 'scale':
+                continue
+
+            source_unit = properties.get('sourceUnit')
+            target_unit = properties.get('targetUnit')
+            converted = []
+            values = []
+
+            for obs in observations:
+                response_set = obs.get('responseSets').get(name)
+
+                if not response_set:
+                    continue
+
+                source_value = response_set.get('value')
+                unit = response_set.get('unit')
+
+                if not source_value or not unit:
+                    continue
+
+                if unit != source_unit:
+                    self.logger.warning('Unit "{unit}" of response '
+                                        '"{response}" in observation '
+                                        '"{name}" of target "{target}" does '
+                                        'not match "{source_unit}"', obs,
+                                        unit=unit, response=name,
+                                        source_unit=source_unit)
+                    continue
+
+                converted.append(obs)
+                values.append(float(source_value))
+
+            if not values:
+                continue
+
+            target_values = self.scale(np.asarray(values),
+                                       properties.get('scalingValue'))
+
+            for obs, target_value in zip(converted, target_values.tolist()):
+                obs.data['responseSets'][name] = \
+                    Observation.create_response_set('float',
+                                                    target_unit,
+                                                    round(target_value, 5))
+
+            self.logger.info(f'Converted response "{name}" of '
+                             f'{len(converted)} observation(s) from '
+                             f'{source_unit} to {target_unit}')
+
+        return observations
+
     def scale(self, value: float, factor: float) -> float:
         """Scales value by factor.
 
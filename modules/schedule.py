@@ -6,12 +6,16 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
-import copy
+import asyncio
+import heapq
+import itertools
 import logging
 import threading
 import time
 
-from typing import Any, Callable, Dict, List
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import arrow
 
@@ -23,7 +27,8 @@ from core.prototype import Prototype
 class Job:
     """
     Job stores an observation object and sends it to a callback function if the
-    current date and time are within the set schedule.
+    current date and time are within the set schedule. The schedule is parsed
+    once, so that the next run time of the job can be calculated cheaply.
 
     Args:
         name: Name of the job.
@@ -38,6 +43,10 @@ class Job:
         uplink: Callback function to send the observation to.
     """
 
+    # Names of the weekdays, in the order of `datetime.weekday()`.
+    WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday',
+                'saturday', 'sunday']
+
     def __init__(self,
                  name: str,
                  port_name: str,
@@ -63,11 +72,88 @@ class Job:
         self._start_date = arrow.get(start_date, self._date_fmt)
         self._end_date = arrow.get(end_date, self._date_fmt)
 
+        # Start and end of the job as Unix timestamps.
+        self._start_ts = self._start_date.float_timestamp
+        self._end_ts = self._end_date.float_timestamp
+
+        # Time ranges by index of the weekday (0 is Monday). An empty list
+        # means all day long. Days not in the dict are skipped.
+        self._periods = self._parse_weekdays(weekdays or {})
+
+    def _parse_weekdays(self,
+                        weekdays: Dict[str, List]) -> Dict[int, List[Tuple]]:
+        """Parses the start and end times of the time sheet.
+
+        Args:
+            weekdays: Dict of days and times.
+
+        Returns:
+            Sorted start and end times by index of the weekday.
+        """
+        periods = {}
+
+        for day, day_periods in weekdays.items():
+            if day not in self.WEEKDAYS:
+                self.logger.warning(f'Invalid weekday "{day}" in schedule of '
+                                    f'job "{self._name}"')
+                continue
+
+            periods[self.WEEKDAYS.index(day)] = sorted(
+                (arrow.get(period.get('startTime'), self._time_fmt).time(),
+                 arrow.get(period.get('endTime'), self._time_fmt).time())
+                for period in day_periods)
+
+        return periods
+
+    def get_next_run_time(self, after: float) -> Optional[float]:
+        """Returns the earliest point in time at or after the given Unix
+        timestamp the job is pending at.
+
+        Args:
+            after: Unix timestamp to start the search at.
+
+        Returns:
+            Unix timestamp of the next run, or None if the job will never be
+            pending again.
+        """
+        if not self._is_enabled or not self._obs.get('enabled'):
+            return None
+
+        after = max(after, self._start_ts)
+
+        if after >= self._end_ts:
+            return None
+
+        # No days defined, job is pending all the time.
+        if len(self._periods) == 0:
+            return after
+
+        date = datetime.fromtimestamp(after).date()
+
+        # Search the time sheet of the next seven days (and today).
+        for i in range(8):
+            day = date + timedelta(days=i)
+            periods = self._periods.get(day.weekday())
+
+            if periods is None:
+                continue
+
+            # Job has to be executed all day long.
+            if len(periods) == 0:
+                t = max(after, datetime.combine(day, dt_time()).timestamp())
+                return t if t < self._end_ts else None
+
+            for start_time, end_time in periods:
+                if after < datetime.combine(day, end_time).timestamp():
+                    t = datetime.combine(day, start_time).timestamp()
+                    t = max(after, t)
+                    return t if t < self._end_ts else None
+
+        return None
+
     def has_expired(self) -> bool:
         """Checks whether or not the job has expired."""
-        now = arrow.now()
-
-        if now > self._end_date:
+        if time.time() > self._end_ts:
             self.logger.debug(f'Job "{self._name}" has expired')
             return True
 
@@ -76,48 +162,13 @@ class Job:
     def is_pending(self) -> bool:
         """Checks whether or not the job is within the current time frame and
         ready for processing."""
-        if not self._is_enabled:
-            return False
-
-        now = arrow.now()
-
-        # Are we within the date range of the job?
-        if self._start_date <= now < self._end_date:
-            # No days defined, go on.
-            if len(self._weekdays) == 0:
-                return True
-
-            # Name of the current day (e.g., "monday").
-            current_day = arrow.now().format('dddd').lower()
-
-            # Ignore current day if it is not listed in the schedule.
-            if current_day in self._weekdays:
-                # Time ranges of the current day.
-                periods = self._weekdays.get(current_day)
-
-                # No given time range means the job should be executed
-                # all day long.
-                if len(periods) == 0:
-                    return True
-
-                # Check all time ranges of the current day.
-                if len(periods) > 0:
-                    for period in periods:
-                        # Start and end time of the current day.
-                        start_time = arrow.get(period.get('startTime'),
-                                               self._time_fmt).time()
-                        end_time = arrow.get(period.get('endTime'),
-                                             self._time_fmt).time()
-
-                        # Are we within the time range of the current day?
-                        if start_time <= now.time() < end_time:
-                            return True
-
-        return False
+        now = time.time()
+        return self.get_next_run_time(now) == now
 
     def run(self) -> None:
         """Iterates trough the observation set and sends observations to an
-        external callback function."""
+        external callback function. The caller has to wait for the sleep time
+        of the observation before the next job is run."""
         # Return if observation is disabled.
         if not self._obs.get('enabled'):
             return
@@ -126,17 +177,17 @@ class Job:
         if self._obs.get('onetime'):
             self._obs.set('enabled', False)
 
-        # Make a deep copy, since we don't want to do any changes to the
+        # Make a copy, since we don't want to do any changes to the
         # observation in our observation set.
-        obs_copy = copy.deepcopy(self._obs)
+        obs_copy = self._obs.clone()
 
         # Set the ID of the observation.
         obs_copy.set('id', Observation.get_new_id())
 
         # Insert the name of the port module or the virtual sensor at the
-        # beginning of the receivers list.
-        receivers = obs_copy.get('receivers')
-        receivers.insert(0, self._port_name)
+        # beginning of the receivers list. The list is shared with the
+        # original observation and must not be altered in place.
+        receivers = [self._port_name] + obs_copy.get('receivers')
         obs_copy.set('receivers', receivers)
 
         # Set the next receiver to the module following the port.
@@ -145,9 +196,6 @@ class Job:
         self.logger.info(f'Starting job "{self._obs.get("name")}" for port '
                          f'"{self._port_name}" ...')
 
-        # Get the sleep time of the whole observation.
-        sleep_time = obs_copy.get('sleepTime', 0)
-
         # Create target, header, and payload in order to send the observation.
         target = self._port_name
         header = Observation.get_header()
@@ -157,25 +205,109 @@ class Job:
         # Fire and forget the observation.
         self._uplink(target, header, payload)
 
-        # Sleep until the next observation.
-        self.logger.debug(f'Next observation starts in {sleep_time} s')
-        time.sleep(sleep_time)
-
     @property
-    def is_enabled(self):
+    def is_enabled(self) -> bool:
         return self._is_enabled
 
     @property
-    def name(self):
+    def name(self) -> str:
         return self._name
 
+    @property
+    def port_name(self) -> str:
+        return self._port_name
+
+    @property
+    def sleep_time(self) -> float:
+        return self._obs.get('sleepTime', 0)
+
+
+class JobLane:
+    """
+    JobLane is a serialised execution lane for all jobs of a single port. The
+    jobs are kept in a queue ordered by their next run time. Lanes of different
+    ports are independent of each other.
+
+    Args:
+        name: Name of the port.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._queue = []                    # Heap of next run times and jobs.
+        self._counter = itertools.count()   # Keeps the order of equal times.
+        self._thread = None
+
+        # Point in time the next job may start at, depending on the sleep time
+        # of the last observation.
+        self.next_slot = 0.0
+
+        # Offset between system and monotonic clock at the last scheduling.
+        self.clock_offset = 0.0
+
+    def clear(self) -> None:
+        """Removes all jobs from the queue."""
+        self._queue = []
+
+    def peek(self) -> Tuple[float, Job]:
+        """Returns the next run time and the job at the top of the queue.
+
+        Returns:
+            Unix timestamp of the next run and the job.
+        """
+        run_time, _, job = self._queue[0]
+        return run_time, job
+
+    def pop(self) -> Job:
+        """Removes the job at the top of the queue.
+
+        Returns:
+            The job.
+        """
+        return heapq.heappop(self._queue)[2]
+
+    def push(self, job: Job, run_time: float) -> None:
+        """Puts a job into the queue.
+
+        Args:
+            job: The job.
+            run_time: Unix timestamp of the next run of the job.
+        """
+        heapq.heappush(self._queue, (run_time, next(self._counter), job))
+
+    @property
+    def is_empty(self) -> bool:
+        return len(self._queue) == 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def thread(self) -> threading.Thread:
+        return self._thread
+
+    @thread.setter
+    def thread(self, thread: threading.Thread) -> None:
+        self._thread = thread
+
 
 class Scheduler(Prototype):
     """
     Scheduler is used to manage the monitoring process by sending observations
     to a sensor. Each observation is represented by a single job. Jobs are
-    stored in a jobs list and will be executed at the given date and time. A
-    separate scheduler is necessary for each serial port.
+    stored in a jobs list and will be executed at the given date and time.
+
+    The jobs of each port are run in a separate lane. Inside a lane, the jobs
+    are kept in a queue ordered by their next run time, and the lane sleeps
+    until the first job is due. After a job has been run, the next job of the
+    same port starts after the sleep time of the observation at the earliest,
+    but not before `MIN_SLEEP_TIME`.
+    Lanes of different ports run in parallel, either in threads of their own,
+    or as coroutines within the asyncio runtime.
+
+    By default, all schedules use the port and the sensor of the scheduler.
+    Both can be overridden for single schedules.
 
     The JSON-based configuration for this module:
 
@@ -185,6 +317,16 @@ class Scheduler(Prototype):
         schedules (List[Dict]): List of schedules.
     """
 
+    # Maximum time to wait in one go, in seconds. Changes of the system clock
+    # are detected after this period at the latest.
+    MAX_WAIT_TIME = 60.0
+
+    # Minimum time between the starts of two jobs of a lane, in seconds.
+    # Observations without sleep time would be sent back-to-back otherwise.
+    MIN_SLEEP_TIME = 0.1
+
+    is_async = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         self._config = self.get_module_config('schedulers', self._name)
@@ -195,6 +337,148 @@ class Scheduler(Prototype):
 
         self._thread = None
         self._jobs = []
+        self._jobs_lock = threading.Lock()
+        self._lanes = {}                    # Job lanes by port name.
+
+    def _remove(self, job: Job) -> None:
+        """Removes a job that will never be pending again from the jobs list.
+
+        Args:
+            job: The job.
+        """
+        with self._jobs_lock:
+            if job in self._jobs:
+                self._jobs.remove(job)
+
+        self.logger.debug(f'Deleted job "{job.name}" without further runs')
+
+    def _run_lane(self, lane: JobLane) -> None:
+        """Threaded method to process the jobs queue of a single lane.
+
+        Args:
+            lane: The job lane.
+        """
+        self._schedule_lane(lane, time.time())
+
+        while self.is_running:
+            timeout = self._step_lane(lane)
+
+            if timeout != 0.0:
+                self.wait_until(lambda: False, timeout)
+
+    async def _run_lane_async(self, lane: JobLane) -> None:
+        """Coroutine to process the jobs queue of a single lane.
+
+        Args:
+            lane: The job lane.
+        """
+        self._schedule_lane(lane, time.time())
+
+        while self.is_running:
+            timeout = self._step_lane(lane)
+
+            if timeout == 0.0:
+                # Let other coroutines run in between due jobs.
+                await asyncio.sleep(0)
+            else:
+                await self.wait_until_async(lambda: False, timeout)
+
+    def _step_lane(self, lane: JobLane) -> Optional[float]:
+        """Runs the first job in the queue of a lane, if it is due.
+
+        Args:
+            lane: The job lane.
+
+        Returns:
+            Time in seconds to wait before the next step, or None if no jobs
+            are left.
+        """
+        now = time.time()
+
+        # Re-calculate all run times if the system clock has been changed
+        # (for instance, by NTP).
+        if abs(now - time.monotonic() - lane.clock_offset) > 1.0:
+            self.logger.info(f'System clock has been changed, rescheduling '
+                             f'jobs of port "{lane.name}" ...')
+            self._schedule_lane(lane, now)
+
+        if lane.is_empty:
+            # No jobs left, wait until the module is stopped.
+            self.logger.debug(f'No jobs left for port "{lane.name}"')
+            return None
+
+        run_time, job = lane.peek()
+        start_time = max(run_time, lane.next_slot)
+
+        if start_time > now:
+            return min(start_time - now, self.MAX_WAIT_TIME)
+
+        lane.pop()
+
+        # The job may have been delayed by the sleep time of other jobs.
+        # Check whether it is still pending.
+        run_time = job.get_next_run_time(now)
+
+        if run_time is None:
+            self._remove(job)
+            return 0.0
+
+        if run_time > now:
+            lane.push(job, run_time)
+            return 0.0
+
+        job.run()
+
+        # Keep the cadence of the observations without accumulating delays,
+        # but never schedule into the past.
+        sleep_time = max(job.sleep_time, self.MIN_SLEEP_TIME)
+        lane.next_slot = max(start_time + sleep_time, time.time())
+        self.logger.debug(f'Next observation on port "{lane.name}" starts '
+                          f'in {lane.next_slot - time.time():.3f} s')
+
+        run_time = job.get_next_run_time(lane.next_slot)
+
+        if run_time is None:
+            self._remove(job)
+            return 0.0
+
+        lane.push(job, run_time)
+        return 0.0
+
+    def _schedule_lane(self, lane: JobLane, now: float) -> None:
+        """Calculates the next run times of all jobs of a lane and refills
+        the queue of the lane.
+
+        Args:
+            lane: The job lane.
+            now: The current Unix timestamp.
+        """
+        lane.clear()
+        lane.next_slot = now
+        lane.clock_offset = now - time.monotonic()
+
+        with self._jobs_lock:
+            jobs = [job for job in self._jobs if job.port_name == lane.name]
+
+        for job in jobs:
+            run_time = job.get_next_run_time(now)
+
+            if run_time is None:
+                self._remove(job)
+                continue
+
+            lane.push(job, run_time)
+
+    def _create_lanes(self) -> List[JobLane]:
+        """Creates a lane for the jobs of each port.
+
+        Returns:
+            List of job lanes.
+        """
+        for port_name in dict.fromkeys(job.port_name for job in self._jobs):
+            self._lanes[port_name] = JobLane(port_name)
+
+        return list(self._lanes.values())
 
     def add(self, job: Job) -> None:
         """Appends a job to the jobs list.
@@ -202,7 +486,9 @@ class Scheduler(Prototype):
         Args:
             job: Job to add.
         """
-        self._jobs.append(job)
+        with self._jobs_lock:
+            self._jobs.append(job)
+
         self.logger.debug(f'Added job "{job.name}" to scheduler "{self._name}"')
 
     def load_jobs(self) -> None:
@@ -212,9 +498,13 @@ class Scheduler(Prototype):
         for schedule in self._schedules:
             observations = schedule.get('observations')
 
+            # Port and sensor of the scheduler may be overridden.
+            port_name = schedule.get('port', self._port_name)
+            sensor_name = schedule.get('sensor', self._sensor_name)
+
             # Get all observations of the current observation set.
             for obs_name in observations:
-                obs = self._sensor_manager.get(self._sensor_name)\
+                obs = self._sensor_manager.get(sensor_name)\
                                           .get_observation(obs_name)
 
                 if not obs:
@@ -222,7 +512,7 @@ class Scheduler(Prototype):
                     continue
 
                 # Add sensor name to the observation.
-                obs.set('sensorName', self._sensor_name)
+                obs.set('sensorName', sensor_name)
 
                 # Add project and node id.
                 obs.set('pid', self._project_manager.project.id)
@@ -230,7 +520,7 @@ class Scheduler(Prototype):
 
                 # Create a new job.
                 job = Job(obs_name,
-                          self._port_name,
+                          port_name,
                           obs,
                           schedule.get('enabled'),
                           schedule.get('startDate'),
@@ -241,40 +531,41 @@ class Scheduler(Prototype):
                 self.add(job)
 
     def run(self) -> None:
-        """Threaded method to process the jobs queue."""
+        """Threaded method to start a lane for the jobs of each port."""
         self.load_jobs()
-        zombies = []
 
         # FIXME: Wait for uplink connection.
         sleep_time = 5.0
         self.logger.verbose('Starting jobs in {:3.1f} s ...'.format(sleep_time))
-        time.sleep(sleep_time)
+        self.wait_until(lambda: False, sleep_time)
 
-        while self.is_running:
-            t1 = time.time()
+        if not self.is_running:
+            return
 
-            for job in self._jobs:
-                if job.has_expired():
-                    zombies.append(job)
-                    continue
+        for lane in self._create_lanes():
+            lane.thread = threading.Thread(target=self._run_lane,
+                                           args=(lane,),
+                                           daemon=True)
+            lane.thread.start()
 
-                if not job.is_enabled:
-                    continue
+        self.logger.debug(f'Started {len(self._lanes)} job lane(s)')
+
+    async def run_async(self) -> None:
+        """Coroutine to run a lane for the jobs of each port."""
+        self.load_jobs()
 
-                if job.is_pending():
-                    job.run()
+        # FIXME: Wait for uplink connection.
+        sleep_time = 5.0
+        self.logger.verbose('Starting jobs in {:3.1f} s ...'.format(sleep_time))
+        await self.wait_until_async(lambda: False, sleep_time)
 
-            # Remove expired jobs from the jobs list.
-            while zombies:
-                zombie = zombies.pop()
-                self._jobs.remove(zombie)
-                self.logger.debug(f'Deleted expired job "{zombie.name}"')
+        if not self.is_running:
+            return
 
-            t2 = time.time()
-            dt = t2 - t1
+        lanes = self._create_lanes()
+        self.logger.debug(f'Started {len(lanes)} job lane(s)')
 
-            if dt < 0.1:
-                time.sleep(0.1 - dt)
+        await asyncio.gather(*[self._run_lane_async(lane) for lane in lanes])
 
     def start(self) -> None:
         if self._is_running:
@@ -6,16 +6,35 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2019, Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
+import gzip
+import hashlib
+import html
+import json
 import logging
+import mimetypes
+import queue
+import time
 
+from collections import namedtuple
+from email.utils import formatdate, parsedate_to_datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
 from pathlib import Path
+from socketserver import ThreadingMixIn
 from string import Template
-from threading import Thread
-from typing import Dict
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Hashable, List, Optional
 from urllib import parse
 
-from core.logging import RingBufferLogHandler, RootFilter, StringFormatter
+import arrow
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    # Python 3.6.
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+from core.logging import LogEntry, RingBufferLogHandler, RootFilter
 from core.manager import Manager
 from core.system import System
 from core.prototype import Prototype
@@ -34,6 +53,7 @@ class LocalControlServer(Prototype):
     Parameters:
         host (str): FQDN or IP address of the server.
         port (int): Port number.
+        interval (float): Interval of module metrics in seconds (optional).
     """
 
     def __init__(self, module_name: str, module_type: str, manager: Manager):
@@ -42,6 +62,7 @@ class LocalControlServer(Prototype):
 
         self._host = config.get('host')
         self._port = config.get('port')
+        self._interval = config.get('interval', 1.0)
 
         self._httpd = None
 
@@ -49,20 +70,29 @@ class LocalControlServer(Prototype):
         self._thread = Thread(target=self.run)
         self._thread.daemon = True
 
-        # Store the last 50 log messages of level INFO.
-        log_handler = RingBufferLogHandler(logging.INFO, 50)
+        # Store the last 1000 log records of level INFO and above.
+        log_handler = RingBufferLogHandler(logging.INFO, 1000)
         log_handler.addFilter(RootFilter())
-        log_handler.setFormatter(StringFormatter())
 
         # Add local log handler to root handler.
         root = logging.getLogger()
         root.addHandler(log_handler)
 
+        # Static files, the template, and rendered HTML fragments are shared
+        # by all requests.
+        cache = ContentCache('modules/server')
+
+        # Samples state and throughput of all modules for the JSON API and
+        # the event stream.
+        self._monitor = StatusMonitor(manager.module, self._interval)
+
         # Custom request handler of the HTTP server.
         def handler(*args):
-            RequestHandler(manager, log_handler, *args)
+            RequestHandler(manager, log_handler, cache, self._monitor, *args)
 
-        self._httpd = HTTPServer((self._host, self._port), handler)
+        # Requests are handled in separate threads, so that a slow client
+        # does not block other clients.
+        self._httpd = ThreadingHTTPServer((self._host, self._port), handler)
 
     def __del__(self):
         if self._httpd:
@@ -81,24 +111,391 @@ class LocalControlServer(Prototype):
 
         # Run HTTP server in thread to avoid blocking.
         self._thread.start()
+        self._monitor.start()
 
     def stop(self) -> None:
         """Stops the server."""
         super().stop()
+        self._monitor.stop()
 
         # Close the HTTP server.
         if self._httpd:
             self._httpd.server_close()
 
 
+# Static file of a `ContentCache`.
+StaticFile = namedtuple('StaticFile', ['content', 'compressed', 'etag',
+                                       'last_modified', 'mime', 'mtime'])
+
+
+def compress(content: bytes) -> Optional[bytes]:
+    """Returns the content compressed with gzip, or `None` if the content is
+    too small to benefit from compression.
+
+    Args:
+        content: The content to compress.
+
+    Returns:
+        Compressed content or `None`.
+    """
+    if len(content) < ContentCache.MIN_COMPRESS_SIZE:
+        return None
+
+    return gzip.compress(content, 6)
+
+
+class ContentCache:
+    """
+    ContentCache keeps the static files and the HTML template of the
+    LocalControlServer in memory. Files are read and compressed once, on first
+    request, together with their ETag and modification time. Rendered HTML
+    fragments are cached until the state they have been rendered from has
+    changed. The cache is shared by all request handler threads.
+    """
+
+    # Minimum size in bytes of content to compress.
+    MIN_COMPRESS_SIZE = 1024
+
+    def __init__(self, root_dir: str):
+        """
+        Args:
+            root_dir: Directory of the static files.
+        """
+        self._root_dir = Path(root_dir).resolve()
+        self._files = {}
+        self._fragments = {}
+        self._templates = {}
+        self._lock = Lock()
+
+    def _load(self, path: str) -> Optional[StaticFile]:
+        """Reads a file from the root directory.
+
+        Args:
+            path: URL path of the file.
+
+        Returns:
+            The static file, or `None` if the file does not exist or is
+            outside of the root directory.
+        """
+        file_path = (self._root_dir / path.lstrip('/')).resolve()
+
+        if self._root_dir not in file_path.parents or not file_path.is_file():
+            return None
+
+        content = file_path.read_bytes()
+        mtime = int(file_path.stat().st_mtime)
+        mime, _ = mimetypes.guess_type(str(file_path))
+
+        return StaticFile(content=content,
+                          compressed=compress(content),
+                          etag='"{}"'.format(hashlib.md5(content).hexdigest()),
+                          last_modified=formatdate(mtime, usegmt=True),
+                          mime=mime or 'application/octet-stream',
+                          mtime=mtime)
+
+    def get_file(self, path: str) -> Optional[StaticFile]:
+        """Returns a static file. Missing files are not cached.
+
+        Args:
+            path: URL path of the file.
+
+        Returns:
+            The static file, or `None` if the file does not exist.
+        """
+        static_file = self._files.get(path)
+
+        if static_file is None:
+            static_file = self._load(path)
+
+            if static_file is not None:
+                self._files[path] = static_file
+
+        return static_file
+
+    def get_fragment(self,
+                     name: str,
+                     state: Hashable,
+                     render: Callable[[], Any]) -> Any:
+        """Returns a cached fragment. The fragment is rendered again if the
+        given state differs from the state of the cached fragment.
+
+        Args:
+            name: Name of the fragment.
+            state: State the fragment depends on.
+            render: Function that renders the fragment.
+
+        Returns:
+            The (cached) fragment.
+        """
+        with self._lock:
+            cached = self._fragments.get(name)
+
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        fragment = render()
+
+        with self._lock:
+            self._fragments[name] = (state, fragment)
+
+        return fragment
+
+    def get_template(self, path: str) -> Optional[Template]:
+        """Returns a static file as template.
+
+        Args:
+            path: URL path of the template file.
+
+        Returns:
+            The template, or `None` if the file does not exist.
+        """
+        template = self._templates.get(path)
+
+        if template is None:
+            static_file = self.get_file(path)
+
+            if static_file is None:
+                return None
+
+            template = Template(static_file.content.decode('utf-8'))
+            self._templates[path] = template
+
+        return template
+
+
+class StatusMonitor:
+    """
+    StatusMonitor samples the state, the message counters, and the inbox
+    statistics of all modules in a fixed interval, and calculates the
+    throughput of each module in messages per second. State changes and
+    metrics are passed as server-sent events to all subscribers. The JSON API
+    returns the latest sample, so that polling clients do not cause any
+    additional work.
+    """
+
+    # Maximum number of concurrent subscribers.
+    MAX_SUBSCRIBERS = 32
+
+    # Maximum number of pending events of a subscriber. Further events are
+    # dropped until the subscriber has caught up.
+    QUEUE_SIZE = 100
+
+    def __init__(self, module_manager: Any, interval: float = 1.0):
+        """
+        Args:
+            module_manager: The module manager.
+            interval: Sampling interval in seconds.
+        """
+        self._module_manager = module_manager
+        self._interval = interval
+        self._lock = Lock()
+        self._subscribers = []
+        self._modules = None
+        self._last_time = None
+        self._timestamp = None
+        self._is_running = False
+        self._wake_up = Event()
+        self._thread = None
+
+    def _publish(self, event: str, data: Any) -> None:
+        """Passes an event to all subscribers.
+
+        Args:
+            event: Name of the event.
+            data: Data of the event.
+        """
+        message = get_event(event, data)
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                pass
+
+    def _run(self) -> None:
+        """Samples the modules until the monitor is stopped. Runs within a
+        thread."""
+        while self._is_running:
+            self.update()
+            self._wake_up.wait(self._interval)
+            self._wake_up.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Returns the message counters, throughput, and inbox statistics of
+        all modules of the latest sample.
+
+        Returns:
+            Dictionary with timestamp, interval, and module metrics.
+        """
+        modules = self.get_modules()
+
+        return {
+            'interval': self._interval,
+            'modules': {module['name']: {
+                'counters': module['counters'],
+                'inbox': module['inbox'],
+                'rates': module['rates']
+            } for module in modules},
+            'timestamp': self._timestamp
+        }
+
+    def get_modules(self) -> List[Dict[str, Any]]:
+        """Returns the latest sample of all modules. The modules are sampled
+        once if the monitor has not been started yet.
+
+        Returns:
+            List of modules.
+        """
+        if self._modules is None:
+            self.update()
+
+        return list(self._modules.values())
+
+    def start(self) -> None:
+        """Starts the sampling thread."""
+        if self._is_running:
+            return
+
+        self._is_running = True
+        self._thread = Thread(target=self._run, name='monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the sampling thread and closes the streams of all
+        subscribers."""
+        self._is_running = False
+        self._wake_up.set()
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(None)
+            except queue.Full:
+                pass
+
+    def subscribe(self) -> Optional[queue.Queue]:
+        """Returns a queue of events for a new subscriber.
+
+        Returns:
+            Queue of encoded events, or `None` if the maximum number of
+            subscribers has been reached. `None` is put into the queue once
+            the monitor has been stopped.
+        """
+        with self._lock:
+            if len(self._subscribers) >= self.MAX_SUBSCRIBERS:
+                return None
+
+            subscriber = queue.Queue(self.QUEUE_SIZE)
+            self._subscribers.append(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> None:
+        """Removes a subscriber.
+
+        Args:
+            subscriber: Queue of the subscriber.
+        """
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def update(self) -> None:
+        """Samples all modules. Passes a `state` event for every module that
+        has been started or stopped since the last sample, and a `metrics`
+        event if any counter or inbox has changed."""
+        now = time.monotonic()
+        previous = self._modules or {}
+        modules = {}
+        changes = []
+
+        for name, module in self._module_manager.modules.items():
+            counters = module.stats
+            status = 'running' if module.worker.is_running else 'stopped'
+            last = previous.get(name)
+            rates = {key: 0.0 for key in counters}
+
+            if last and now > self._last_time:
+                dt = now - self._last_time
+
+                for key, value in counters.items():
+                    rates[key] = round((value - last['counters'][key]) / dt, 3)
+
+            modules[name] = {
+                'counters': counters,
+                'inbox': module.inbox.stats,
+                'name': name,
+                'rates': rates,
+                'status': status,
+                'type': module.worker.type
+            }
+
+            if not last or last['status'] != status:
+                changes.append({'name': name, 'status': status})
+
+        is_changed = any(previous.get(name) is None or
+                         previous[name]['counters'] != module['counters'] or
+                         previous[name]['inbox'] != module['inbox']
+                         for name, module in modules.items())
+
+        self._modules = modules
+        self._last_time = now
+        self._timestamp = str(arrow.utcnow())
+
+        # The initial state is sent to each new subscriber instead.
+        if not previous:
+            return
+
+        for change in changes:
+            self._publish('state', change)
+
+        if is_changed:
+            self._publish('metrics', self.get_metrics())
+
+    def wake_up(self) -> None:
+        """Takes a new sample immediately."""
+        self._wake_up.set()
+
+    @property
+    def interval(self) -> float:
+        return self._interval
+
+    @property
+    def is_running(self) -> bool:
+        return self._is_running
+
+
+def get_event(event: str, data: Any) -> bytes:
+    """Returns a server-sent event.
+
+    Args:
+        event: Name of the event.
+        data: Data of the event, encoded in JSON.
+
+    Returns:
+        Encoded event.
+    """
+    return bytes(f'event: {event}\ndata: {json.dumps(data)}\n\n', 'UTF-8')
+
+
 class RequestHandler(BaseHTTPRequestHandler):
     """
     Custom HTTP request handler.
     """
 
+    # Interval of keep-alive comments in event streams, in seconds.
+    KEEP_ALIVE_INTERVAL = 15.0
+
     def __init__(self,
                  manager: Manager,
                  log_handler: RingBufferLogHandler,
+                 cache: ContentCache,
+                 monitor: StatusMonitor,
                  *args):
         self._config_manager = manager.config
         self._module_manager = manager.module
@@ -107,49 +504,99 @@ class RequestHandler(BaseHTTPRequestHandler):
         self._node_manager = manager.node
 
         self._log_handler = log_handler
-        self._root_dir = 'modules/server'
-
-        index_file = self.absolute_path('/index.html')
-        self._template = self.get_file_contents(index_file)
+        self._cache = cache
+        self._monitor = monitor
 
         super().__init__(*args)
 
     def do_GET(self) -> None:
         """Creates the response to a GET request."""
+        if parse.urlparse(self.path).path == '/api/events':
+            self.do_event_stream()
+            return
+
+        self.respond(self.get_response(True))
+
+    def do_HEAD(self) -> None:
+        """Creates the response to a HEAD request."""
+        opts = self.get_response(False)
+        opts['is_head'] = True
+        self.respond(opts)
+
+    def get_response(self, is_get: bool) -> Dict[str, Any]:
+        """Returns status, mime type, content, and additional headers of the
+        response to the requested path.
+
+        Args:
+            is_get: Whether the request is a GET request. Actions are executed
+                on GET requests only.
+
+        Returns:
+            Options of the response.
+        """
         parsed_path = parse.urlparse(self.path)
-        file_path = self.absolute_path(parsed_path.path)
 
-        status = 200
-        mime = 'text/html'
+        api = {
+            '/api/log': self.get_log,
+            '/api/metrics': self.get_metrics,
+            '/api/modules': self.get_modules,
+            '/api/status': self.get_status
+        }
+
+        if parsed_path.path in api:
+            try:
+                query = parse.parse_qs(parsed_path.query)
+                content = json.dumps(api[parsed_path.path](query))
+                status = 200
+            except ValueError as e:
+                content = json.dumps({'error': str(e)})
+                status = 400
 
-        if self.path.endswith('.css'):
-            mime = 'text/css'
-        elif self.path.endswith('.txt'):
-            mime = 'text/plain'
+            return {
+                'status': status,
+                'mime': 'application/json',
+                'content': content,
+                'headers': {'Cache-Control': 'no-cache'}
+            }
 
         if parsed_path.path in ['/', '/index.html']:
-            self.do_action_query(parse.parse_qs(parsed_path.query))
-            content = self.get_index(self._template)
-        else:
-            if file_path.exists():
-                content = self.get_file_contents(file_path)
-            else:
-                content = self.get_404()
-                status = 404
+            if is_get:
+                self.do_action_query(parse.parse_qs(parsed_path.query))
+
+            return {
+                'status': 200,
+                'mime': 'text/html',
+                'content': self.get_index(),
+                'headers': {'Cache-Control': 'no-cache'}
+            }
 
-        self.respond(
-            {
-                'status': status,
-                'mime': mime,
-                'content': content
+        static_file = self._cache.get_file(parsed_path.path)
+
+        if static_file is None:
+            return {
+                'status': 404,
+                'mime': 'text/html',
+                'content': self.get_404()
             }
-        )
 
-    def do_HEAD(self) -> None:
-        """Creates HTTP header."""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
+        headers = {
+            'ETag': static_file.etag,
+            'Last-Modified': static_file.last_modified
+        }
+
+        if self.is_not_modified(static_file):
+            return {
+                'status': 304,
+                'headers': headers
+            }
+
+        return {
+            'status': 200,
+            'mime': static_file.mime,
+            'content': static_file.content,
+            'compressed': static_file.compressed,
+            'headers': headers
+        }
 
     def do_action_query(self, query: Dict) -> None:
         """Processes action query.
@@ -177,6 +624,50 @@ class RequestHandler(BaseHTTPRequestHandler):
         if action_value == 'start' and not module.worker.is_running:
             module.start_worker()
 
+        self._monitor.wake_up()
+
+    def do_event_stream(self) -> None:
+        """Sends server-sent events of the status monitor until the client
+        disconnects or the monitor is stopped. The stream starts with a
+        `modules` event containing all modules, followed by `state` and
+        `metrics` events."""
+        subscriber = self._monitor.subscribe()
+
+        if subscriber is None:
+            self.respond({
+                'status': 503,
+                'mime': 'application/json',
+                'content': json.dumps({'error': 'Too many subscribers'})
+            })
+            return
+
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            # Disable buffering of reverse proxies, like nginx.
+            self.send_header('X-Accel-Buffering', 'no')
+            self.end_headers()
+
+            self.wfile.write(get_event('modules', self._monitor.get_modules()))
+
+            while self._monitor.is_running:
+                try:
+                    message = subscriber.get(timeout=self.KEEP_ALIVE_INTERVAL)
+                except queue.Empty:
+                    message = b': keep-alive\n\n'
+
+                if message is None:
+                    break
+
+                self.wfile.write(message)
+                self.wfile.flush()
+        except OSError:
+            # Client has disconnected.
+            pass
+        finally:
+            self._monitor.unsubscribe(subscriber)
+
     def get_404(self) -> str:
         """Returns a "file not found" page (error 404).
 
@@ -191,57 +682,160 @@ class RequestHandler(BaseHTTPRequestHandler):
                 '<p><small>{openadms_version}</small></p>\n</body></html>'
                 .format(openadms_version=System.get_openadms_string()))
 
-    def absolute_path(self, path: str) -> Path:
-        return Path(self._root_dir + '/' + path)
+    def get_log(self, query: Dict) -> Dict[str, Any]:
+        """Returns the log records since a given sequence number. The GET
+        query may contain the arguments `since` (sequence
+        number), `level` (minimum log level, by name or number), `module`
+        (module name), and `limit` (maximum number of records).
+
+        Args:
+            query: GET query.
+
+        Returns:
+            Dictionary with log records and the sequence number to continue
+            reading from.
+
+        Raises:
+            ValueError: If an argument is invalid.
+        """
+        since = 0
+        level = logging.NOTSET
+        module = None
+        limit = None
+
+        if self._has_attribute(query, 'since'):
+            since = int(query.get('since')[0])
+
+        if self._has_attribute(query, 'level'):
+            level = self.get_log_level(query.get('level')[0])
+
+        if self._has_attribute(query, 'module'):
+            module = query.get('module')[0]
 
-    def get_file_contents(self, path: Path) -> str:
-        """Opens a file and returns the contents.
+        if self._has_attribute(query, 'limit'):
+            limit = int(query.get('limit')[0])
+
+        entries, seq = self._log_handler.read(since, level, module, limit)
+
+        return {
+            'seq': seq,
+            'records': [self.get_log_record(entry) for entry in entries]
+        }
+
+    def get_log_level(self, value: str) -> int:
+        """Returns the numeric log level of a level name or number.
 
         Args:
-            path: File path.
+            value: Name (e.g., `WARNING`) or number of the log level.
 
         Returns:
-            String with file contents.
+            Numeric log level.
+
+        Raises:
+            ValueError: If the log level is unknown.
         """
-        with open(str(path), 'r', encoding='utf-8') as fh:
-            file_contents = fh.read()
+        if value.isdigit():
+            return int(value)
+
+        level = logging.getLevelName(value.upper())
 
-        return file_contents
+        if not isinstance(level, int):
+            raise ValueError(f'Invalid log level "{value}"')
 
-    def get_index(self, template: str) -> str:
-        """Returns the index page of this module in HTML format.
+        return level
+
+    def get_log_record(self, entry: LogEntry) -> Dict:
+        """Returns a log entry as dictionary.
 
         Args:
-            template: The template.
+            entry: The log entry.
+
+        Returns:
+            Dictionary with sequence number, timestamp, level, module name, and
+            message.
+        """
+        asctime = time.strftime(RingBufferLogHandler.DATE_FORMAT,
+                                time.localtime(entry.timestamp))
+
+        return {
+            'seq': entry.seq,
+            'timestamp': asctime,
+            'level': logging.getLevelName(entry.level),
+            'module': entry.module,
+            'message': entry.message
+        }
+
+    def get_index(self) -> str:
+        """Returns the index page of this module in HTML format. The tables of
+        modules and sensors are rendered again only if the modules or sensors
+        have changed. Information that does not change at run-time is
+        rendered once.
 
         Returns:
             String with the parsed index page.
         """
+        template = self._cache.get_template('/index.html')
+        entries, log_seq = self._log_handler.read()
+        log = '\n'.join([self._log_handler.format_entry(entry)
+                         for entry in entries])
+
+        modules = self._module_manager.modules
+        modules_state = tuple([(name, module.worker.is_running)
+                               for name, module in modules.items()])
+        sensors_state = tuple(self._sensor_manager.sensors.keys())
+
         vars = {
-            'config_file': self._config_manager.path,
             'datetime': System.get_date_time(),
-            'hostname': System.get_host_name(),
-            'log': self._log_handler.get_logs(),
+            'log': html.escape(log),
+            'log_seq': log_seq,
             'log_size': self._log_handler.size,
-            'modules_table': self.get_modules_table(),
-            'node_description': self._node_manager.node.description,
-            'node_id': self._node_manager.node.id,
-            'node_name': self._node_manager.node.name,
-            'openadms_string': System.get_openadms_string(),
-            'os_name': System.get_os_name(),
-            'python_version': System.get_python_version(),
-            'project_description': self._project_manager.project.description,
-            'project_id': self._project_manager.project.id,
-            'project_name': self._project_manager.project.name,
-            'root_dir': System.get_root_dir(),
-            'sensors_table': self.get_sensors_table(),
-            'system': System.get_system_string(),
+            'modules_table': self._cache.get_fragment('modules_table',
+                                                      modules_state,
+                                                      self.get_modules_table),
+            'sensors_table': self._cache.get_fragment('sensors_table',
+                                                      sensors_state,
+                                                      self.get_sensors_table),
             'system_uptime': System.get_system_uptime_string(),
             'software_uptime': System.get_software_uptime_string(),
             'year': System.get_current_year()
         }
 
-        return self.parse(template, **vars)
+        vars.update(self._cache.get_fragment('static_vars', None,
+                                             self.get_static_vars))
+
+        return template.safe_substitute(**vars)
+
+    def get_metrics(self, query: Dict) -> Dict[str, Any]:
+        """Returns the message counters, the throughput in messages per
+        second, and the inbox statistics of all modules.
+
+        Args:
+            query: GET query (unused).
+
+        Returns:
+            Dictionary with module metrics.
+        """
+        return self._monitor.get_metrics()
+
+    def get_modules(self, query: Dict) -> Dict[str, Any]:
+        """Returns name, type, status, and inbox statistics of all modules.
+
+        Args:
+            query: GET query (unused).
+
+        Returns:
+            Dictionary with list of modules.
+        """
+        modules = self._monitor.get_modules()
+
+        return {
+            'modules': [{
+                'inbox': module['inbox'],
+                'name': module['name'],
+                'status': module['status'],
+                'type': module['type']
+            } for module in modules]
+        }
 
     def get_modules_table(self) -> str:
         """Returns table rows with all modules of the current configuration in
@@ -314,6 +908,121 @@ class RequestHandler(BaseHTTPRequestHandler):
 
         return content
 
+    def get_static_vars(self) -> Dict[str, Any]:
+        """Returns the variables of the index page that do not change at
+        run-time.
+
+        Returns:
+            Dictionary of template variables.
+        """
+        return {
+            'config_file': self._config_manager.path,
+            'hostname': System.get_host_name(),
+            'node_description': self._node_manager.node.description,
+            'node_id': self._node_manager.node.id,
+            'node_name': self._node_manager.node.name,
+            'openadms_string': System.get_openadms_string(),
+            'os_name': System.get_os_name(),
+            'python_version': System.get_python_version(),
+            'project_description': self._project_manager.project.description,
+            'project_id': self._project_manager.project.id,
+            'project_name': self._project_manager.project.name,
+            'root_dir': System.get_root_dir(),
+            'system': System.get_system_string()
+        }
+
+    def get_status(self, query: Dict) -> Dict[str, Any]:
+        """Returns project, node, and system information, uptimes, and the
+        number of running and stopped modules, like the `StatusPublisher`.
+
+        Args:
+            query: GET query (unused).
+
+        Returns:
+            Dictionary with status information.
+        """
+        status = dict(self._cache.get_fragment('status', None,
+                                               self.get_static_status))
+        modules = self._monitor.get_modules()
+        running = len([m for m in modules if m['status'] == 'running'])
+
+        status['modules'] = {
+            'running': running,
+            'stopped': len(modules) - running
+        }
+        status['statistics'] = {
+            'softwareUptime': System.get_software_uptime_string(),
+            'systemUptime': System.get_system_uptime_string()
+        }
+        status['timestamp'] = str(arrow.utcnow())
+
+        return status
+
+    def get_static_status(self) -> Dict[str, Any]:
+        """Returns the status information that does not change at run-time.
+
+        Returns:
+            Dictionary with project, node, and system information.
+        """
+        runtime = 'asyncio' if self._module_manager.runtime else 'threads'
+
+        return {
+            'node': {
+                'description': self._node_manager.node.description,
+                'id': self._node_manager.node.id,
+                'name': self._node_manager.node.name
+            },
+            'project': {
+                'description': self._project_manager.project.description,
+                'id': self._project_manager.project.id,
+                'name': self._project_manager.project.name
+            },
+            'system': {
+                'configFile': self._config_manager.path,
+                'host': System.get_host_name(),
+                'interpreter': System.get_python_version(),
+                'os': System.get_system_string(),
+                'rootDirectory': str(System.get_root_dir()),
+                'runtime': runtime,
+                'version': System.get_openadms_string()
+            }
+        }
+
+    def is_accepting_gzip(self) -> bool:
+        """Returns whether the client accepts gzip-compressed content.
+
+        Returns:
+            True if gzip is accepted, else false.
+        """
+        return 'gzip' in self.headers.get('Accept-Encoding', '')
+
+    def is_not_modified(self, static_file: StaticFile) -> bool:
+        """Returns whether the cached copy of a static file on the client is
+        still valid, according to the conditional headers of the request.
+
+        Args:
+            static_file: The requested static file.
+
+        Returns:
+            True if the file has not been modified, else false.
+        """
+        etags = self.headers.get('If-None-Match')
+
+        if etags:
+            return any(etag.strip() in [static_file.etag, '*']
+                       for etag in etags.split(','))
+
+        since = self.headers.get('If-Modified-Since')
+
+        if since:
+            try:
+                return static_file.mtime <= parsedate_to_datetime(
+                    since).timestamp()
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
     def _has_attribute(self, query: Dict, name: str) -> bool:
         """Checks a GET query for a given argument.
 
@@ -346,15 +1055,41 @@ class RequestHandler(BaseHTTPRequestHandler):
         """
         return str(Template(template).safe_substitute(**kwargs))
 
-    def respond(self, opts: Dict[str, str]) -> None:
-        """Responds to an HTTP request.
+    def respond(self, opts: Dict[str, Any]) -> None:
+        """Responds to an HTTP request. The content is sent gzip-compressed if
+        the client accepts it.
 
         Args:
-            opts: Status code, mime type, return data.
+            opts: Status code, mime type, content, optional pre-compressed
+                content, additional headers, and whether the request is a
+                HEAD request.
         """
+        content = opts.get('content', b'')
+
+        if isinstance(content, str):
+            content = bytes(content, 'UTF-8')
+
+        headers = dict(opts.get('headers', {}))
+
+        if opts.get('status') != 304:
+            headers['Content-Type'] = opts.get('mime')
+            headers['Vary'] = 'Accept-Encoding'
+
+            if self.is_accepting_gzip():
+                compressed = opts.get('compressed') or compress(content)
+
+                if compressed is not None:
+                    content = compressed
+                    headers['Content-Encoding'] = 'gzip'
+
+            headers['Content-Length'] = str(len(content))
+
         self.send_response(opts.get('status'))
-        self.send_header('Content-type', opts.get('mime'))
+
+        for key, value in headers.items():
+            self.send_header(key, value)
+
         self.end_headers()
 
-        response = bytes(opts.get('content'), 'UTF-8')
-        self.wfile.write(response)
+        if not opts.get('is_head') and opts.get('status') != 304:
+            self.wfile.write(content)
@@ -10,10 +10,15 @@ __license__ = 'BSD-2-Clause'
 import math
 import time
 
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
 import arrow
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from core.observation import Observation as Obs
 from core.manager import Manager
 from core.sensor import SensorType
@@ -37,6 +42,8 @@ class DistanceCorrector(Prototype):
         sensorHeight (float): Height of sensor.
     """
 
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
         config = self.get_module_config(self._name)
@@ -78,9 +85,8 @@ class DistanceCorrector(Prototype):
         dist = obs.get_response_value(self._distance_name)
 
         if dist is None:
-            self.logger.error(f'No distance set in observation '
-                              f'"{obs.get("name")}" of target '
-                              f'"{obs.get("target")}"')
+            self.logger.error('No distance set in observation "{name}" of '
+                              'target "{target}"', obs)
             return obs
 
         d_dist_1 = 0
@@ -119,6 +125,112 @@ class DistanceCorrector(Prototype):
 
         return obs
 
+    def process_batch(self, observations: List[Obs]) -> List[Obs]:
+        """Corrects the slope distances of multiple observations at once. The
+        distances measured between two updates of the atmospheric data are
+        corrected together with NumPy, if installed.
+
+        Args:
+            observations: The observation objects.
+
+        Returns:
+            The observation objects with corrected distances.
+        """
+        if not np:
+            return super().process_batch(observations)
+
+        pending = []
+
+        for obs in observations:
+            sensor_type = obs.get('sensorType')
+
+            # Update atmospheric data if sensor is a weather station. Correct
+            # the distances measured before with the previous data.
+            if SensorType.is_weather_station(sensor_type):
+                self._correct_distances(pending)
+                self._update_meteorological_data(obs)
+                pending = []
+                continue
+
+            # Check if sensor is of type "total station".
+            if not SensorType.is_total_station(sensor_type):
+                self.logger.warning(f'Sensor type "{sensor_type}" not '
+                                    f'supported')
+                continue
+
+            if obs.get_response_value(self._distance_name) is None:
+                self.logger.error('No distance set in observation "{name}" '
+                                  'of target "{target}"', obs)
+                continue
+
+            pending.append(obs)
+
+        self._correct_distances(pending)
+
+        return observations
+
+    def _correct_distances(self, observations: List[Obs]) -> None:
+        """Corrects the slope distances of total station observations using
+        the current atmospheric data.
+
+        Args:
+            observations: The observation objects.
+        """
+        if not observations:
+            return
+
+        # Check the age of the atmospheric data.
+        if self.last_update - time.time() > self._max_age:
+            self.logger.warning(f'Atmospheric data is older than '
+                                f'{int(self._max_age / 3600)} hour(s)')
+
+        dists = np.asarray([obs.get_response_value(self._distance_name)
+                            for obs in observations], dtype=float)
+        d_dists_1 = np.zeros_like(dists)
+        d_dist_2 = 0
+
+        # Calculate the atmospheric reduction of the distances.
+        if self._is_atmospheric_correction:
+            c = self.get_atmospheric_correction(self._temperature,
+                                                self._pressure,
+                                                self._humidity)
+            d_dists_1 = dists * c * math.pow(10, -6)
+
+            for obs in observations:
+                rs = Obs.create_response_set('float', 'none', round(c, 5))
+                obs.get('responseSets')['atmosphericPpm'] = rs
+
+        # Calculate the sea level reduction of the distances.
+        if self._is_sea_level_correction:
+            d_dist_2 = self.get_sea_level_correction(self._sensor_height)
+
+            for obs in observations:
+                rs = Obs.create_response_set('float', 'm', round(d_dist_2, 5))
+                obs.get('responseSets')['seaLevelDelta'] = rs
+
+        r_dists = dists + d_dists_1 + d_dist_2
+        d_dists = d_dists_1 + d_dist_2
+        count = 0
+
+        # Add corrected distances to the observation sets.
+        for obs, d_dist_1, r_dist in zip(observations,
+                                         d_dists_1.tolist(),
+                                         r_dists.tolist()):
+            if d_dist_1 == 0 and d_dist_2 == 0:
+                continue
+
+            response_sets = obs.get('responseSets')
+            rs = Obs.create_response_set('float', 'm', round(r_dist, 5))
+
+            response_sets[self._distance_name + 'Raw'] =\
+                response_sets.get(self._distance_name)
+            response_sets[self._distance_name] = rs
+            count += 1
+
+        if count > 0:
+            self.logger.info(f'Reduced {count} distance(s) (mean correction '
+                             f'value: {float(np.mean(d_dists)):0.5f} m)')
+
     def get_atmospheric_correction(self,
                                    temperature: float,
                                    pressure: float,
@@ -405,15 +517,13 @@ class HelmertTransformer(Prototype):
         dist = obs.get_response_value('slopeDist')
 
         if None in [hz, v, dist]:
-            self.logger.warning(f'Hz, V, or distance missing in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Hz, V, or distance missing in observation '
+                                '"{name}" of target "{target}"', obs)
             return obs
 
         if dist == 0:
-            self.logger.warning(f'Slope distance is "0" in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Slope distance is "0" in observation '
+                                '"{name}" of target "{target}"', obs)
 
         # Calculate the coordinates in the global system (X, Y, Z).
         x, y, z = self.calculate_point_coordinates(
@@ -695,15 +805,13 @@ class HelmertTransformer(Prototype):
         dist = obs.get_response_value('slopeDist')
 
         if None in [hz, v, dist]:
-            self.logger.warning(f'Hz, V, or distance missing in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Hz, V, or distance missing in observation '
+                                '"{name}" of target "{target}"', obs)
             return
 
         if dist == 0:
-            self.logger.warning(f'Slope distance is "0" in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Slope distance is "0" in observation '
+                                '"{name}" of target "{target}"', obs)
             return
 
         # Calculate the coordinates of the fixed point if the Helmert
@@ -738,8 +846,7 @@ class HelmertTransformer(Prototype):
         fixed_point['dist'] = dist
         fixed_point['lastUpdate'] = time.time()
 
-        self.logger.debug(f'Updated fixed point of target '
-                          f'"{obs.get("target")}"')
+        self.logger.debug('Updated fixed point of target "{target}"', obs)
 
         # Add global Cartesian coordinates of the fixed point to the
         # observation.
@@ -933,15 +1040,13 @@ class PolarTransformer(Prototype):
         dist = obs.get_response_value('slopeDist')
 
         if None in [hz, v, dist]:
-            self.logger.warning(f'Hz, V, or distance missing in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Hz, V, or distance missing in observation '
+                                '"{name}" of target "{target}"', obs)
             return obs
 
         if dist == 0:
-            self.logger.warning(f'Slope distance is "0" in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Slope distance is "0" in observation '
+                                '"{name}" of target "{target}"', obs)
 
         # Calculate the horizontal distance.
         dist_hz = math.sin(v) * dist
@@ -949,8 +1054,7 @@ class PolarTransformer(Prototype):
         if self._is_fixed_point(obs):
             # Add measured Hz and calculated Hz to the fixed point.
             self._update_fixed_point(obs)
-            self.logger.debug(f'Updated fixed point of target '
-                              f'"{obs.get("target")}"')
+            self.logger.debug('Updated fixed point of target "{target}"', obs)
 
         self.logger.debug('Starting polar transformation of target "{}" (Hz = '
                           '{:3.5f} gon, V = {:3.5f} gon, dist = {:4.5f} m)'
@@ -1047,6 +1151,12 @@ class RefractionCorrector(Prototype):
     The module has nothing to configure.
     """
 
+    REFRACTION_COEFFICIENT = 0.13
+    EARTH_RADIUS = 6370000
+
+    is_process_safe = True
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
 
@@ -1059,18 +1169,16 @@ class RefractionCorrector(Prototype):
         d = obs.get_response_value('slopeDist')
 
         if d is None:
-            self.logger.error(f'Slope distance is missing in observation '
-                              f'"{obs.get("name")}" of target '
-                              f'"{obs.get("target")}"')
+            self.logger.error('Slope distance is missing in observation '
+                              '"{name}" of target "{target}"', obs)
             return obs
 
         if d == 0:
-            self.logger.warning(f'Slope distance is "0" in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Slope distance is "0" in observation '
+                                '"{name}" of target "{target}"', obs)
 
-        k = 0.13                    # Refraction coefficient.
-        r = 6370000                 # Earth radius.
+        k = self.REFRACTION_COEFFICIENT
+        r = self.EARTH_RADIUS
 
         k_e = (d * d) / (2 * r)     # Correction of earth radius.
         k_r = k * k_e               # Correction of refraction.
@@ -1094,6 +1202,65 @@ class RefractionCorrector(Prototype):
 
         return obs
 
+    def process_batch(self, observations: List[Obs]) -> List[Obs]:
+        """Corrects the Z values of multiple observations at once, using NumPy,
+        if installed.
+
+        Args:
+            observations: The observation objects.
+
+        Returns:
+            The observation objects with corrected Z values.
+        """
+        if not np:
+            return super().process_batch(observations)
+
+        selected = []
+        zs = []
+        ds = []
+
+        for obs in observations:
+            z = obs.get_response_value('z')
+
+            if not z:
+                continue
+
+            d = obs.get_response_value('slopeDist')
+
+            if d is None:
+                self.logger.error('Slope distance is missing in observation '
+                                  '"{name}" of target "{target}"', obs)
+                continue
+
+            if d == 0:
+                self.logger.warning('Slope distance is "0" in observation '
+                                    '"{name}" of target "{target}"', obs)
+
+            selected.append(obs)
+            zs.append(z)
+            ds.append(d)
+
+        if not selected:
+            return observations
+
+        d = np.asarray(ds, dtype=float)
+        k_e = (d * d) / (2 * self.EARTH_RADIUS)   # Correction of earth radius.
+        k_r = self.REFRACTION_COEFFICIENT * k_e   # Correction of refraction.
+        r = k_e - k_r
+
+        for obs, z, r_i in zip(selected, zs, r.tolist()):
+            response_sets = obs.data['responseSets']
+            response_sets['refraction'] = Obs.create_response_set(
+                'float', 'm', round(r_i, 6))
+            response_sets['zRaw'] = Obs.create_response_set('float', 'm', z)
+            response_sets['z'] = Obs.create_response_set(
+                'float', 'm', round(z + r_i, 5))
+
+        self.logger.info(f'Updated heights in {len(selected)} observation(s) '
+                         f'(mean refraction value: {float(np.mean(r)):3.5f} m)')
+
+        return observations
+
 
 class SerialMeasurementProcessor(Prototype):
     """
@@ -1105,6 +1272,9 @@ class SerialMeasurementProcessor(Prototype):
     The module has nothing to configure.
     """
 
+    is_process_safe = True
+    is_slim_safe = True
+
     def __init__(self, module_name: str, module_type: str, manager: Manager):
         super().__init__(module_name, module_type, manager)
 
@@ -1120,9 +1290,8 @@ class SerialMeasurementProcessor(Prototype):
         dist1 = obs.get_response_value('slopeDist1')
 
         if None in [hz0, hz1, v0, v1, dist0, dist1]:
-            self.logger.warning(f'Hz, V, or distance missing in observation '
-                                f'"{obs.get("name")}" of target '
-                                f'"{obs.get("target")}"')
+            self.logger.warning('Hz, V, or distance missing in observation '
+                                '"{name}" of target "{target}"', obs)
             return obs
 
         # Calculate new Hz, V, and slope distance.
@@ -1146,8 +1315,68 @@ class SerialMeasurementProcessor(Prototype):
         response_sets['v'] = Obs.create_response_set('float', 'rad', v)
         response_sets['slopeDist'] = Obs.create_response_set('float', 'm', dist)
 
-        self.logger.debug(f'Calculated serial measurement with two faces for '
-                          f'observation "{obs.get("name")}" of target '
-                          f'"{obs.get("target")}"')
+        self.logger.debug('Calculated serial measurement with two faces for '
+                          'observation "{name}" of target "{target}"', obs)
         return obs
 
+    def process_batch(self, observations: List[Obs]) -> List[Obs]:
+        """Calculates the serial measurements of multiple observations at
+        once, using NumPy, if installed.
+
+        Args:
+            observations: The observation objects.
+
+        Returns:
+            The observation objects with serial measurements.
+        """
+        if not np:
+            return super().process_batch(observations)
+
+        names = ['hz0', 'hz1', 'v0', 'v1', 'slopeDist0', 'slopeDist1']
+        selected = []
+        rows = []
+
+        for obs in observations:
+            row = [obs.get_response_value(name) for name in names]
+
+            if None in row:
+                self.logger.warning('Hz, V, or distance missing in '
+                                    'observation "{name}" of target '
+                                    '"{target}"', obs)
+                continue
+
+            selected.append(obs)
+            rows.append(row)
+
+        if not selected:
+            return observations
+
+        hz0, hz1, v0, v1, dist0, dist1 = np.asarray(rows, dtype=float).T
+
+        # Calculate new Hz, V, and slope distance.
+        hz = (hz0 + hz1 + np.where(hz0 > hz1, math.pi, -math.pi)) / 2
+        v = ((2 * math.pi) + (v0 - v1)) / 2
+        dist = (dist0 + dist1) / 2
+        has_dist = (dist0 != 0) & (dist1 != 0)
+
+        # Save the calculated values.
+        for obs, hz_i, v_i, dist_i, has_dist_i in zip(selected,
+                                                      hz.tolist(),
+                                                      v.tolist(),
+                                                      dist.tolist(),
+                                                      has_dist.tolist()):
+            if not has_dist_i:
+                # Like `process_observation()`, store an integer 0.
+                dist_i = 0
+
+            response_sets = obs.get('responseSets')
+            response_sets['hz'] = Obs.create_response_set('float', 'rad', hz_i)
+            response_sets['v'] = Obs.create_response_set('float', 'rad', v_i)
+            response_sets['slopeDist'] = Obs.create_response_set('float', 'm',
+                                                                 dist_i)
+
+        self.logger.debug(f'Calculated serial measurements with two faces for '
+                          f'{len(selected)} observation(s)')
+
+        return observations
+
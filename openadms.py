@@ -29,8 +29,10 @@ __copyright__ = 'Copyright (c) 2020 Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
 import argparse
+import atexit
 import logging.handlers
 import os
+import queue
 import signal
 import sys
 import time
@@ -45,14 +47,18 @@ import arrow
 import coloredlogs
 import verboselogs
 
+from core.broker import MessageBroker
 from core.intercom import MQTTMessageBroker
-from core.logging import RootFilter
+from core.logging import (BufferedRotatingFileHandler, LogQueueListener,
+                          NonBlockingQueueHandler, RootFilter)
 from core.monitor import Monitor
 from core.system import System
 
 # Log file configuration.
 LOG_FILE_BACKUP_COUNT = 1     # One log file only.
 LOG_FILE_MAX_SIZE = 10485760  # 10 MiB.
+LOG_FLUSH_INTERVAL = 1.0      # Seconds between writes of the log file.
+LOG_QUEUE_SIZE = 10000        # Log records waiting to be written.
 
 # Get root logger.
 root = logging.getLogger()
@@ -110,6 +116,12 @@ def get_args() -> argparse.Namespace:
                         dest='is_mqtt_broker',
                         action='store_true',
                         default=False)
+    parser.add_argument('-t', '--broker-type',
+                        help='type of internal MQTT message broker',
+                        dest='broker_type',
+                        action='store',
+                        default='hbmqtt',
+                        choices=['builtin', 'hbmqtt'])
     parser.add_argument('-b', '--bind',
                         help='host of MQTT message broker (IP address or FQDN)',
                         dest='host',
@@ -121,6 +133,12 @@ def get_args() -> argparse.Namespace:
                         action='store',
                         type=int,
                         default=1883)
+    parser.add_argument('-u', '--unix-socket',
+                        help='path of Unix domain socket of internal MQTT '
+                             'message broker (built-in broker only)',
+                        dest='socket_path',
+                        action='store',
+                        default=None)
 
     # Required arguments.
     required_args = parser.add_argument_group('required arguments')
@@ -175,7 +193,9 @@ def setup_logging(is_quiet: bool = False,
                   is_debug: bool = False,
                   verbosity: int = 6,
                   log_file: str = 'openadms.log') -> None:
-    """Setups the logger and logging handlers.
+    """Setups the logger and logging handlers. Log records are put into a
+    queue by the root logger, and are written to console and log file by a
+    single listener thread, so that no thread is blocked by slow storage.
 
     Args:
         is_quiet: Disable output.
@@ -207,10 +227,10 @@ def setup_logging(is_quiet: bool = False,
         9: verboselogs.SPAM
     }.get(verbosity, 6)
 
-    fh = logging.handlers.RotatingFileHandler(log_file,
-                                              maxBytes=LOG_FILE_MAX_SIZE,
-                                              backupCount=LOG_FILE_BACKUP_COUNT,
-                                              encoding='utf8')
+    fh = BufferedRotatingFileHandler(log_file,
+                                     max_bytes=LOG_FILE_MAX_SIZE,
+                                     backup_count=LOG_FILE_BACKUP_COUNT,
+                                     encoding='utf8')
     fh.setLevel(file_level)
     fh.setFormatter(formatter)
     root.addHandler(fh)
@@ -225,9 +245,23 @@ def setup_logging(is_quiet: bool = False,
                         datefmt=date_fmt,
                         logger=root)
 
-    # Add filter to log handlers, to exclude log messages from HBMQTT.
-    for handler in logging.root.handlers:
-        handler.addFilter(RootFilter())
+    # Move the handlers to the listener thread, and let the root logger put
+    # the log records into the queue instead. If the queue is full, records
+    # are dropped rather than blocking the caller.
+    handlers = list(root.handlers)
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    qh = NonBlockingQueueHandler(log_queue)
+
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    # Add filter to log handler, to exclude log messages from HBMQTT.
+    qh.addFilter(RootFilter())
+    root.addHandler(qh)
+
+    listener = LogQueueListener(log_queue, handlers, LOG_FLUSH_INTERVAL)
+    listener.start()
+    atexit.register(listener.stop)
 
 
 def setup_thread_exception_hook() -> None:
@@ -275,14 +309,27 @@ def sigint_handler(signalnum: int, frame: Any) -> None:
 
 
 def start_mqtt_message_broker(host: str = '127.0.0.1',
-                              port: int = 1883) -> None:
+                              port: int = 1883,
+                              broker_type: str = 'hbmqtt',
+                              socket_path: str = None) -> None:
     """Starts the internal MQTT message broker.
 
     Args:
         host: FQDN or IP address.
         port: Port number.
+        broker_type: Type of the broker (`builtin` or `hbmqtt`).
+        socket_path: Optional path of a Unix domain socket (built-in broker
+            only).
     """
-    broker = MQTTMessageBroker(host, port)
+    if broker_type == 'hbmqtt':
+        if socket_path:
+            root.warning('Unix domain socket requires the built-in broker '
+                         '(--broker-type builtin)')
+
+        broker = MQTTMessageBroker(host, port)
+    else:
+        broker = MessageBroker(host, port, socket_path)
+
     broker.start()
 
 
@@ -338,9 +385,10 @@ if __name__ == '__main__':
     # Initialise the logger.
     setup_logging(args.is_quiet, args.is_debug, args.verbosity, args.log_file)
 
-    # Use internal MQTT message broker (HBMQTT).
+    # Use internal MQTT message broker.
     if args.is_mqtt_broker:
-        start_mqtt_message_broker(args.host, args.port)
+        start_mqtt_message_broker(args.host, args.port, args.broker_type,
+                                  args.socket_path)
 
     # Start the monitoring.
     main(args.config_file_path)
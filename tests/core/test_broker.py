@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""Tests the built-in MQTT message broker."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import gc
+import threading
+import time
+
+from typing import List, Tuple
+
+import paho.mqtt.client as paho
+import pytest
+
+from core.broker import MessageBroker, is_valid_filter, match_topic
+
+
+@pytest.fixture()
+def broker(tmp_path) -> MessageBroker:
+    broker = MessageBroker('127.0.0.1', 0, str(tmp_path / 'mqtt.sock'))
+    broker.start()
+    yield broker
+    broker.stop()
+
+
+def get_client(broker: MessageBroker,
+               client_id: str,
+               received: List[Tuple[str, bytes, int, bool]],
+               clean_session: bool = True,
+               transport: str = 'tcp') -> paho.Client:
+    """Returns a connected MQTT client that appends received messages to the
+    given list.
+
+    Args:
+        broker: The message broker.
+        client_id: The client id.
+        received: List of received messages.
+        clean_session: Whether to use a clean session.
+        transport: The transport (`tcp` or `unix`).
+
+    Returns:
+        The MQTT client.
+    """
+    connected = threading.Event()
+    client = paho.Client(client_id=client_id,
+                         clean_session=clean_session,
+                         transport=transport)
+    client.on_connect = lambda *args: connected.set()
+    client.on_message = lambda c, u, msg: received.append((msg.topic,
+                                                           msg.payload,
+                                                           msg.qos,
+                                                           msg.retain))
+
+    if transport == 'unix':
+        client.connect(broker.path, 1883)
+    else:
+        client.connect('127.0.0.1', broker.port)
+
+    client.loop_start()
+    assert connected.wait(5)
+    return client
+
+
+def subscribe(client: paho.Client, topic: str, qos: int) -> None:
+    """Subscribes to a topic and waits for the acknowledgement."""
+    subscribed = threading.Event()
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.subscribe(topic, qos)
+    assert subscribed.wait(5)
+
+
+def wait_for(received: List, count: int) -> None:
+    """Waits until the given number of messages has been received."""
+    for _ in range(50):
+        if len(received) >= count:
+            return
+
+        time.sleep(0.1)
+
+
+class TestMessageBroker:
+
+    @pytest.mark.parametrize('topic_filter, topic, result', [
+        ('a/b', 'a/b', True),
+        ('a/+', 'a/b', True),
+        ('a/+', 'a/b/c', False),
+        ('a/#', 'a', True),
+        ('a/#', 'a/b/c', True),
+        ('+/+', 'a/b', True),
+        ('#', '$SYS/uptime', False),
+        ('b/#', 'a/b', False)
+    ])
+    def test_match_topic(self, topic_filter: str, topic: str,
+                         result: bool) -> None:
+        assert match_topic(topic_filter, topic) is result
+
+    def test_valid_filter(self) -> None:
+        assert is_valid_filter('a/+/#')
+        assert not is_valid_filter('a/#/b')
+        assert not is_valid_filter('a/b+')
+        assert not is_valid_filter('')
+
+    def test_publish(self, broker: MessageBroker) -> None:
+        received = []
+        subscriber = get_client(broker, 'subscriber', received)
+        subscribe(subscriber, 'openadms/#', 1)
+
+        publisher = get_client(broker, 'publisher', [], transport='unix')
+        publisher.publish('openadms/a', b'retained', 1, True).wait_for_publish()
+
+        for i in range(3):
+            publisher.publish('openadms/b', str(i), 1).wait_for_publish()
+
+        wait_for(received, 4)
+
+        assert received == [('openadms/a', b'retained', 1, False),
+                            ('openadms/b', b'0', 1, False),
+                            ('openadms/b', b'1', 1, False),
+                            ('openadms/b', b'2', 1, False)]
+
+        # Late subscribers get the retained message only.
+        late = []
+        client = get_client(broker, 'late', late)
+        subscribe(client, 'openadms/+', 0)
+        wait_for(late, 1)
+
+        assert late == [('openadms/a', b'retained', 0, True)]
+
+        for c in [subscriber, publisher, client]:
+            c.disconnect()
+            c.loop_stop()
+
+    def test_persistent_session(self, broker: MessageBroker) -> None:
+        received = []
+        subscriber = get_client(broker, 'subscriber', received, False)
+        subscribe(subscriber, 'openadms/a', 1)
+        subscriber.disconnect()
+        subscriber.loop_stop()
+
+        # Messages are queued while the client is offline.
+        publisher = get_client(broker, 'publisher', [])
+        publisher.publish('openadms/a', b'offline', 1).wait_for_publish()
+
+        subscriber = get_client(broker, 'subscriber', received, False)
+        wait_for(received, 1)
+
+        assert received == [('openadms/a', b'offline', 1, False)]
+
+        for c in [subscriber, publisher]:
+            c.disconnect()
+            c.loop_stop()
+
+    def test_stop(self, broker: MessageBroker) -> None:
+        errors = []
+        broker._loop.set_exception_handler(
+            lambda loop, context: errors.append(context))
+
+        disconnected = threading.Event()
+        client = get_client(broker, 'client', [])
+        client.on_disconnect = lambda *args: disconnected.set()
+
+        # Connected clients are disconnected before the event loop is closed.
+        broker.stop()
+        gc.collect()
+
+        assert disconnected.wait(5)
+        assert not broker._clients
+        assert errors == []
+
+        client.loop_stop()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""Tests the append-only cache."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import json
+import os
+import time
+
+from core.cache import AppendOnlyCache
+
+
+class TestAppendOnlyCache:
+
+    def test_memory(self) -> None:
+        cache = AppendOnlyCache()
+        doc_ids = [cache.insert({'n': i}) for i in range(3)]
+
+        assert len(cache) == 3
+        assert cache.first(2) == [{'n': 0}, {'n': 1}]
+        assert cache.first(1)[0].doc_id == doc_ids[0]
+
+        cache.remove(doc_ids=doc_ids[:2])
+        assert len(cache) == 1
+        assert cache.first(5) == [{'n': 2}]
+
+    def test_restore(self, tmp_path) -> None:
+        path = str(tmp_path / 'cache')
+
+        cache = AppendOnlyCache(path)
+        doc_ids = [cache.insert({'n': i}) for i in range(5)]
+        cache.remove(doc_ids=doc_ids[1:3])
+        cache.close()
+
+        cache = AppendOnlyCache(path)
+        records = cache.first(5)
+
+        assert records == [{'n': 0}, {'n': 3}, {'n': 4}]
+        assert [r.doc_id for r in records] == [1, 4, 5]
+        assert cache.insert({'n': 5}) == 6
+
+    def test_truncated_record(self, tmp_path) -> None:
+        path = str(tmp_path / 'cache')
+
+        cache = AppendOnlyCache(path)
+        cache.insert({'n': 0})
+        cache.close()
+
+        with open(str(tmp_path / 'cache.00000001'), 'a') as fh:
+            fh.write('{"op": "put", "id": 2, "da')
+
+        cache = AppendOnlyCache(path)
+        assert cache.first(5) == [{'n': 0}]
+
+    def test_compaction(self, tmp_path) -> None:
+        path = str(tmp_path / 'cache')
+
+        cache = AppendOnlyCache(path, segment_size=256, fsync='never')
+        doc_ids = [cache.insert({'n': i}) for i in range(50)]
+
+        num_segments = len(list(tmp_path.glob('cache.*')))
+        assert num_segments > 2
+
+        cache.remove(doc_ids=doc_ids[:-1])
+
+        # Segment of the pending record and the current segment are left.
+        assert len(list(tmp_path.glob('cache.*'))) <= 2
+        assert cache.first(5) == [{'n': 49}]
+
+        cache.close()
+        cache = AppendOnlyCache(path)
+        assert cache.first(5) == [{'n': 49}]
+
+    def test_compaction_move(self, tmp_path) -> None:
+        path = str(tmp_path / 'cache')
+
+        cache = AppendOnlyCache(path, segment_size=256, compact_ratio=0.5)
+        doc_ids = [cache.insert({'n': i}) for i in range(50)]
+        cache.remove(doc_ids=doc_ids[1:-1])
+
+        assert not (tmp_path / 'cache.00000001').exists()
+        assert cache.first(5) == [{'n': 0}, {'n': 49}]
+
+        cache.close()
+        cache = AppendOnlyCache(path)
+        assert cache.first(5) == [{'n': 0}, {'n': 49}]
+
+    def test_compaction_fsync(self, tmp_path, monkeypatch) -> None:
+        synced = []
+        monkeypatch.setattr(os, 'fsync', synced.append)
+
+        cache = AppendOnlyCache(str(tmp_path / 'cache'), segment_size=256,
+                                fsync='never', compact_ratio=0.5)
+        doc_ids = [cache.insert({'n': i}) for i in range(50)]
+        synced.clear()
+        cache.remove(doc_ids=doc_ids[1:-1])
+
+        # Moved records are synced, even if fsync is disabled.
+        assert synced
+        assert cache.first(5) == [{'n': 0}, {'n': 49}]
+
+    def test_fsync_interval(self, tmp_path, monkeypatch) -> None:
+        synced = []
+        monkeypatch.setattr(os, 'fsync', synced.append)
+
+        cache = AppendOnlyCache(str(tmp_path / 'cache'), fsync_interval=0.5)
+        fd = cache._writer.fileno()
+        cache.insert({'n': 0})
+        assert fd not in synced
+
+        # The write is synced once the interval has passed.
+        time.sleep(1.0)
+        assert synced.count(fd) == 1
+
+        cache.close()
+
+    def test_import_tinydb(self, tmp_path) -> None:
+        path = tmp_path / 'cache.json'
+
+        with open(str(path), 'w') as fh:
+            fh.write(json.dumps({'_default': {'2': {'n': 1}, '1': {'n': 0}}}))
+
+        cache = AppendOnlyCache(str(path))
+
+        assert cache.first(5) == [{'n': 0}, {'n': 1}]
+        assert not path.exists()
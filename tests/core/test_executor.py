@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""Tests the concurrent execution of message handlers."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import threading
+import time
+
+from types import SimpleNamespace
+
+import pytest
+
+from core.executor import OrderedExecutor
+from core.observation import Observation
+from core.prototype import Prototype
+from modules.totalstation import RefractionCorrector
+
+
+class TestOrderedExecutor:
+
+    def test_order(self) -> None:
+        executor = OrderedExecutor(4)
+        results = {'a': [], 'b': []}
+        lock = threading.Lock()
+
+        def task(key: str, n: int) -> None:
+            time.sleep(0.01 * (n % 3))
+
+            with lock:
+                results[key].append(n)
+
+        for n in range(10):
+            executor.submit('a', task, 'a', n)
+            executor.submit('b', task, 'b', n)
+
+        executor.shutdown(wait=True)
+
+        assert results['a'] == list(range(10))
+        assert results['b'] == list(range(10))
+
+    def test_parallel(self) -> None:
+        executor = OrderedExecutor(4)
+        barrier = threading.Barrier(4, timeout=5.0)
+
+        # Tasks without key run in parallel, or the barrier breaks.
+        for _ in range(4):
+            executor.submit(None, barrier.wait)
+
+        executor.shutdown(wait=True)
+        assert not barrier.broken
+
+    def test_shutdown(self) -> None:
+        executor = OrderedExecutor(1)
+        executor.submit('a', time.sleep, 0.01)
+        executor.shutdown(wait=True)
+
+        # Tasks submitted after the shutdown are rejected, without leaking
+        # slots or pending keys.
+        for _ in range(4):
+            with pytest.raises(RuntimeError):
+                executor.submit('a', time.sleep, 0)
+
+        assert executor._pending == {}
+        assert executor._slots.acquire(timeout=0)
+
+
+class TestProcessPool:
+
+    def get_manager(self) -> SimpleNamespace:
+        return SimpleNamespace(config=None, module=None, node=None,
+                               project=None, sensor=None, schema=None)
+
+    def test_process_safe(self) -> None:
+        assert not Prototype('p', 'p', self.get_manager()).is_process_safe
+
+    def test_process_observation_in_pool(self) -> None:
+        worker = RefractionCorrector('refractionCorrector',
+                                     'modules.totalstation.RefractionCorrector',
+                                     self.get_manager())
+        assert worker.create_process_pool(1)
+
+        obs = Observation({'name': 'test', 'responseSets': {}})
+        obs.data['responseSets']['z'] = Observation.create_response_set(
+            'float', 'm', 10.0)
+        obs.data['responseSets']['slopeDist'] = Observation.create_response_set(
+            'float', 'm', 100.0)
+
+        expected = worker.process_observation(obs.clone())
+        result = worker.process_observation_in_pool(obs)
+
+        assert result.data['responseSets'] == expected.data['responseSets']
+        worker._process_pool.shutdown()
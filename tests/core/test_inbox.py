@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""Tests the bounded inbox of modules."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import queue
+import threading
+
+import pytest
+
+from core.inbox import Inbox
+
+
+class TestInbox:
+
+    def test_unbounded(self) -> None:
+        inbox = Inbox()
+
+        for i in range(5):
+            assert inbox.put({'n': i})
+
+        assert len(inbox) == 5
+        assert [inbox.get()['n'] for _ in range(5)] == list(range(5))
+
+        with pytest.raises(queue.Empty):
+            inbox.get_nowait()
+
+    def test_drop_newest(self) -> None:
+        inbox = Inbox(capacity=2, overflow='dropNewest')
+        results = [inbox.put({'n': i}) for i in range(4)]
+
+        assert results == [True, True, False, False]
+        assert [inbox.get()['n'] for _ in range(2)] == [0, 1]
+        assert inbox.stats['dropped'] == 2
+
+    def test_drop_oldest(self) -> None:
+        inbox = Inbox(capacity=2, overflow='dropOldest')
+
+        for i in range(4):
+            inbox.put({'n': i})
+
+        assert [inbox.get()['n'] for _ in range(2)] == [2, 3]
+        assert inbox.stats['dropped'] == 2
+
+    def test_block(self) -> None:
+        inbox = Inbox(capacity=1, overflow='block')
+        inbox.put({'n': 0})
+
+        thread = threading.Thread(target=inbox.put, args=({'n': 1},))
+        thread.start()
+        thread.join(0.1)
+        assert thread.is_alive()
+
+        assert inbox.get()['n'] == 0
+        thread.join(1.0)
+        assert inbox.get(timeout=1.0)['n'] == 1
+
+    def test_block_timeout(self) -> None:
+        inbox = Inbox(capacity=1, overflow='block')
+        inbox.put({'n': 0})
+
+        assert not inbox.put({'n': 1}, timeout=0.1)
+
+        # Closing the inbox wakes up blocked senders.
+        results = []
+        thread = threading.Thread(target=lambda: results.append(
+            inbox.put({'n': 2})))
+        thread.start()
+        thread.join(0.1)
+        inbox.close()
+        thread.join(1.0)
+
+        assert results == [False]
+        assert inbox.stats['dropped'] == 2
+
+    def test_block_nowait(self) -> None:
+        inbox = Inbox(capacity=1, overflow='block')
+
+        assert inbox.put({'n': 0}, block=False)
+        assert not inbox.put({'n': 1}, block=False)
+        assert inbox.stats['dropped'] == 1
+
+    def test_spill(self, tmp_path) -> None:
+        inbox = Inbox(capacity=2, overflow='spill',
+                      spill_path=str(tmp_path / 'inbox'))
+
+        for i in range(6):
+            assert inbox.put({'n': i})
+
+        assert inbox.stats['depth'] == 6
+        assert inbox.stats['spilled'] == 4
+
+        # Order is kept, even if new messages arrive while reading back.
+        assert inbox.get()['n'] == 0
+        inbox.put({'n': 6})
+
+        assert [inbox.get()['n'] for _ in range(6)] == list(range(1, 7))
+        assert len(inbox) == 0
+
+    def test_invalid_policy(self) -> None:
+        with pytest.raises(ValueError):
+            Inbox(overflow='foo')
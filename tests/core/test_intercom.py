@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""Tests the messenger classes."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import time
+
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import paho.mqtt.client as paho
+import pytest
+
+from core.intercom import CODECS, MQTTMessenger, decode_message
+
+
+def get_manager(config: Dict[str, Any]) -> SimpleNamespace:
+    """Returns a manager object that returns the given messenger
+    configuration.
+
+    Args:
+        config: The messenger configuration.
+
+    Returns:
+        Manager object with configuration and schema manager.
+    """
+    config_manager = SimpleNamespace(get_valid_config=lambda *args: config)
+    schema_manager = SimpleNamespace(get_schema_path=lambda path: path,
+                                     add_schema=lambda *args: None)
+
+    return SimpleNamespace(config=config_manager, schema=schema_manager)
+
+
+@pytest.fixture()
+def messenger() -> MQTTMessenger:
+    config = {
+        'host': '127.0.0.1',
+        'port': 1883,
+        'keepAlive': 60,
+        'topic': 'openadms',
+        'tls': False,
+        'shared': True
+    }
+
+    return MQTTMessenger(get_manager(config), 'pytest')
+
+
+@pytest.fixture()
+def message() -> Dict[str, Any]:
+    return {
+        'header': {'type': 'observation'},
+        'payload': {
+            'name': 'getValues',
+            'responseSets': {
+                'temperature': {'type': 'float', 'unit': 'C', 'value': 21.5}
+            },
+            'receivers': ['preProcessor', 'fileExporter'],
+            'nextReceiver': 1
+        }
+    }
+
+
+class TestCodec:
+
+    @pytest.mark.parametrize('name', ['cbor', 'json', 'msgpack'])
+    def test_round_trip(self, name: str, message: Dict[str, Any]) -> None:
+        codec = CODECS[name]
+
+        if not codec.is_available:
+            pytest.skip(f'Python module for format "{name}" is missing')
+
+        data = codec.encode(message)
+
+        assert data.startswith(codec.marker)
+        assert decode_message(data) == message
+
+    def test_binary_is_smaller(self, message: Dict[str, Any]) -> None:
+        if not CODECS['msgpack'].is_available:
+            pytest.skip('Python module "msgpack" is missing')
+
+        size = len(CODECS['msgpack'].encode(message))
+        assert size < len(CODECS['json'].encode(message))
+
+    def test_invalid(self) -> None:
+        with pytest.raises(ValueError):
+            decode_message(b'{invalid')
+
+
+class TestMQTTMessenger:
+
+    def test_dispatch(self, messenger: MQTTMessenger) -> None:
+        inboxes = {'a': [], 'b': []}
+
+        messenger.subscribe('openadms/a', inboxes['a'].append)
+        messenger.subscribe('openadms/b', inboxes['b'].append)
+
+        for topic in ['openadms/a', 'openadms/b', 'openadms/b', 'openadms/c']:
+            msg = SimpleNamespace(topic=topic, payload=b'{"payload": {}}')
+            messenger._on_message(messenger.client, None, msg)
+
+        assert len(inboxes['a']) == 1
+        assert len(inboxes['b']) == 2
+
+    def test_unsubscribe(self, messenger: MQTTMessenger) -> None:
+        inbox = []
+
+        messenger.subscribe('openadms/a', inbox.append)
+        messenger.unsubscribe('openadms/a')
+
+        msg = SimpleNamespace(topic='openadms/a', payload=b'{}')
+        messenger._on_message(messenger.client, None, msg)
+
+        assert messenger.is_shared
+        assert inbox == []
+
+    def test_codec(self, messenger: MQTTMessenger) -> None:
+        assert messenger.codec.name == 'json'
+
+    def test_spool(self, tmp_path) -> None:
+        config = {
+            'host': '127.0.0.1',
+            'port': 1883,
+            'keepAlive': 60,
+            'topic': 'openadms',
+            'tls': False,
+            'qos': 1,
+            'spoolPath': str(tmp_path),
+            'spoolSize': 3
+        }
+
+        messenger = MQTTMessenger(get_manager(config), 'pytest')
+
+        # Not connected, so all messages are spooled, and the oldest one is
+        # dropped.
+        for i in range(4):
+            messenger.publish('openadms/a', f'{{"n": {i}}}')
+
+        assert len(messenger.spool) == 3
+        messenger.spool.close()
+
+        # Spooled messages are restored and sent in their original order.
+        messenger = MQTTMessenger(get_manager(config), 'pytest')
+        published = []
+
+        def publish(topic, payload, qos, retain):
+            published.append((topic, payload, qos))
+            return SimpleNamespace(rc=0, is_published=lambda: True)
+
+        messenger.client.publish = publish
+        messenger._is_connected = True
+        messenger._replay()
+
+        assert published == [('openadms/a', f'{{"n": {i}}}'.encode(), 1)
+                             for i in range(1, 4)]
+        assert len(messenger.spool) == 0
+
+        # A message spooled while connected restarts the replay.
+        published.clear()
+        messenger._spool_message('openadms/a', '{"n": 4}', 1, False)
+        messenger.publish('openadms/a', '{"n": 5}')
+
+        for _ in range(50):
+            if len(published) == 2:
+                break
+
+            time.sleep(0.1)
+
+        assert [payload for _, payload, _ in published] == [b'{"n": 4}',
+                                                            b'{"n": 5}']
+        assert len(messenger.spool) == 0
+
+        # Messages with QoS 1 are queued by the client on connection loss.
+        messenger.client.publish = lambda *args: SimpleNamespace(
+            rc=paho.MQTT_ERR_NO_CONN)
+        messenger.publish('openadms/a', '{"n": 6}')
+
+        assert len(messenger.spool) == 0
+
+        # Messages the client has not accepted are read from the spool again,
+        # until the client is disconnected.
+        messenger.REPLAY_RETRY_DELAY = 0.01
+        messenger._spool_message('openadms/a', '{"n": 7}', 1, False)
+        calls = []
+
+        def publish_no_conn(*args):
+            calls.append(args)
+
+            if len(calls) == 3:
+                messenger._is_connected = False
+
+            return SimpleNamespace(rc=paho.MQTT_ERR_NO_CONN,
+                                   is_published=lambda: False)
+
+        messenger.client.publish = publish_no_conn
+        messenger._is_connected = True
+        messenger._replay()
+
+        assert len(calls) == 3
+        assert len(messenger.spool) == 1
+        assert not messenger._is_replaying
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+"""Tests the logging classes."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import logging
+import pickle
+import queue
+
+from testfixtures import LogCapture
+
+from core.logging import (BufferedRotatingFileHandler, LazyLogger, LazyValue,
+                          LogQueueListener, LogRecordBuffer,
+                          NonBlockingQueueHandler, RingBufferLogHandler)
+from core.observation import Observation
+
+
+class TestLazyLogger:
+
+    def test_context(self) -> None:
+        logger = LazyLogger('test')
+        obs = Observation()
+        obs.set('name', 'getDistance')
+        obs.set('target', 'p1')
+
+        with LogCapture() as log_capture:
+            logger.info('Observation "{name}" of target "{target}" has '
+                        '{count} value(s)', obs, count=2)
+            logger.info('No {fields} in {}')
+
+        log_capture.check(
+            ('test', 'INFO', 'Observation "getDistance" of target "p1" has 2 '
+                             'value(s)'),
+            ('test', 'INFO', 'No {fields} in {}')
+        )
+
+    def test_lazy(self) -> None:
+        calls = []
+        logger = LazyLogger('test')
+
+        with LogCapture(level=logging.INFO):
+            logger.debug('Value {value}',
+                         value=LazyValue(calls.append, 'debug'))
+            logger.info('Value {value}',
+                        value=LazyValue(calls.append, 'info'))
+
+        assert calls == ['info']
+
+    def test_pickle(self) -> None:
+        logger = pickle.loads(pickle.dumps(LazyLogger('test')))
+        assert logger.name == 'test'
+
+
+def get_record(msg: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('test', level, __file__, 0, msg, None, None)
+
+
+class TestLogRecordBuffer:
+
+    def test_read(self) -> None:
+        buffer = LogRecordBuffer(3)
+
+        for i, module in enumerate(['a', 'b', 'a', 'b', 'a']):
+            assert buffer.append(float(i), logging.INFO + i, module,
+                                 f'msg {i}') == i
+
+        assert len(buffer) == 3
+        assert buffer.modules == ['a', 'b']
+
+        # The oldest records have been overwritten.
+        entries, seq = buffer.read()
+        assert [entry.seq for entry in entries] == [2, 3, 4]
+        assert entries[0] == (2, 2.0, logging.INFO + 2, 'a', 'msg 2')
+        assert seq == 5
+
+        # Incremental reads.
+        entries, seq = buffer.read(4)
+        assert [entry.message for entry in entries] == ['msg 4']
+        assert buffer.read(seq) == ([], 5)
+
+        # Filters.
+        entries, _ = buffer.read(level=logging.INFO + 3)
+        assert [entry.seq for entry in entries] == [3, 4]
+
+        entries, _ = buffer.read(module='b')
+        assert [entry.seq for entry in entries] == [3]
+        assert buffer.read(module='c') == ([], 5)
+
+        entries, seq = buffer.read(limit=2)
+        assert [entry.seq for entry in entries] == [2, 3]
+        assert seq == 4
+
+
+class TestRingBufferLogHandler:
+
+    def test_get_logs(self) -> None:
+        handler = RingBufferLogHandler(logging.INFO, 2)
+
+        for i in range(3):
+            handler.handle(get_record(f'msg {i}', logging.WARNING))
+
+        lines = handler.get_logs().split('\n')
+
+        assert len(lines) == 2
+        assert lines[0].endswith(' -  WARNING - ' + ' ' * 22 + 'test - msg 1')
+
+
+class TestBufferedRotatingFileHandler:
+
+    def test_emit(self, tmp_path) -> None:
+        path = tmp_path / 'test.log'
+        handler = BufferedRotatingFileHandler(str(path), max_bytes=100,
+                                              backup_count=1)
+
+        # Records are buffered until flushed.
+        handler.handle(get_record('first'))
+        assert path.read_text() == ''
+
+        handler.flush()
+        assert path.read_text() == 'first\n'
+
+        # Errors are written immediately.
+        handler.handle(get_record('second', logging.ERROR))
+        assert path.read_text() == 'first\nsecond\n'
+
+        # The file is rotated once the maximum size would be exceeded.
+        handler.handle(get_record('x' * 95))
+        handler.close()
+
+        assert path.read_text() == 'x' * 95 + '\n'
+        assert (tmp_path / 'test.log.1').read_text() == 'first\nsecond\n'
+
+
+class TestLogQueueListener:
+
+    def test_listener(self) -> None:
+        log_queue = queue.Queue()
+        records = []
+        handler = logging.Handler(logging.WARNING)
+        handler.emit = records.append
+
+        listener = LogQueueListener(log_queue, [handler], flush_interval=0.1)
+        listener.start()
+
+        for level in [logging.INFO, logging.WARNING, logging.ERROR]:
+            log_queue.put(get_record('test', level))
+
+        listener.stop()
+
+        assert [record.levelno for record in records] == [logging.WARNING,
+                                                          logging.ERROR]
+
+
+class TestNonBlockingQueueHandler:
+
+    def test_dropped(self) -> None:
+        handler = NonBlockingQueueHandler(queue.Queue(2))
+
+        for _ in range(5):
+            handler.handle(get_record('test'))
+
+        assert handler.queue.qsize() == 2
+        assert handler.dropped == 3
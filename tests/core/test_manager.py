@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+
+"""Tests the manager classes."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import json
+
+import pytest
+
+from core.manager import SchemaManager
+
+
+@pytest.fixture(scope='module')
+def schema_manager() -> SchemaManager:
+    return SchemaManager()
+
+
+class TestSchemaManager:
+
+    def test_is_valid(self, schema_manager: SchemaManager) -> None:
+        with open('tests/data/observations.json') as fh:
+            data = json.loads(fh.read())[0]
+
+        data['sensorName'] = 'dtm'
+        data['sensorType'] = 'weatherStation'
+
+        assert schema_manager.is_valid(data, 'observation') is True
+
+        data['nextReceiver'] = 'foo'
+        assert schema_manager.is_valid(data, 'observation') is False
+
+    def test_is_valid_unknown_schema(self,
+                                     schema_manager: SchemaManager) -> None:
+        assert schema_manager.is_valid({}, 'foo') is False
+
+    def test_set_trusted(self, schema_manager: SchemaManager) -> None:
+        assert schema_manager.is_trusted('preProcessor') is False
+
+        schema_manager.set_trusted('preProcessor')
+        assert schema_manager.is_trusted('preProcessor') is True
+
+        schema_manager.set_trusted('preProcessor', False)
+        assert schema_manager.is_trusted('preProcessor') is False
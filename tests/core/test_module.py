@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+"""Tests the module class that bundles a worker with a messenger."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import threading
+
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+from core.inbox import Inbox
+from core.module import Module
+from core.prototype import Prototype
+
+
+class Messenger:
+    """Messenger that does not connect to any message broker."""
+
+    topic = 'openadms'
+
+    def subscribe(self, topic: str, downlink: Callable = None) -> None:
+        pass
+
+
+class Recorder(Prototype):
+    """Worker that records the handled messages."""
+
+    def __init__(self):
+        super().__init__('recorder', 'recorder',
+                         SimpleNamespace(config=None, module=None, node=None,
+                                         project=None, sensor=None,
+                                         schema=None))
+        self.messages = []
+        self.handled = threading.Event()
+
+    def handle(self, message: Dict) -> None:
+        self.messages.append(message)
+        self.handled.set()
+
+
+class TestModule:
+
+    def test_stop_executor(self) -> None:
+        worker = Recorder()
+        module = Module(Messenger(), worker, concurrency=2)
+
+        module._handle({'payload': {'n': 1}})
+        assert worker.handled.wait(5.0)
+
+        module.stop()
+
+        # Messages that arrive after the stop are dropped.
+        module._handle({'payload': {'n': 2}})
+        assert worker.messages == [{'payload': {'n': 1}}]
+
+    def test_retrieve_backpressure(self) -> None:
+        inbox = Inbox(capacity=1, block_timeout=5.0)
+        module = Module(Messenger(), Recorder(), inbox=inbox)
+        module.retrieve({'payload': {'n': 1}}, is_local=True)
+
+        # Messages of the MQTT messenger are dropped at once.
+        module.retrieve({'payload': {'n': 2}})
+        assert inbox.stats['dropped'] == 1
+
+        # Local senders wait until space is available.
+        sender = threading.Thread(target=module.retrieve,
+                                  args=({'payload': {'n': 3}}, True))
+        sender.start()
+        sender.join(0.1)
+        assert sender.is_alive()
+
+        assert inbox.get(timeout=1.0) == {'payload': {'n': 1}}
+        sender.join(5.0)
+        assert not sender.is_alive()
+        assert inbox.get(timeout=1.0) == {'payload': {'n': 3}}
+        assert inbox.stats['dropped'] == 1
@@ -9,6 +9,7 @@ __license__ = 'BSD-2-Clause'
 import pytest
 
 from core.observation import Observation
+from core.sensor import Sensor
 
 
 @pytest.fixture(scope='module')
@@ -21,3 +22,61 @@ class TestObservation:
     def test_create_response_test(self, observation: Observation) -> None:
         response_set = observation.create_response_set('test', 'none', 0.0)
         assert response_set == {'type': 'test', 'unit': 'none', 'value': 0.0}
+
+    def test_clone(self) -> None:
+        obs = Observation()
+        obs.set('requestSets', {'draft': {'request': '?', 'response': None}})
+        obs.set('responseSets', {'temp': {'type': 'float', 'value': None}})
+        obs.set('receivers', ['preProcessor'])
+
+        obs_copy = obs.clone()
+        obs_copy.get('requestSets')['draft']['response'] = '23.1'
+        obs_copy.get('responseSets')['temp']['value'] = 23.1
+        obs_copy.set('nextReceiver', 1)
+
+        assert obs.get_value('requestSets', 'draft', 'response') is None
+        assert obs.get_response_value('temp') is None
+        assert obs.get('nextReceiver') == 0
+        assert obs_copy.get('receivers') is obs.get('receivers')
+
+    def test_slim(self) -> None:
+        sensor = Sensor('nivel', {
+            'type': 'inclinometer',
+            'observations': [{
+                'name': 'getValues',
+                'requestsOrder': ['getTemp'],
+                'requestSets': {
+                    'getTemp': {
+                        'enabled': True,
+                        'request': 'TEMP ?\\r',
+                        'responseDelimiter': '\\r',
+                        'responsePattern': '(?P<temp>[+-]?\\d+\\.+\\d)',
+                        'sleepTime': 1.0,
+                        'timeout': 1.0
+                    }
+                },
+                'responseSets': {}
+            }]
+        })
+        template = sensor.get_observation('getValues')
+        version = sensor.get_template_version('getValues')
+
+        obs = template.clone()
+        obs.get('requestSets')['getTemp']['response'] = '+23.1'
+        size = len(obs.to_json())
+
+        obs.slim(version)
+
+        assert obs.is_slim
+        assert obs.get('requestSets') == {'getTemp': {'response': '+23.1'}}
+        assert obs.get('template') == {'sensor': 'nivel',
+                                       'observation': 'getValues',
+                                       'version': version}
+        assert len(obs.to_json()) < size
+
+        obs.rehydrate(template)
+
+        assert not obs.is_slim
+        assert obs.get_value('requestSets', 'getTemp', 'response') == '+23.1'
+        assert obs.get_value('requestSets', 'getTemp', 'request') == 'TEMP ?\r'
+        assert template.get_value('requestSets', 'getTemp', 'response') is None
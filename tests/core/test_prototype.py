@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""Tests the prototype class of all modules."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+from types import SimpleNamespace
+
+from core.intercom import LocalMessage
+from core.logging import LazyLogger
+from core.observation import Observation
+from core.prototype import Prototype
+
+
+class TestPrototype:
+
+    def test_trusted_sender(self) -> None:
+        validated = []
+        worker = SimpleNamespace(
+            logger=LazyLogger('test'),
+            is_sequence=lambda arg: Prototype.is_sequence(None, arg),
+            is_trusted_sender=lambda sender: sender == 'preProcessor',
+            is_valid=lambda data, data_type: validated.append(data) or True
+        )
+        message = {
+            'header': {'type': 'observation', 'from': 'preProcessor'},
+            'payload': {'name': 'a'}
+        }
+
+        # The sender in the header of a message from the message broker can
+        # be forged.
+        assert Prototype._parse(worker, message)
+        assert validated == [{'name': 'a'}]
+
+        assert Prototype._parse(worker, LocalMessage(message))
+        assert validated == [{'name': 'a'}]
+
+    def test_publish_observation_slim(self) -> None:
+        template = Observation({
+            'name': 'getValues',
+            'sensorName': 'nivel',
+            'requestSets': {'getTemp': {'request': 'TEMP ?\r'}}
+        })
+        modules = {
+            'preProcessor': SimpleNamespace(
+                worker=SimpleNamespace(is_slim_safe=True)),
+            'fileExporter': SimpleNamespace(
+                worker=SimpleNamespace(is_slim_safe=False))
+        }
+        sensor_manager = SimpleNamespace(
+            slim=lambda obs: obs.slim('1'),
+            rehydrate=lambda obs: obs.rehydrate(template) or True
+        )
+        manager = SimpleNamespace(config=None, module=modules, node=None,
+                                  project=None, sensor=sensor_manager,
+                                  schema=None)
+        published = {}
+
+        worker = Prototype('com1', 'modules.port.SerialPort', manager)
+        worker.is_slimming = True
+        worker.uplink = lambda target, message, *args: published.update(
+            {target: dict(message['payload'])})
+
+        obs = template.clone()
+        obs.data['receivers'] = ['preProcessor', 'fileExporter', 'node2']
+        obs.data['nextReceiver'] = 0
+        obs.data['requestSets']['getTemp']['response'] = '+23.1'
+
+        # Slim observation to a local module that accepts it.
+        worker.publish_observation(obs)
+        assert 'template' in published['preProcessor']
+        assert 'request' not in \
+            published['preProcessor']['requestSets']['getTemp']
+
+        # Complete observation to an exporter and to another node.
+        worker.publish_observation(obs)
+        assert 'template' not in published['fileExporter']
+        assert published['fileExporter']['requestSets']['getTemp'] == {
+            'request': 'TEMP ?\r', 'response': '+23.1'}
+
+        worker.publish_observation(obs)
+        assert 'template' not in published['node2']
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""Tests the asyncio runtime."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import asyncio
+import threading
+
+from types import SimpleNamespace
+from typing import Callable, Dict
+
+import verboselogs
+
+from core.module import Module
+from core.prototype import Prototype
+from core.runtime import AsyncRuntime
+
+# The runtime logs with the additional levels of verboselogs.
+verboselogs.install()
+
+
+class Messenger:
+    """Messenger that does not connect to any message broker."""
+
+    topic = 'openadms'
+
+    def __init__(self):
+        self.downlinks = {}
+
+    async def run_async(self) -> None:
+        pass
+
+    def disconnect(self) -> None:
+        pass
+
+    def subscribe(self, topic: str, downlink: Callable = None) -> None:
+        self.downlinks[topic] = downlink
+
+
+class Recorder(Prototype):
+    """Worker that records the received messages."""
+
+    is_async = True
+
+    def __init__(self):
+        super().__init__('recorder', 'recorder',
+                         SimpleNamespace(config=None, module=None, node=None,
+                                         project=None, sensor=None,
+                                         schema=None))
+        self.messages = []
+        self.received = threading.Event()
+
+    def handle(self, message: Dict) -> None:
+        self.messages.append(message)
+        self.received.set()
+
+    async def run_async(self) -> None:
+        while self.is_running:
+            await self.wait_until_async(lambda: False)
+
+
+class TestAsyncRuntime:
+
+    def test_run(self) -> None:
+        messenger = Messenger()
+        worker = Recorder()
+        module = Module(messenger, worker)
+
+        runtime = AsyncRuntime(messenger, workers=2)
+        runtime.start()
+        runtime.run(module)
+
+        # Deliver a message from a foreign thread.
+        messenger.downlinks['openadms/recorder']({'payload': {'n': 1}})
+
+        assert worker.received.wait(5.0)
+        assert worker.messages == [{'payload': {'n': 1}}]
+        assert worker.is_running
+
+        module.stop_worker()
+        module.stop()
+        runtime.stop()
+        runtime._thread.join(10.0)
+
+        assert not runtime.is_running
+        assert not worker.is_running
+
+    def test_wait_until_async(self) -> None:
+        worker = Recorder()
+        flags = []
+
+        def notify() -> None:
+            flags.append(True)
+            worker.wake_up()
+
+        async def main() -> None:
+            worker.start_async(asyncio.get_running_loop())
+            threading.Timer(0.05, notify).start()
+
+            assert await worker.wait_until_async(lambda: bool(flags), 5.0)
+            assert not await worker.wait_until_async(lambda: False, 0.01)
+
+            worker.stop()
+
+        asyncio.run(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+"""Tests the classes in module `modules.port`."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import pytest
+
+from typing import Iterator
+
+from core.manager import Manager
+from modules.port import SerialPort
+
+
+class FakeSerial:
+    """Replays chunks of bytes like a serial port."""
+
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+
+    def read(self, size: int = 1) -> bytes:
+        return self._chunks.pop(0) if self._chunks else b''
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._chunks[0]) if self._chunks else 0
+
+
+@pytest.fixture(scope='function')
+def serial_port(manager: Manager) -> Iterator[SerialPort]:
+    """Returns a SerialPort object.
+
+    Args:
+        manager (Manager): Instance of ``core.Manager``.
+
+    Returns:
+        An instance of class ``module.port.SerialPort``.
+    """
+    port = SerialPort('com1', 'modules.port.SerialPort', manager)
+    port._serial_port_config = port._get_port_config()
+    yield port
+
+    # Don't close the fake serial port.
+    port._serial = None
+
+
+class TestSerialPort:
+
+    def test_read_delimiter(self, serial_port: SerialPort) -> None:
+        serial_port._serial = FakeSerial([b'12.3\r', b'\n45', b'.6\r\n7'])
+
+        assert serial_port._read(eol='\r\n', timeout=1.0) == '12.3\r\n'
+        assert serial_port._read(eol='\r\n', timeout=1.0) == '45.6\r\n'
+        assert serial_port._rx_buffer == bytearray(b'7')
+
+    def test_read_length(self, serial_port: SerialPort) -> None:
+        serial_port._serial = FakeSerial([b'abcdefgh'])
+
+        assert serial_port._read(length=3, timeout=1.0) == 'abc'
+        assert serial_port._read(length=3, timeout=1.0) == 'def'
+
+    def test_read_partial(self, serial_port: SerialPort) -> None:
+        serial_port._serial = FakeSerial([b'12.'])
+
+        assert serial_port._read(eol='\n', timeout=0.05,
+                                 keep_partial=True) == ''
+        serial_port._serial = FakeSerial([b'3\n'])
+        assert serial_port._read(eol='\n', timeout=1.0) == '12.3\n'
+        assert serial_port._read(eol='\n', timeout=0.05) == ''
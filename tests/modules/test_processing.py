@@ -6,6 +6,8 @@ __author__ = 'Philipp Engel'
 __copyright__ = 'Copyright (c) 2017 Hochschule Neubrandenburg'
 __license__ = 'BSD-2-Clause'
 
+import logging
+
 from typing import List
 
 import pytest
@@ -92,6 +94,54 @@ class TestPreProcessor:
         assert obs_out.get_response_value('temperature') == 23.1
         assert obs_out.get_response_value('pressure') == 1011.3
 
+    def test_get_parser(self,
+                        pre_processor: PreProcessor,
+                        observations: List[Observation]) -> None:
+        """Tests the caching of response patterns."""
+        obs = observations[0]
+        set_name, request_set = next(iter(obs.get('requestSets').items()))
+        response_pattern = request_set.get('responsePattern')
+
+        parser = pre_processor.get_parser(obs, set_name, response_pattern)
+
+        assert pre_processor.get_parser(obs,
+                                        set_name,
+                                        response_pattern) is parser
+        assert parser[0] is pre_processor._patterns[response_pattern]
+
+    def test_get_parser_response_sets(self,
+                                      pre_processor: PreProcessor,
+                                      observations: List[Observation]) -> None:
+        """Tests that the converters follow the response sets of each
+        observation."""
+        obs = pre_processor.process_observation(observations[0].clone())
+        parsers = dict(pre_processor._parsers)
+
+        assert obs.get_response_value('pressure') == 1011.3
+
+        # Response set is missing.
+        obs = observations[0].clone()
+        del obs.data['responseSets']['pressure']
+        obs = pre_processor.process_observation(obs)
+
+        assert obs.get_response_value('temperature') == 23.1
+        assert 'pressure' not in obs.get('responseSets')
+
+        # Response set has a different type.
+        obs = observations[0].clone()
+        obs.data['responseSets']['pressure']['type'] = 'string'
+        obs = pre_processor.process_observation(obs)
+
+        assert obs.get_response_value('pressure') == '+1011.3'
+
+        # The parsers are cached once per request set.
+        assert pre_processor._parsers == parsers
+
+    def test_get_converter(self, pre_processor: PreProcessor) -> None:
+        assert pre_processor.get_converter('Float')('1,5') == 1.5
+        assert pre_processor.get_converter('integer')('7') == 7
+        assert pre_processor.get_converter('string')('7') == '7'
+
     def test_is_float(self, pre_processor: PreProcessor) -> None:
         assert pre_processor.is_float('10.5') is True
         assert pre_processor.is_float('foo') is False
@@ -184,6 +234,34 @@ class TestResponseValueInspector:
                  f'maximum ({gt_max_val} > {max_val})')
             )
 
+    def test_process_batch(self,
+                           rv_inspector: ResponseValueInspector,
+                           observations: List[Observation]) -> None:
+        """Check whether the batch processing creates the same critical log
+        messages, with the original response values."""
+        batch = [observations[1].clone() for _ in range(3)]
+
+        for obs, value in zip(batch, [25.0, 0, 200.0]):
+            obs.data['responseSets']['slopeDist']['value'] = value
+
+        obs_name = batch[0].get('name')
+        obs_target = batch[0].get('target')
+
+        with LogCapture(level=logging.CRITICAL) as log_capture:
+            assert rv_inspector.process_batch(batch) == batch
+
+            log_capture.check(
+                (rv_inspector.name,
+                 'CRITICAL',
+                 f'Response value "slopeDist" in observation "{obs_name}" of '
+                 f'target "{obs_target}" is less than minimum (0 < 10.0)'),
+                (rv_inspector.name,
+                 'CRITICAL',
+                 f'Response value "slopeDist" in observation "{obs_name}" of '
+                 f'target "{obs_target}" is greater than maximum (200.0 > '
+                 f'100.0)')
+            )
+
     def test_is_number(self,
                        rv_inspector: ResponseValueInspector) -> None:
         assert rv_inspector.is_number('10') is True
@@ -215,5 +293,29 @@ class TestUnitConverter:
                                  observations: List[Observation]) -> None:
         pass
 
+    def test_process_batch(self, unit_converter: UnitConverter) -> None:
+        """Check whether the batch processing converts the response values
+        like the processing of single observations."""
+        def get_observations() -> List[Observation]:
+            observations = []
+
+            for value, unit in [(1.2345, 'm'), (0.000123, 'm'), (7.5, 'cm'),
+                                (0, 'm'), ('2.5', 'm'), (None, 'm')]:
+                obs = Observation()
+                obs.data['responseSets']['distance'] = \
+                    Observation.create_response_set('float', unit, value)
+                observations.append(obs)
+
+            return observations
+
+        single = [unit_converter.process_observation(obs)
+                  for obs in get_observations()]
+        batch = unit_converter.process_batch(get_observations())
+
+        assert ([obs.get('responseSets') for obs in batch] ==
+                [obs.get('responseSets') for obs in single])
+        assert batch[0].get_response_value('distance') == 1234.5
+        assert batch[0].get('responseSets')['distance']['unit'] == 'mm'
+
     def test_scale(self, unit_converter: UnitConverter) -> None:
         assert unit_converter.scale(10, 10) == 100
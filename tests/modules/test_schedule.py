@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Tests the classes in module `modules.schedule`."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import threading
+import time
+
+from datetime import datetime
+
+from core.logging import LazyLogger
+from core.observation import Observation
+from modules.schedule import Job, JobLane, Scheduler
+
+
+def get_job(weekdays, is_enabled=True) -> Job:
+    obs = Observation({'name': 'test', 'enabled': True, 'sleepTime': 0.5})
+    return Job('test', 'port', obs, is_enabled, '2019-01-01', '2019-12-31',
+               weekdays, lambda *args: None)
+
+
+class TestJob:
+
+    def test_next_run_time(self) -> None:
+        # 2019-05-06 is a Monday.
+        job = get_job({'monday': [{'startTime': '08:00:00',
+                                   'endTime': '10:00:00'},
+                                  {'startTime': '14:00:00',
+                                   'endTime': '16:00:00'}],
+                       'wednesday': []})
+
+        t = datetime(2019, 5, 6, 9).timestamp()
+        assert job.get_next_run_time(t) == t
+
+        t = datetime(2019, 5, 6, 11).timestamp()
+        assert job.get_next_run_time(t) == datetime(2019, 5, 6, 14).timestamp()
+
+        t = datetime(2019, 5, 6, 17).timestamp()
+        assert job.get_next_run_time(t) == datetime(2019, 5, 8).timestamp()
+
+        t = datetime(2019, 5, 9, 12).timestamp()
+        assert job.get_next_run_time(t) == datetime(2019, 5, 13, 8).timestamp()
+
+    def test_next_run_time_range(self) -> None:
+        job = get_job({})
+
+        t = datetime(2018, 6, 1).timestamp()
+        assert job.get_next_run_time(t) == job._start_ts
+        assert job.get_next_run_time(datetime(2020, 1, 2).timestamp()) is None
+
+    def test_disabled(self) -> None:
+        job = get_job({}, is_enabled=False)
+        assert job.get_next_run_time(datetime(2019, 6, 1).timestamp()) is None
+        assert job.sleep_time == 0.5
+
+
+class TestJobLane:
+
+    def test_order(self) -> None:
+        lane = JobLane('port')
+        jobs = [get_job({}) for _ in range(3)]
+
+        lane.push(jobs[0], 2.0)
+        lane.push(jobs[1], 1.0)
+        lane.push(jobs[2], 1.0)
+
+        assert lane.peek() == (1.0, jobs[1])
+        assert [lane.pop() for _ in range(3)] == [jobs[1], jobs[2], jobs[0]]
+        assert lane.is_empty
+
+
+class TestScheduler:
+
+    def test_min_sleep_time(self) -> None:
+        runs = []
+        obs = Observation({'name': 'test', 'enabled': True, 'sleepTime': 0,
+                           'receivers': []})
+        job = Job('test', 'port', obs, True, '2000-01-01', '2100-12-31', {},
+                  lambda *args: runs.append(args))
+
+        # Scheduler without configuration.
+        scheduler = Scheduler.__new__(Scheduler)
+        scheduler.logger = LazyLogger('test')
+        scheduler._jobs = [job]
+        scheduler._jobs_lock = threading.Lock()
+
+        lane = JobLane('port')
+        scheduler._schedule_lane(lane, time.time())
+
+        assert scheduler._step_lane(lane) == 0.0
+        assert len(runs) == 1
+
+        # Jobs without sleep time are not run back-to-back.
+        timeout = scheduler._step_lane(lane)
+
+        assert 0.0 < timeout <= Scheduler.MIN_SLEEP_TIME
+        assert len(runs) == 1
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""Tests the classes in module `modules.server`."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+import gzip
+import json
+import logging
+import threading
+
+from http.client import HTTPConnection
+from types import SimpleNamespace
+from typing import Iterator
+
+import pytest
+
+from core.logging import RingBufferLogHandler
+from modules.server import (ContentCache, RequestHandler, StatusMonitor,
+                            ThreadingHTTPServer)
+
+
+def get_module(is_running: bool = True) -> SimpleNamespace:
+    """Returns a stub of a module with message counters."""
+    worker = SimpleNamespace(type='modules.testing.ErrorGenerator',
+                             is_running=is_running)
+    inbox = SimpleNamespace(stats={'depth': 0})
+    return SimpleNamespace(worker=worker, inbox=inbox,
+                           stats={'handled': 0, 'published': 0, 'received': 0})
+
+
+@pytest.fixture()
+def httpd(tmp_path) -> Iterator[ThreadingHTTPServer]:
+    """Returns a running HTTP server with stubbed managers.
+
+    Returns:
+        An instance of class ``ThreadingHTTPServer``.
+    """
+    (tmp_path / 'index.html').write_text('<p>$node_name</p>\n$modules_table')
+    (tmp_path / 'style.css').write_text('body { margin: 0; }\n' * 100)
+
+    module = get_module()
+    info = SimpleNamespace(id='id', name='name', description='description')
+    manager = SimpleNamespace(
+        config=SimpleNamespace(path='config.json'),
+        module=SimpleNamespace(modules={'a': module}, runtime=None),
+        sensor=SimpleNamespace(sensors={}),
+        project=SimpleNamespace(project=info),
+        node=SimpleNamespace(node=info)
+    )
+
+    log_handler = RingBufferLogHandler(logging.INFO, 10)
+    cache = ContentCache(str(tmp_path))
+    monitor = StatusMonitor(manager.module, 0.1)
+
+    def handler(*args):
+        RequestHandler(manager, log_handler, cache, monitor, *args)
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    httpd.module = module
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monitor.start()
+    yield httpd
+    monitor.stop()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(httpd: ThreadingHTTPServer, path: str, **headers):
+    """Sends a GET request and returns the response and its body."""
+    connection = HTTPConnection('127.0.0.1', httpd.server_address[1])
+    connection.request('GET', path, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+class TestContentCache:
+
+    def test_get_file(self, tmp_path) -> None:
+        (tmp_path / 'root').mkdir()
+        (tmp_path / 'root' / 'a.txt').write_text('a')
+        (tmp_path / 'secret.txt').write_text('secret')
+
+        cache = ContentCache(str(tmp_path / 'root'))
+        static_file = cache.get_file('/a.txt')
+
+        assert static_file.content == b'a'
+        assert static_file.compressed is None
+        assert static_file.mime == 'text/plain'
+        assert cache.get_file('/a.txt') is static_file
+        assert cache.get_file('/../secret.txt') is None
+        assert cache.get_file('/missing.txt') is None
+
+    def test_get_fragment(self) -> None:
+        cache = ContentCache('.')
+        calls = []
+
+        def render():
+            calls.append(None)
+            return len(calls)
+
+        assert cache.get_fragment('table', (1,), render) == 1
+        assert cache.get_fragment('table', (1,), render) == 1
+        assert cache.get_fragment('table', (2,), render) == 2
+
+
+class TestStatusMonitor:
+
+    def test_update(self) -> None:
+        module = get_module()
+        monitor = StatusMonitor(SimpleNamespace(modules={'a': module}), 1.0)
+
+        assert monitor.get_modules()[0]['status'] == 'running'
+
+        events = monitor.subscribe()
+        module.stats = {'handled': 0, 'published': 0, 'received': 2}
+        monitor.update()
+
+        assert events.get_nowait().startswith(b'event: metrics\n')
+        assert monitor.get_metrics()['modules']['a']['rates']['received'] > 0
+
+        module.worker.is_running = False
+        monitor.update()
+
+        assert events.get_nowait() == (b'event: state\ndata: {"name": "a", '
+                                       b'"status": "stopped"}\n\n')
+        assert events.empty()
+
+        monitor.unsubscribe(events)
+        monitor.stop()
+        assert not monitor.is_running
+
+
+class TestRequestHandler:
+
+    def test_api(self, httpd: ThreadingHTTPServer) -> None:
+        _, body = get(httpd, '/api/status')
+        status = json.loads(body)
+
+        assert status['node']['name'] == 'name'
+        assert status['modules'] == {'running': 1, 'stopped': 0}
+
+        _, body = get(httpd, '/api/modules')
+
+        assert json.loads(body)['modules'][0]['name'] == 'a'
+
+        _, body = get(httpd, '/api/metrics')
+
+        assert json.loads(body)['modules']['a']['counters']['received'] == 0
+
+        response, _ = get(httpd, '/api/log?level=foo')
+
+        assert response.status == 400
+
+    def test_event_stream(self, httpd: ThreadingHTTPServer) -> None:
+        connection = HTTPConnection('127.0.0.1', httpd.server_address[1],
+                                    timeout=5)
+        connection.request('GET', '/api/events')
+        response = connection.getresponse()
+
+        assert response.getheader('Content-Type') == 'text/event-stream'
+        assert response.readline() == b'event: modules\n'
+        response.readline()
+        response.readline()
+
+        httpd.module.stats = {'handled': 1, 'published': 1, 'received': 1}
+
+        assert response.readline() == b'event: metrics\n'
+        connection.close()
+
+    def test_index(self, httpd: ThreadingHTTPServer) -> None:
+        response, body = get(httpd, '/')
+
+        assert response.status == 200
+        assert b'<p>name</p>' in body
+        assert b'running' in body
+
+        # The modules table is rendered again after a state change.
+        httpd.module.worker.is_running = False
+        _, body = get(httpd, '/')
+
+        assert b'stopped' in body
+
+    def test_static_file(self, httpd: ThreadingHTTPServer) -> None:
+        response, body = get(httpd, '/style.css',
+                             **{'Accept-Encoding': 'gzip'})
+
+        assert response.status == 200
+        assert response.getheader('Content-Type') == 'text/css'
+        assert response.getheader('Content-Encoding') == 'gzip'
+        assert gzip.decompress(body) == b'body { margin: 0; }\n' * 100
+
+        etag = response.getheader('ETag')
+        response, body = get(httpd, '/style.css', **{'If-None-Match': etag})
+
+        assert response.status == 304
+        assert body == b''
+
+        response, _ = get(httpd, '/missing.css')
+
+        assert response.status == 404
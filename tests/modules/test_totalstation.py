@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""Tests the classes of the total station modules."""
+
+__author__ = 'Philipp Engel'
+__copyright__ = 'Copyright (c) 2019 Hochschule Neubrandenburg'
+__license__ = 'BSD-2-Clause'
+
+from typing import Dict, List
+
+import pytest
+
+from core.observation import Observation
+from modules.totalstation import (DistanceCorrector, RefractionCorrector,
+                                  SerialMeasurementProcessor)
+
+
+def get_observations(values: List[Dict[str, float]]) -> List[Observation]:
+    """Returns total station observations with the given response values.
+
+    Args:
+        values: Response values of each observation.
+
+    Returns:
+        List of observations.
+    """
+    observations = []
+
+    for i, response_values in enumerate(values):
+        obs = Observation()
+        obs.data['name'] = f'obs{i}'
+        obs.data['sensorType'] = 'totalstation'
+
+        for name, value in response_values.items():
+            obs.data['responseSets'][name] = \
+                Observation.create_response_set('float', 'm', value)
+
+        observations.append(obs)
+
+    return observations
+
+
+def get_response_sets(observations: List[Observation]) -> List[Dict]:
+    """Returns the response sets of the given observations, with the type of
+    each response value."""
+    return [{name: (rs, type(rs.get('value')))
+             for name, rs in obs.get('responseSets').items()}
+            for obs in observations]
+
+
+def assert_batch_equivalent(module, values: List[Dict[str, float]]) -> None:
+    """Asserts that `process_batch()` of the given module returns the same
+    response sets as `process_observation()` for each observation."""
+    single = [module.process_observation(obs)
+              for obs in get_observations(values)]
+    batch = module.process_batch(get_observations(values))
+
+    assert get_response_sets(batch) == get_response_sets(single)
+
+
+@pytest.fixture(scope='module')
+def distance_corrector(manager) -> DistanceCorrector:
+    """Returns a DistanceCorrector object.
+
+    Args:
+        manager (Manager): Instance of ``core.Manager``.
+
+    Returns:
+        An instance of class ``module.totalstation.DistanceCorrector``.
+    """
+    return DistanceCorrector('distanceCorrector',
+                             'modules.totalstation.DistanceCorrector',
+                             manager)
+
+
+@pytest.fixture(scope='module')
+def refraction_corrector(manager) -> RefractionCorrector:
+    """Returns a RefractionCorrector object.
+
+    Args:
+        manager (Manager): Instance of ``core.Manager``.
+
+    Returns:
+        An instance of class ``module.totalstation.RefractionCorrector``.
+    """
+    return RefractionCorrector('refractionCorrector',
+                               'modules.totalstation.RefractionCorrector',
+                               manager)
+
+
+@pytest.fixture(scope='module')
+def sm_processor(manager) -> SerialMeasurementProcessor:
+    """Returns a SerialMeasurementProcessor object.
+
+    Args:
+        manager (Manager): Instance of ``core.Manager``.
+
+    Returns:
+        An instance of class
+        ``module.totalstation.SerialMeasurementProcessor``.
+    """
+    return SerialMeasurementProcessor(
+        'serialMeasurementProcessor',
+        'modules.totalstation.SerialMeasurementProcessor',
+        manager)
+
+
+class TestDistanceCorrector:
+    """
+    Test for the ``module.totalstation.DistanceCorrector`` class.
+    """
+
+    values = [{'slopeDist': 100.0},
+              {'slopeDist': 0.0},
+              {'slopeDist': 1234.56789},
+              {}]
+
+    def test_process_batch(self,
+                           distance_corrector: DistanceCorrector) -> None:
+        assert_batch_equivalent(distance_corrector, self.values)
+
+    def test_process_batch_sea_level(
+            self, distance_corrector: DistanceCorrector) -> None:
+        distance_corrector._is_sea_level_correction = True
+        distance_corrector._sensor_height = 120.0
+
+        try:
+            assert_batch_equivalent(distance_corrector, self.values)
+        finally:
+            distance_corrector._is_sea_level_correction = False
+
+
+class TestRefractionCorrector:
+    """
+    Test for the ``module.totalstation.RefractionCorrector`` class.
+    """
+
+    def test_process_batch(self,
+                           refraction_corrector: RefractionCorrector) -> None:
+        assert_batch_equivalent(refraction_corrector, [
+            {'z': 10.0, 'slopeDist': 250.0},
+            {'z': -3.25, 'slopeDist': 0.0},
+            {'z': 0.0, 'slopeDist': 100.0},
+            {'z': 1.5},
+            {'z': 95.12345, 'slopeDist': 2345.6789}
+        ])
+
+
+class TestSerialMeasurementProcessor:
+    """
+    Test for the ``module.totalstation.SerialMeasurementProcessor`` class.
+    """
+
+    def test_process_batch(self,
+                           sm_processor: SerialMeasurementProcessor) -> None:
+        assert_batch_equivalent(sm_processor, [
+            {'hz0': 0.5, 'hz1': 3.6, 'v0': 1.5, 'v1': 4.7,
+             'slopeDist0': 100.0, 'slopeDist1': 100.002},
+            {'hz0': 3.6, 'hz1': 0.5, 'v0': 1.6, 'v1': 4.6,
+             'slopeDist0': 0.0, 'slopeDist1': 50.0},
+            {'hz0': 1.0, 'hz1': 4.1, 'v0': 1.4, 'v1': 4.8,
+             'slopeDist0': 12.3456, 'slopeDist1': 0.0},
+            {'hz0': 1.0, 'hz1': 4.1, 'v0': 1.4}
+        ])